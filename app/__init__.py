@@ -1,22 +1,28 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_admin import Admin as FlaskAdmin
 from flask_wtf.csrf import CSRFProtect
 from config import config
-from sqlalchemy import event
-import sqlite3
 
 # 导入日志配置
 from logging_config import setup_logging
+from .utils.db_routing import RoutingSession, configure_engines, install_pragmas, is_sqlite_file_uri
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
-def create_app(config_name='default'):
+def create_app(config_name='default', with_admin=True):
+    """创建应用实例。
+
+    命令行脚本只需要模型与数据库时可传 ``with_admin=False``，跳过 Flask-Admin
+    及后台蓝图的导入与注册，缩短冷启动时间。
+    """
     app = Flask(__name__)
     app.config.from_object(config.get(config_name, config['default']))
+
+    # 若使用 SQLite 文件库：写引擎设置 busy_timeout，并为只读请求增加只读引擎
+    readonly_enabled = configure_engines(app)
     
     # 初始化扩展
     db.init_app(app)
@@ -30,40 +36,38 @@ def create_app(config_name='default'):
     except Exception:
         pass
 
-    # 若使用 SQLite，设置 WAL/同步 等 PRAGMA 以提升小站点并发与稳定性
-    with app.app_context():
-        db_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
-        if isinstance(db_uri, str) and db_uri.startswith('sqlite'):
-            engine = db.engine
-
-            def _set_sqlite_pragmas(dbapi_connection, connection_record):
-                if isinstance(dbapi_connection, sqlite3.Connection):
-                    cursor = dbapi_connection.cursor()
-                    try:
-                        cursor.execute('PRAGMA journal_mode=WAL')
-                        cursor.execute('PRAGMA synchronous=NORMAL')
-                        cursor.execute('PRAGMA temp_store=MEMORY')
-                        # 负值表示 KB，-2000 约等于 2MB page cache
-                        cursor.execute('PRAGMA cache_size=-2000')
-                    finally:
-                        cursor.close()
-
-            event.listen(engine, 'connect', _set_sqlite_pragmas)
+    # 若使用 SQLite，设置 WAL/同步/mmap 等 PRAGMA 以提升小站点并发与稳定性
+    if is_sqlite_file_uri(app.config.get('SQLALCHEMY_DATABASE_URI', '')):
+        with app.app_context():
+            install_pragmas(app, db, readonly_enabled)
     
     # 设置登录视图
     login_manager.login_view = 'auth.login'
     login_manager.login_message = '请先登录以访问此页面。'
     
-    # 用户加载函数
+    # 用户加载函数：按进程缓存用户快照，已登录请求命中缓存时不再查库
     from .models import User
+    from .utils import user_cache
+    user_cache.register_invalidation(User)
+
+    # 文档文件 -> 按内容存储的 blob：关联与引用计数随文档写入维护
+    from .models import Document
+    from .utils import blobs
+    blobs.register_ref_counting(Document)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        ttl = app.config.get('USER_CACHE_TTL', user_cache.DEFAULT_TTL_SECONDS)
+        return user_cache.get_user(int(user_id), ttl=ttl)
     
     # 设置日志
     setup_logging(app)
 
+    # 为已有数据库补建新增的数据表（如 document_neighbors）
+    from .utils.schema import ensure_schema
+    with app.app_context():
+        ensure_schema(app, db)
+
     # 注册 Jinja 过滤器：markdown 渲染与段落包装
     try:
         from .utils.markdown import render_markdown_safe, paragraphs as paragraphs_filter
@@ -84,10 +88,37 @@ def create_app(config_name='default'):
     app.register_blueprint(api_blueprint, url_prefix='/api')
     
     # 初始化 Flask-Admin
-    from .admin import MyAdminIndexView, init_admin, admin as admin_blueprint
-    app.register_blueprint(admin_blueprint, url_prefix='/admin')
-    flask_admin = FlaskAdmin(name='GxP Guider', template_mode='bootstrap4', index_view=MyAdminIndexView())
-    flask_admin.init_app(app)
-    init_admin(flask_admin, app)
+    if with_admin:
+        from flask_admin import Admin as FlaskAdmin
+        from .admin import MyAdminIndexView, init_admin, admin as admin_blueprint
+        app.register_blueprint(admin_blueprint, url_prefix='/admin')
+        flask_admin = FlaskAdmin(name='GxP Guider', template_mode='bootstrap4', index_view=MyAdminIndexView())
+        flask_admin.init_app(app)
+        init_admin(flask_admin, app)
     
     return app
+
+
+def warm_caches(app):
+    """在 fork worker 之前预热只读缓存，使其在各 worker 间写时复制共享。
+
+    - 编译应用自身的 Jinja 模板（存入 jinja_env 的模板缓存）；
+    - 渲染组织介绍页等静态内容；
+    - 预先加载 Markdown/bleach 渲染器，避免每个 worker 首次请求时各自导入。
+    """
+    with app.app_context():
+        for name in app.jinja_loader.list_templates():
+            if not name.endswith('.html'):
+                continue
+            try:
+                app.jinja_env.get_template(name)
+            except Exception:
+                app.logger.warning('预编译模板失败: %s', name)
+        try:
+            from .main.views import warm_public_caches
+            from .utils.markdown import _load_markdown, _load_bleach
+            _load_markdown()
+            _load_bleach()
+            warm_public_caches()
+        except Exception:
+            app.logger.exception('预热公共页面缓存失败')
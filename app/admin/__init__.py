@@ -11,9 +11,6 @@ from sqlalchemy import func, and_, or_
 import os
 import logging
 from werkzeug.utils import secure_filename
-from ..utils.upload import save_file
-from io import BytesIO
-from openpyxl import Workbook
 
 def format_datetime(view, context, model, name):
     """格式化时间显示到分钟"""
@@ -195,7 +192,7 @@ class CategoryAdminView(MyModelView):
         )
 
 class DocumentAdminView(MyModelView):
-    column_list = ("id", "chinese_title", "title", "org", "cat", "updated_at")
+    column_list = ("id", "chinese_title", "title", "org", "cat", "preview_status", "updated_at")
     column_labels = {
         'id': 'ID',
         'chinese_title': '中文标题',
@@ -204,6 +201,7 @@ class DocumentAdminView(MyModelView):
         'org': '所属组织',
         'cat': '分类',
         'updated_at': '数据更新时间',
+        'preview_status': '预览',
         'publish_date': '出版日期',
         'summary': '概述',
         'cover_url': '封面缩略图链接',
@@ -221,6 +219,7 @@ class DocumentAdminView(MyModelView):
     column_filters = ('org.name', 'cat.name')
     
     # Use custom form templates for edit and create separately
+    list_template = 'admin/documents/list.html'
     edit_template = 'admin/documents/edit.html'
     create_template = 'admin/documents/create.html'
 
@@ -230,57 +229,105 @@ class DocumentAdminView(MyModelView):
         self.column_formatters['org'] = self.organization_formatter
         # 自定义分类的显示方式
         self.column_formatters['cat'] = self.category_formatter
+        self.column_formatters['preview_status'] = self.preview_status_formatter
         # 添加“文件可用性”筛选（任一/仅英文/仅中文/无文件）
         from ..models import Document
         self.column_filters = tuple(self.column_filters) + (
             FileAvailabilityFilter(Document.id, '文件'),
         )
 
+    # 导出列：(表头, 取值函数)
+    EXPORT_COLUMNS = (
+        ('ID', lambda d: d.id),
+        ('组织', lambda d: d.org.name if d.org else ''),
+        ('分类', lambda d: d.cat.name if d.cat else ''),
+        ('英文标题', lambda d: d.title or ''),
+        ('中文标题', lambda d: d.chinese_title or ''),
+        ('概述', lambda d: d.summary or ''),
+        ('中文概述', lambda d: d.chinese_summary or ''),
+        ('封面链接', lambda d: d.cover_url or ''),
+        ('出版日期', lambda d: d.publish_date.strftime('%Y-%m-%d') if d.publish_date else ''),
+        ('源链接', lambda d: d.source_url or ''),
+        ('原版文档链接', lambda d: d.original_file_url or ''),
+        ('中文版文档链接', lambda d: d.translation_file_url or ''),
+        ('原版预览链接', lambda d: d.original_preview_url or ''),
+        ('中文版预览链接', lambda d: d.translation_preview_url or ''),
+        ('创建时间', lambda d: d.created_at.strftime('%Y-%m-%d %H:%M:%S') if d.created_at else ''),
+        ('更新时间', lambda d: d.updated_at.strftime('%Y-%m-%d %H:%M:%S') if d.updated_at else ''),
+    )
+    # 每批从数据库读取的行数
+    EXPORT_BATCH_SIZE = 500
+
+    def _export_query(self):
+        """按列表页当前的搜索/筛选/排序条件构造导出查询（不分页）。"""
+        from sqlalchemy.orm import joinedload
+        view_args = self._get_list_extra_args()
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+        _, query = self.get_list(0, sort_column, view_args.sort_desc, view_args.search, view_args.filters,
+                                 execute=False, page_size=0)
+        if sort_column is None:
+            query = query.order_by(self.model.id)
+        # 组织/分类通过 JOIN 随主查询一并取出
+        return query.options(joinedload(self.model.org), joinedload(self.model.cat))
+
+    def _export_rows(self, query):
+        # 以 2.0 风格执行并 yield_per 分批读取（旧式 Query 遇到 joinedload 会强制 unique，与 yield_per 冲突）
+        docs = self.session.scalars(query.statement, execution_options={'yield_per': self.EXPORT_BATCH_SIZE})
+        for doc in docs:
+            yield [getter(doc) for _, getter in self.EXPORT_COLUMNS]
+
     @expose('/export')
     def export_all(self):
-        """导出全部文档为 XLSX（不受筛选影响）。"""
-        docs = self.session.query(self.model).all()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Documents"
-
-        headers = [
-            'ID', '组织', '分类', '英文标题', '中文标题', '概述', '中文概述', '封面链接',
-            '出版日期', '源链接', '原版文档链接', '中文版文档链接',
-            '原版预览链接', '中文版预览链接', '创建时间', '更新时间'
-        ]
+        """导出文档为 XLSX（默认）或 CSV（?format=csv），沿用列表页的搜索与筛选条件。"""
+        export_format = (request.args.get('format') or 'xlsx').lower()
+        query = self._export_query()
+        headers = [header for header, _ in self.EXPORT_COLUMNS]
+        # 文件名与 init_db.py 读取的 data/documents_export.xlsx 保持一致
+        filename = 'documents_export'
+
+        if export_format == 'csv':
+            import csv
+            from io import StringIO
+            from flask import Response, stream_with_context
+
+            def generate():
+                buf = StringIO()
+                writer = csv.writer(buf)
+                # BOM 便于 Excel 直接以 UTF-8 打开
+                buf.write('\ufeff')
+                writer.writerow(headers)
+                for i, row in enumerate(self._export_rows(query), start=1):
+                    writer.writerow(row)
+                    if i % self.EXPORT_BATCH_SIZE == 0:
+                        yield buf.getvalue().encode('utf-8')
+                        buf.seek(0)
+                        buf.truncate()
+                yield buf.getvalue().encode('utf-8')
+
+            response = Response(stream_with_context(generate()), mimetype='text/csv; charset=utf-8')
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+            return response
+
+        # openpyxl 体积较大，仅在导出时加载；write_only 模式逐行写入临时文件，内存占用与行数无关
+        import tempfile
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Documents")
         ws.append(headers)
-
-        for doc in docs:
-            row = [
-                getattr(doc, 'id', ''),
-                getattr(getattr(doc, 'org', None), 'name', ''),
-                getattr(getattr(doc, 'category', None), 'name', ''),
-                getattr(doc, 'title', '') or '',
-                getattr(doc, 'chinese_title', '') or '',
-                getattr(doc, 'summary', '') or '',
-                getattr(doc, 'chinese_summary', '') or '',
-                getattr(doc, 'cover_url', '') or '',
-                doc.publish_date.strftime('%Y-%m-%d') if getattr(doc, 'publish_date', None) else '',
-                getattr(doc, 'source_url', '') or '',
-                getattr(doc, 'original_file_url', '') or '',
-                getattr(doc, 'translation_file_url', '') or '',
-                getattr(doc, 'original_preview_url', '') or '',
-                getattr(doc, 'translation_preview_url', '') or '',
-                doc.created_at.strftime('%Y-%m-%d %H:%M:%S') if getattr(doc, 'created_at', None) else '',
-                doc.updated_at.strftime('%Y-%m-%d %H:%M:%S') if getattr(doc, 'updated_at', None) else ''
-            ]
+        for row in self._export_rows(query):
             ws.append(row)
 
-        output = BytesIO()
+        output = tempfile.TemporaryFile()
         wb.save(output)
         output.seek(0)
 
         return send_file(
             output,
             as_attachment=True,
-            download_name='documents_export.xlsx',
+            download_name=f'{filename}.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
@@ -295,85 +342,103 @@ class DocumentAdminView(MyModelView):
         if model.cat:
             return model.cat.name
         return ''
+
+    PREVIEW_STATUS_LABELS = {
+        'pending': '排队中',
+        'processing': '生成中',
+        'ready': '已生成',
+        'failed': '生成失败',
+    }
+
+    def preview_status_formatter(self, view, context, model, name):
+        """显示预览生成状态（见 utils/preview_queue.py）"""
+        return self.PREVIEW_STATUS_LABELS.get(model.preview_status, '')
     
     def on_model_change(self, form, model, is_created):
-        """Handle file uploads when saving the model"""
-        from ..utils.upload import save_file
+        """Handle file uploads when saving the model (PDF previews are generated by the preview queue)"""
+        from ..utils.upload import store_blob
+        from ..utils.blobs import apply_blob
         import logging
         logger = logging.getLogger(__name__)
+        # 完整的 request.files 等调试信息只在 DEBUG 级别按采样输出
+        upload_logger = logging.getLogger('app.admin.upload')
         
-        logger.info("Starting document file upload process in admin panel")
-        logger.info(f"Request files: {request.files}")
-        logger.info(f"Original file upload in request: {'original_file_upload' in request.files}")
-        logger.info(f"Translation file upload in request: {'translation_file_upload' in request.files}")
+        upload_logger.debug("Admin form upload: is_created=%s files=%s", is_created, request.files)
+        # 提交后需登记的预览任务：[(版本, 文件 URL)]，见 after_model_change
+        model._preview_requests = []
+        if not is_created:
+            self._keep_generated_previews(form, model)
         
         # Handle original file upload
         if 'original_file_upload' in request.files:
             original_file = request.files['original_file_upload']
-            logger.info(f"Original file object: {original_file}")
-            logger.info(f"Original file filename: {original_file.filename}")
             
             if original_file and original_file.filename:
                 try:
                     organization_name = model.org.name if model.org else "Unknown"
-                    logger.info(f"Uploading original file: {original_file.filename} for organization: {organization_name}")
-                    
-                    # Save file and get both file URL and preview URL
-                    file_url, preview_url = save_file(
-                        file=original_file,
-                        organization_name=organization_name,
-                        title=model.title,
-                        is_chinese=False
-                    )
+                    logger.info("Uploading original file: %s for organization: %s", original_file.filename, organization_name)
                     
-                    model.original_file_url = file_url
-                    model.original_preview_url = preview_url
+                    # Save file by content; identical bytes reuse the stored file and its preview,
+                    # otherwise the preview is generated asynchronously after commit
+                    blob, created = store_blob(original_file)
+                    if apply_blob(model, 'original', blob):
+                        model._preview_requests.append(('original', blob.url))
+                    elif not blob.preview_url:
+                        model.original_preview_url = None
                     
-                    logger.info(f"Original file uploaded successfully. File URL: {file_url}, Preview URL: {preview_url}")
+                    logger.info("Original file %s. File URL: %s", 'uploaded' if created else 'matched stored content', blob.url)
                 except Exception as e:
                     error_msg = f"原版文件上传失败: {str(e)}"
                     logger.error(error_msg, exc_info=True)
                     flash(error_msg, "error")
-            else:
-                logger.info("Original file is empty or has no filename")
-        else:
-            logger.info("No original file upload in request")
         
         # Handle translation file upload
         if 'translation_file_upload' in request.files:
             translation_file = request.files['translation_file_upload']
-            logger.info(f"Translation file object: {translation_file}")
-            logger.info(f"Translation file filename: {translation_file.filename}")
             
             if translation_file and translation_file.filename:
                 try:
                     organization_name = model.org.name if model.org else "Unknown"
-                    logger.info(f"Uploading translation file: {translation_file.filename} for organization: {organization_name}")
+                    logger.info("Uploading translation file: %s for organization: %s", translation_file.filename, organization_name)
                     
-                    # Save file and get both file URL and preview URL
-                    file_url, preview_url = save_file(
-                        file=translation_file,
-                        organization_name=organization_name,
-                        title=model.title,
-                        is_chinese=True
-                    )
+                    # Save file by content; identical bytes reuse the stored file and its preview,
+                    # otherwise the preview is generated asynchronously after commit
+                    blob, created = store_blob(translation_file)
+                    if apply_blob(model, 'translation', blob):
+                        model._preview_requests.append(('translation', blob.url))
+                    elif not blob.preview_url:
+                        model.translation_preview_url = None
                     
-                    model.translation_file_url = file_url
-                    model.translation_preview_url = preview_url
-                    
-                    logger.info(f"Translation file uploaded successfully. File URL: {file_url}, Preview URL: {preview_url}")
+                    logger.info("Translation file %s. File URL: %s", 'uploaded' if created else 'matched stored content', blob.url)
                 except Exception as e:
                     error_msg = f"中文版文件上传失败: {str(e)}"
                     logger.error(error_msg, exc_info=True)
                     flash(error_msg, "error")
-            else:
-                logger.info("Translation file is empty or has no filename")
-        else:
-            logger.info("No translation file upload in request")
         
-        logger.info("Calling super().on_model_change")
         super().on_model_change(form, model, is_created)
-        logger.info("Finished on_model_change")
+
+    def after_model_change(self, form, model, is_created):
+        from ..utils.preview_queue import enqueue_and_kick
+        for variant, file_url in getattr(model, '_preview_requests', ()):
+            enqueue_and_kick(model.id, variant, file_url)
+        super().after_model_change(form, model, is_created)
+
+    def _keep_generated_previews(self, form, model):
+        """预览链接（及没有封面时用第一页生成的封面）由预览队列在后台写回：表单中的这些链接未被手动修改时
+        沿用数据库中的最新值，避免保存表单时覆盖编辑期间生成的新预览与封面。"""
+        from .. import db
+        from ..models import Document
+        fields = [
+            name for name in ('original_preview_url', 'translation_preview_url', 'cover_url')
+            if hasattr(form, name) and (getattr(form, name).data or None) == (getattr(form, name).object_data or None)
+        ]
+        if not fields:
+            return
+        with db.session.no_autoflush:
+            row = db.session.query(*[getattr(Document, name) for name in fields]).filter(Document.id == model.id).first()
+        if row is not None:
+            for name, value in zip(fields, row):
+                setattr(model, name, value)
 
     def _apply_default_filters(self, query):
         """支持通过 q_org / q_cat 查询参数进行默认过滤。"""
@@ -7,31 +7,44 @@ from .. import db, csrf
 import os
 import logging
 from datetime import datetime
-from io import BytesIO
-from openpyxl import Workbook
-from ..utils.r2 import _get_config, _s3_client, build_public_url, download_to_temp, upload_file
-from ..utils.upload import generate_filename
+from ..utils.r2 import (
+    _get_config, _s3_client, build_public_url, extract_key_from_url as _extract_r2_key_from_url,
+    delete_objects, generate_presigned_get_url, r2_metrics, upload_file
+)
+from ..utils.r2_multipart import (
+    DEFAULT_PART_SIZE, MAX_PARTS, MAX_PRESIGN_BATCH, MultipartUploadWriter, complete_parts, list_uploaded_parts,
+    plan_parts, presign_parts
+)
+from ..utils.upload import SNIFF_BYTES, UploadRejected, generate_filename, sniff_content_type
+from ..utils.blobs import (
+    BLOB_FIELDS, apply_blob, blob_key, checksum_sha256, find_blob, is_sha256, register_blob, sha256_from_key,
+)
+from ..utils.zip_policy import PROBE_BYTES, CompressionPolicy
+from ..utils import export_tasks, jobs
+from ..utils.export_scope import (
+    MANIFEST_ARCNAME, ExportScope, diff_manifest, load_base_manifest, mark_delivered, normalize_etag, save_manifest
+)
 from werkzeug.utils import secure_filename
 from flask import current_app
 from flask_admin import helpers as admin_helpers
+import collections
+import json
 import threading
 import time
 import tempfile
-import zipfile
-import uuid
 
 # Set up logging
 logger = logging.getLogger(__name__)
+# 上传调试信息（完整表单/文件对象），DEBUG 级别且按 LOG_SAMPLE_RATES 采样
+upload_logger = logging.getLogger('app.admin.upload')
 
-# --------- 文档导出任务状态（内存级） ---------
-EXPORT_TASKS: dict = {}
-EXPORT_LOCK = threading.Lock()
+# --------- 文档导出（任务状态保存在 export_tasks 表，见 utils/export_tasks.py） ---------
 EXPORT_CHUNK_SIZE = 1024 * 1024  # 1MB
-EXPORT_TTL_SECONDS = 60 * 60  # 1 hour
-
-
-class _ExportCancelled(Exception):
-    """Raised when an export task is cancelled."""
+# 吞吐统计的滑动窗口（秒）
+EXPORT_RATE_WINDOW_SECONDS = 5.0
+# 进度推送（SSE）：浏览器断线后的重连间隔（毫秒）；不参与变化比较的字段
+SSE_RETRY_MS = 3000
+SSE_VOLATILE_FIELDS = ('heartbeat_at', 'updated_at')
 
 
 admin = Blueprint('admin_panel', __name__)
@@ -44,141 +57,187 @@ def check_admin():
 
 
 def _expire_old_tasks():
-    """清理超时任务及其临时 ZIP。"""
-    now = time.time()
-    to_delete = []
-    with EXPORT_LOCK:
-        for tid, task in list(EXPORT_TASKS.items()):
-            updated = task.get('updated_at') or task.get('created_at') or now
-            if now - updated > EXPORT_TTL_SECONDS and task.get('status') in {'failed', 'cancelled', 'success', 'delivered'}:
-                to_delete.append((tid, task))
-    for tid, task in to_delete:
-        _cleanup_task_file(task)
-        with EXPORT_LOCK:
-            EXPORT_TASKS.pop(tid, None)
-
-
-def _new_export_task():
-    task_id = uuid.uuid4().hex
-    zip_path = os.path.join(tempfile.gettempdir(), f"export-documents-{task_id}.zip")
-    task = {
-        'id': task_id,
-        'status': 'pending',
-        'progress': 0,
-        'message': '等待开始',
-        'created_at': time.time(),
-        'updated_at': time.time(),
-        'paused': False,
-        'cancelled': False,
-        'total_files': 0,
-        'processed_files': 0,
-        'total_bytes': 0,
-        'processed_bytes': 0,
-        'zip_path': zip_path,
-        'download_ready': False,
-    }
-    with EXPORT_LOCK:
-        EXPORT_TASKS[task_id] = task
-    return task
-
-
-def _get_task(task_id: str):
-    with EXPORT_LOCK:
-        return EXPORT_TASKS.get(task_id)
-
+    """回收孤儿任务并清理超时任务及其临时 ZIP。"""
+    export_tasks.expire_old_tasks(
+        ttl_seconds=current_app.config.get('EXPORT_TTL_SECONDS', export_tasks.DEFAULT_TTL_SECONDS),
+        heartbeat_timeout=current_app.config.get('EXPORT_HEARTBEAT_TIMEOUT', export_tasks.DEFAULT_HEARTBEAT_TIMEOUT)
+    )
 
-def _update_task(task_id: str, **kwargs):
-    with EXPORT_LOCK:
-        task = EXPORT_TASKS.get(task_id)
-        if not task:
-            return None
-        task.update(kwargs)
-        task['updated_at'] = time.time()
-        return dict(task)
 
+def _iter_export_keys(client, bucket: str, prefix: str = 'documents/'):
+    """分页列出待导出对象，产出 (key, size, etag)；排除目录占位与 preview/。"""
+    continuation_token = None
+    while True:
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if continuation_token:
+            params['ContinuationToken'] = continuation_token
+        resp = client.list_objects_v2(**params)
+        for obj in resp.get('Contents', []):
+            key = obj.get('Key') or ''
+            if not key or key.endswith('/'):
+                continue
+            if key.startswith(f'{prefix}preview/'):
+                continue
+            yield key, int(obj.get('Size') or 0), normalize_etag(obj.get('ETag'))
+        if not resp.get('IsTruncated'):
+            break
+        continuation_token = resp.get('NextContinuationToken')
+
+
+def _stat_export_keys(client, bucket: str, keys, concurrency: int):
+    """并发 HEAD 给定的 key，返回 [(key, size, etag)]（保持顺序）；不存在的对象被跳过。"""
+    from concurrent.futures import ThreadPoolExecutor
+    from botocore.exceptions import ClientError
+
+    def _head(key):
+        try:
+            resp = client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return key, int(resp.get('ContentLength') or 0), normalize_etag(resp.get('ETag'))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='export-head') as pool:
+        results = list(pool.map(_head, keys))
+    missing = [key for key, item in zip(keys, results) if item is None]
+    if missing:
+        logger.warning('数据库中登记的 %s 个文件在 R2 中不存在，已跳过（如 %s）', len(missing), missing[0])
+    return [item for item in results if item is not None]
+
+
+def _collect_export_objects(client, bucket: str, scope: ExportScope, concurrency: int):
+    """按导出范围返回 [(key, size, etag)]：有数据库条件时由文档 URL 反推 key，否则列出存储桶。"""
+    if scope.uses_database:
+        keys = scope.resolve_keys(_extract_r2_key_from_url)
+        return _stat_export_keys(client, bucket, keys, concurrency)
+    return [item for item in _iter_export_keys(client, bucket) if scope.matches_key(item[0])]
+
+
+class _ThroughputMeter:
+    """统计导出吞吐：最近若干秒的瞬时速率与自开始以来的平均速率（字节/秒）。"""
+
+    def __init__(self, window: float = EXPORT_RATE_WINDOW_SECONDS):
+        self.window = window
+        self.started = time.monotonic()
+        self.total = 0
+        self._samples = collections.deque()
+
+    def add(self, nbytes: int):
+        now = time.monotonic()
+        self.total += nbytes
+        self._samples.append((now, nbytes))
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        elapsed = max(now - self.started, 1e-6)
+        span = min(self.window, elapsed)
+        return {
+            'throughput_bps': int(sum(n for _, n in self._samples) / span),
+            'avg_throughput_bps': int(self.total / elapsed),
+            'elapsed_seconds': round(elapsed, 1),
+        }
 
-def _set_paused(task_id: str, paused: bool):
-    status = 'paused' if paused else 'running'
-    message = '任务已暂停' if paused else '继续打包'
-    return _update_task(task_id, paused=paused, status=status, message=message)
 
+def _prefetch_object(client, bucket: str, key: str, reporter, spool_max_bytes: int, on_chunk):
+    """下载线程：把对象读入 SpooledTemporaryFile（小文件留在内存，大文件落盘）。
 
-def _mark_cancel(task_id: str):
-    return _update_task(task_id, cancelled=True, status='cancelling', message='正在取消')
+    下载过程中同样响应暂停/取消（读取 reporter 缓存的标记，不访问数据库）。
+    返回 (已定位到开头的文件对象, Content-Type)，文件由调用方关闭。
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
+    try:
+        obj = client.get_object(Bucket=bucket, Key=key)
+        body = obj.get('Body')
+        while True:
+            reporter.wait_if_paused()
+            chunk = body.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+            on_chunk(len(chunk))
+        spool.seek(0)
+        return spool, obj.get('ContentType')
+    except BaseException:
+        spool.close()
+        raise
+
+
+def _wait_for_prefetch(future, reporter):
+    """等待预取结果；等待期间照常响应暂停/取消（下载线程读取的是 reporter 的缓存标记）。"""
+    from concurrent.futures import TimeoutError as FutureTimeout
+    while True:
+        try:
+            return future.result(timeout=reporter.poll_interval)
+        except FutureTimeout:
+            reporter.checkpoint()
 
 
-def _should_cancel(task_id: str) -> bool:
-    with EXPORT_LOCK:
-        task = EXPORT_TASKS.get(task_id)
-        return (not task) or bool(task.get('cancelled'))
+def _export_documents_worker(app, task_id: str):
+    """后台任务：按导出范围收集 R2 对象（默认 documents/，排除 preview），写入 ZIP。
 
+    EXPORT_TARGET=r2（默认）时 ZIP 边生成边以分片并发上传到 R2 的 exports/{task_id}.zip，
+    下载经预签名 URL 直连 R2；local 时写入服务器临时目录，由 send_file 下载。
 
-def _wait_if_paused(task_id: str) -> bool:
-    """返回 True 表示遇到取消，应终止。"""
-    while True:
-        with EXPORT_LOCK:
-            task = EXPORT_TASKS.get(task_id)
-            if not task:
-                return True
-            paused = task.get('paused', False)
-            cancelled = task.get('cancelled', False)
-        if cancelled:
-            return True
-        if not paused:
-            return False
-        time.sleep(0.3)
-
-
-def _cleanup_task_file(task: dict):
-    path = task.get('zip_path')
-    if path and os.path.exists(path):
-        try:
-            os.remove(path)
-        except Exception:
-            logger.exception('清理导出 ZIP 失败: %s', path)
-    with EXPORT_LOCK:
-        task['zip_path'] = None
+    增量导出只打包与上次已下载清单相比新增或 ETag 变化的对象，ZIP 末尾附带 _export_manifest.json。
 
+    由有界线程池预取后续 N 个对象（EXPORT_PREFETCH_CONCURRENCY），当前对象写入 ZIP 的同时
+    下载后面的对象；写入仍严格按列表顺序进行，归档内容与顺序确定。
+    进度经 TaskReporter 合并后写入 export_tasks 表，暂停/取消可由任意 worker 发起。
+    """
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
 
-def _export_documents_worker(app, task_id: str):
-    """后台线程：遍历 R2 documents/（排除 preview），流式写入 ZIP。"""
     with app.app_context():
-        task = _get_task(task_id)
+        task = export_tasks.get_task(task_id)
         if not task:
             return
+        concurrency = max(1, int(app.config.get('EXPORT_PREFETCH_CONCURRENCY', 4)))
+        spool_max_bytes = int(app.config.get('EXPORT_SPOOL_MAX_BYTES', 8 * 1024 * 1024))
+        reporter = export_tasks.TaskReporter(
+            task_id, flush_interval=float(app.config.get('EXPORT_PROGRESS_FLUSH_SECONDS', export_tasks.PROGRESS_FLUSH_SECONDS))
+        )
+        target = str(app.config.get('EXPORT_TARGET', 'r2')).lower()
+        pending = collections.deque()
+        executor = None
+        sink = None
         try:
+            scope = ExportScope.from_json(task.get('params'))
+            reporter.claim(message=f'正在收集文件：{scope.describe()}')
+            reporter.checkpoint()
             client = _s3_client()
             bucket, *_ = _get_config()
-            prefix = 'documents/'
-            # 列出对象
-            keys = []
-            total_bytes = 0
-            continuation_token = None
-            while True:
-                params = {'Bucket': bucket, 'Prefix': prefix}
-                if continuation_token:
-                    params['ContinuationToken'] = continuation_token
-                resp = client.list_objects_v2(**params)
-                for obj in resp.get('Contents', []):
-                    key = obj.get('Key') or ''
-                    if not key or key.endswith('/'):
-                        continue
-                    if key.startswith(f'{prefix}preview/'):
-                        continue
-                    size = int(obj.get('Size') or 0)
-                    keys.append((key, size))
-                    total_bytes += max(size, 0)
-                if not resp.get('IsTruncated'):
-                    break
-                continuation_token = resp.get('NextContinuationToken')
-
-            if not keys:
-                _update_task(task_id, status='failed', message='没有可导出的文档（已排除 preview）')
+            objects = _collect_export_objects(client, bucket, scope, concurrency)
+            if not objects:
+                export_tasks.update_task(task_id, status='failed', message=f'没有可导出的文档（{scope.describe()}，已排除 preview）')
                 return
 
-            _update_task(
-                task_id,
-                status='running',
+            manifest_entries = {key: {'etag': etag, 'size': size} for key, size, etag in objects}
+            base_manifest, deleted = None, []
+            keys = objects
+            if scope.incremental:
+                base_manifest, base_entries = load_base_manifest(scope.key())
+                keys, deleted = diff_manifest(objects, base_entries)
+                if not keys and not deleted:
+                    reporter.update(
+                        force=True,
+                        status='success',
+                        progress=100,
+                        message='与上次导出相比没有新增、变化或删除的文件，无需下载',
+                        total_files=0,
+                        download_ready=False
+                    )
+                    return
+            total_bytes = sum(max(size, 0) for _, size, _ in keys)
+
+            # 收集期间被暂停时先等待继续，再写入新的提示（状态由 claim/继续操作维护，这里不覆盖）
+            reporter.checkpoint()
+            reporter.update(
+                force=True,
                 message='开始打包...',
                 total_files=len(keys),
                 total_bytes=total_bytes
@@ -192,73 +251,262 @@ def _export_documents_worker(app, task_id: str):
                 except Exception:
                     logger.exception('删除旧 ZIP 失败: %s', zip_path)
 
+            meter = _ThroughputMeter()
+            download_lock = threading.Lock()
+            downloaded = [0]
+
+            def _on_download(nbytes):
+                with download_lock:
+                    downloaded[0] += nbytes
+
+            uploaded = [0]
+
+            def _on_upload(nbytes):
+                with download_lock:
+                    uploaded[0] += nbytes
+
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'export-{task_id[:8]}')
+            key_iter = iter(keys)
+
+            def _fill_window():
+                # 预取窗口：最多 concurrency 个对象在下载或已下载待写入
+                while len(pending) < concurrency:
+                    item = next(key_iter, None)
+                    if item is None:
+                        return
+                    key = item[0]
+                    future = executor.submit(_prefetch_object, client, bucket, key, reporter, spool_max_bytes, _on_download)
+                    pending.append((key, future))
+
             processed_files = 0
             processed_bytes = 0
-            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
-                for key, size in keys:
-                    if _should_cancel(task_id):
-                        raise _ExportCancelled()
-                    if _wait_if_paused(task_id):
-                        raise _ExportCancelled()
-
-                    obj = client.get_object(Bucket=bucket, Key=key)
+            if target == 'r2':
+                result_key = f"{app.config.get('EXPORT_R2_PREFIX', 'exports/')}{task_id}.zip"
+                sink = MultipartUploadWriter(
+                    client, bucket, result_key,
+                    part_size=int(app.config.get('EXPORT_PART_SIZE', DEFAULT_PART_SIZE)),
+                    concurrency=int(app.config.get('EXPORT_UPLOAD_CONCURRENCY', 4)),
+                    on_part=_on_upload
+                )
+                reporter.update(force=True, result_key=result_key)
+                archive = sink
+            else:
+                os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+                archive = zip_path
+            policy = CompressionPolicy.from_config(app.config)
+            with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+                _fill_window()
+                while pending:
+                    reporter.checkpoint()
+
+                    key, future = pending.popleft()
+                    spool, content_type = _wait_for_prefetch(future, reporter)
+                    _fill_window()
                     arcname = key  # 保留完整路径
-                    with zf.open(arcname, 'w') as dest:
-                        body = obj.get('Body')
-                        while True:
-                            chunk = body.read(EXPORT_CHUNK_SIZE)
-                            if not chunk:
-                                break
-                            if _should_cancel(task_id):
-                                raise _ExportCancelled()
-                            if _wait_if_paused(task_id):
-                                raise _ExportCancelled()
-                            dest.write(chunk)
-                            processed_bytes += len(chunk)
-                            progress = min(99, int(processed_bytes * 100 / total_bytes)) if total_bytes else 0
-                            _update_task(
-                                task_id,
-                                processed_bytes=processed_bytes,
-                                progress=progress,
-                                message=f'正在打包 {processed_files + 1}/{len(keys)}'
-                            )
+                    try:
+                        # 按扩展名/类型/首块样本决定该条目是否压缩
+                        head = spool.read(PROBE_BYTES)
+                        size = spool.seek(0, os.SEEK_END)
+                        spool.seek(0)
+                        zinfo = policy.zipinfo(arcname, time.localtime(time.time())[:6], content_type, head)
+                        # 输出不可 seek（上传到 R2）时，zipfile 据预知大小决定是否写 ZIP64 扩展字段
+                        zinfo.file_size = size
+                        with zf.open(zinfo, 'w') as dest:
+                            while True:
+                                chunk = spool.read(EXPORT_CHUNK_SIZE)
+                                if not chunk:
+                                    break
+                                reporter.checkpoint()
+                                dest.write(chunk)
+                                processed_bytes += len(chunk)
+                                meter.add(len(chunk))
+                                progress = min(99, int(processed_bytes * 100 / total_bytes)) if total_bytes else 0
+                                # 合并写入：距上次写库不足 flush 间隔时只更新内存中的待写字段
+                                reporter.update(
+                                    processed_bytes=processed_bytes,
+                                    downloaded_bytes=downloaded[0],
+                                    uploaded_bytes=uploaded[0],
+                                    progress=progress,
+                                    message=f'正在打包 {processed_files + 1}/{len(keys)}',
+                                    **meter.snapshot()
+                                )
+                    finally:
+                        spool.close()
                     processed_files += 1
                     progress = int(processed_files * 100 / len(keys))
                     # 若总字节数更精确，则采用字节进度
                     if total_bytes and processed_bytes:
                         progress = min(100, int(processed_bytes * 100 / total_bytes))
-                    _update_task(
-                        task_id,
+                    reporter.update(
                         processed_files=processed_files,
                         processed_bytes=processed_bytes,
+                        downloaded_bytes=downloaded[0],
+                        uploaded_bytes=uploaded[0],
                         progress=progress,
-                        message=f'已打包 {processed_files}/{len(keys)}'
+                        message=f'已打包 {processed_files}/{len(keys)}',
+                        **meter.snapshot()
                     )
+                zf.writestr(MANIFEST_ARCNAME, json.dumps({
+                    'scope': scope.to_dict(),
+                    'generated_at': datetime.utcnow().isoformat() + 'Z',
+                    'base_generated_at': base_manifest.created_at.isoformat() + 'Z' if base_manifest else None,
+                    'packed': len(keys),
+                    'objects': manifest_entries,
+                    'deleted': deleted,
+                }, ensure_ascii=False, indent=1, sort_keys=True))
+
+            if sink is not None:
+                reporter.update(force=True, progress=99, message='正在完成上传...')
+                sink.close()
+            save_manifest(scope.key(), task_id, manifest_entries)
+            if scope.incremental:
+                done_message = f'打包完成（增量：新增/变化 {len(keys)} 个，删除 {len(deleted)} 个），可下载'
+            else:
+                done_message = '打包完成，可下载'
 
-            _update_task(
-                task_id,
+            reporter.update(
+                force=True,
                 status='success',
                 progress=100,
-                message='打包完成，可下载',
-                download_ready=True
+                message=done_message,
+                download_ready=True,
+                uploaded_bytes=uploaded[0],
+                **meter.snapshot()
             )
-        except _ExportCancelled:
-            task = _get_task(task_id) or {}
-            _cleanup_task_file(task)
-            _update_task(task_id, status='cancelled', message='任务已取消', progress=0, download_ready=False, zip_path=None)
+        except export_tasks.ExportCancelled:
+            reporter.cancel_local()
+            if sink is not None:
+                sink.abort()
+            export_tasks.cleanup_task_file(task)
+            export_tasks.update_task(task_id, status='cancelled', message='任务已取消', progress=0, download_ready=False, zip_path=None)
         except Exception as e:
             logger.exception('导出文档失败')
-            task = _get_task(task_id) or {}
-            _cleanup_task_file(task)
-            _update_task(task_id, status='failed', message=str(e), download_ready=False, zip_path=None)
+            reporter.cancel_local()
+            if sink is not None:
+                sink.abort()
+            export_tasks.cleanup_task_file(task)
+            export_tasks.update_task(task_id, status='failed', message=str(e), download_ready=False, zip_path=None)
+        finally:
+            reporter.stop()
+            # 停止预取：未开始的下载直接取消，已完成的临时文件关闭
+            if executor is not None:
+                for _, future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+                for _, future in pending:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        future.result()[0].close()
+
+class _ZipStreamSink:
+    """只写、不可 seek 的文件对象。
+
+    zipfile 检测到不可 seek 时会为每个条目写数据描述符（data descriptor），
+    无需事后回填本地文件头；写入的数据暂存于此，由响应生成器随时取走。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _stream_export_zip(client, bucket: str, concurrency: int, policy: CompressionPolicy, scope: ExportScope):
+    """边读 R2 边产出 ZIP64 字节流，不落临时文件。
+
+    线程池只提前发起后续 N 个对象的 get_object（等待首字节的延迟与当前写入重叠），
+    对象内容仍按顺序逐块读取，内存占用约为 块大小 × 并发数。
+    客户端断开时生成器被关闭，未读取的响应随之关闭。
+    """
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
+    from botocore.exceptions import ClientError
+
+    sink = _ZipStreamSink()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='export-stream')
+    pending = collections.deque()
+    if scope.uses_database:
+        # 大小取自 get_object 的 ContentLength，无需逐个 HEAD
+        key_iter = iter([(key, -1) for key in scope.resolve_keys(_extract_r2_key_from_url)])
+    else:
+        key_iter = ((key, size) for key, size, _ in _iter_export_keys(client, bucket) if scope.matches_key(key))
+
+    def _fill_window():
+        while len(pending) < concurrency:
+            item = next(key_iter, None)
+            if item is None:
+                return
+            key, size = item
+            pending.append((key, size, executor.submit(client.get_object, Bucket=bucket, Key=key)))
+
+    files = 0
+    written = 0
+    try:
+        with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+            _fill_window()
+            while pending:
+                key, size, future = pending.popleft()
+                try:
+                    obj = future.result()
+                except ClientError as e:
+                    # 数据库中登记但已不存在的文件：跳过
+                    if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                        raise
+                    logger.warning('流式导出跳过不存在的对象: %s', key)
+                    _fill_window()
+                    continue
+                if size < 0:
+                    size = int(obj.get('ContentLength') or 0)
+                body = obj.get('Body')
+                _fill_window()
+                try:
+                    chunk = body.read(EXPORT_CHUNK_SIZE)
+                    zinfo = policy.zipinfo(key, time.localtime(time.time())[:6], obj.get('ContentType'), chunk[:PROBE_BYTES])
+                    # 预先给出大小，zipfile 据此决定是否写 ZIP64 扩展字段
+                    zinfo.file_size = max(size, 0)
+                    with zf.open(zinfo, 'w') as dest:
+                        while chunk:
+                            dest.write(chunk)
+                            written += len(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                            chunk = body.read(EXPORT_CHUNK_SIZE)
+                finally:
+                    body.close()
+                files += 1
+                data = sink.drain()
+                if data:
+                    yield data
+        # 中央目录
+        yield sink.drain()
+        logger.info('流式导出完成: %s 个文件, %s 字节', files, written)
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        for _, _, future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                future.result().get('Body').close()
+
 
 @admin.route('/upload', methods=['GET', 'POST'])
 def upload_document():
     # 获取所有组织和分类（延迟导入避免循环依赖）
     from ..models.organization import Organization
     from ..models.category import Category
-    from ..utils.upload import save_file
+    from ..utils.upload import store_blob
+    from ..utils.preview_queue import enqueue_and_kick
 
     # 获取所有组织和分类
     organizations = Organization.query.all()
@@ -271,11 +519,10 @@ def upload_document():
     
     # 处理POST请求
     try:
-        logger.info("Starting document upload process")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request content type: {request.content_type}")
-        logger.info(f"Request form data: {request.form}")
-        logger.info(f"Request files: {request.files}")
+        upload_logger.debug(
+            "Upload request: method=%s content_type=%s form=%s files=%s",
+            request.method, request.content_type, request.form, request.files
+        )
         
         # 获取表单数据
         organization_id = request.form.get('organization')
@@ -283,14 +530,14 @@ def upload_document():
         document_type = request.form.get('document_type')
         title = request.form.get('title')
         
-        logger.info(f"Form data - organization_id: {organization_id}, category_id: {category_id}, document_type: {document_type}, title: {title}")
-        
         # 获取上传的文件
         document_file = request.files.get('document_file')
         
-        logger.info(f"Document file: {document_file}")
-        logger.info(f"Document filename: {document_file.filename if document_file else 'None'}")
-        logger.info(f"Document content type: {document_file.content_type if document_file else 'None'}")
+        logger.info(
+            "Document upload: organization_id=%s category_id=%s document_type=%s title=%s filename=%s",
+            organization_id, category_id, document_type, title,
+            document_file.filename if document_file else None
+        )
         
         # 验证必填字段
         if not organization_id or not category_id or not document_type or not document_file:
@@ -329,8 +576,6 @@ def upload_document():
             logger.error(error_msg)
             return jsonify({'success': False, 'error': error_msg})
         
-        logger.info(f"Organization: {organization.name}")
-        
         # 获取分类信息
         category = Category.query.get(category_id)
         if not category:
@@ -338,39 +583,32 @@ def upload_document():
             logger.error(error_msg)
             return jsonify({'success': False, 'error': error_msg})
         
-        logger.info(f"Category: {category.name}")
-        
         # 确定是否为中文文档
         is_chinese = document_type == 'translation'
         
-        logger.info(f"Is Chinese document: {is_chinese}")
-        
         try:
-            # 保存文件
-            file_url, preview_url = save_file(
-                file=document_file,
-                organization_name=organization.name,
-                title=title,
-                is_chinese=is_chinese
-            )
+            # 按内容保存文件：相同内容已存在时不再上传，并复用其预览（否则提交后由预览队列生成）
+            blob, created = store_blob(document_file)
+            file_url = blob.url
             
-            logger.info(f"File saved successfully. File URL: {file_url}, Preview URL: {preview_url}")
+            logger.info("File %s. File URL: %s", 'saved successfully' if created else 'matched stored content', file_url)
             
             # 确定字段名
-            file_url_field = 'translation_file_url' if is_chinese else 'original_file_url'
+            variant = 'translation' if is_chinese else 'original'
             preview_url_field = 'translation_preview_url' if is_chinese else 'original_preview_url'
             
             # 检查是否已存在相同标题的文档
             existing_document = Document.query.filter_by(title=title).first()
             
             if existing_document:
-                # 更新现有文档
-                setattr(existing_document, file_url_field, file_url)
-                setattr(existing_document, preview_url_field, preview_url)
+                # 更新现有文档（旧预览保留到新预览生成后替换）
+                wants_preview = apply_blob(existing_document, variant, blob)
+                if not wants_preview and not blob.preview_url:
+                    setattr(existing_document, preview_url_field, None)
                 # 不要在上传中文文件时覆盖已有的中文标题
                 existing_document.updated_at = datetime.utcnow()
                 db.session.commit()
-                logger.info(f"Document updated successfully. ID: {existing_document.id}")
+                logger.info("Document updated successfully. ID: %s", existing_document.id)
             else:
                 # 创建新文档记录（不自动同步中文标题）
                 new_document = Document(
@@ -379,18 +617,24 @@ def upload_document():
                     category_id=category.id
                 )
                 # 设置文件URL字段
-                setattr(new_document, file_url_field, file_url)
-                setattr(new_document, preview_url_field, preview_url)
+                wants_preview = apply_blob(new_document, variant, blob)
                 
                 db.session.add(new_document)
                 db.session.commit()
-                logger.info(f"Document record created successfully. ID: {new_document.id}")
+                logger.info("Document record created successfully. ID: %s", new_document.id)
+            
+            document = existing_document or new_document
+            preview_status = None
+            if wants_preview:
+                preview_status = enqueue_and_kick(document.id, variant, file_url)
             
             # 返回成功响应
             return jsonify({
                 'success': True,
                 'file_url': file_url,
-                'preview_url': preview_url,
+                'preview_url': blob.preview_url,
+                'preview_status': preview_status,
+                'deduplicated': not created,
                 'message': '文档上传成功'
             })
         except Exception as e:
@@ -404,36 +648,89 @@ def upload_document():
         return jsonify({'success': False, 'error': str(e)})
 
 
+def _direct_upload_target(data, organization=None):
+    """直传文档的目标 key：返回 (key, 错误响应, 已存储的相同内容 blob)。
+
+    浏览器计算的 SHA-256：相同内容已存储时不再上传，否则上传到内容地址（见 utils/blobs.py）。
+    批量预签名时由调用方传入已查出的 ``organization``。
+    """
+    org_id = data.get('organization_id')
+    document_type = data.get('document_type')  # 'original' | 'translation'
+    title = data.get('title')
+    original_filename = data.get('filename')
+
+    if not (org_id or organization) or not original_filename or not document_type:
+        return None, (jsonify({'error': '缺少必要参数'}), 400), None
+
+    if organization is None:
+        organization = Organization.query.get(org_id)
+    if not organization:
+        return None, (jsonify({'error': '组织不存在'}), 400), None
+
+    sha256 = (data.get('sha256') or '').lower()
+    if sha256 and not is_sha256(sha256):
+        return None, (jsonify({'error': 'sha256 格式不正确'}), 400), None
+    if sha256:
+        blob = find_blob(sha256)
+        if blob is not None:
+            return blob.key, None, blob
+        return blob_key(sha256, os.path.splitext(original_filename)[1]), None, None
+    is_chinese = (document_type == 'translation')
+    filename = generate_filename(title, original_filename, is_chinese)
+    return f"documents/{organization.name.lower()}/{filename}", None, None
+
+
+def _put_params(bucket, key, content_type):
+    """单次直传的 PUT 参数：内容地址附带 SHA-256 校验和（签入 URL），由 R2 校验请求体与地址一致。
+
+    浏览器须按返回的 headers 发送 ``x-amz-checksum-sha256``（R2 CORS 需允许该请求头）。
+    """
+    params = {'Bucket': bucket, 'Key': key, 'ContentType': content_type}
+    sha256 = sha256_from_key(key)
+    if sha256:
+        params['ChecksumSHA256'] = checksum_sha256(sha256)
+    return params
+
+
+def _put_headers(params):
+    checksum = params.get('ChecksumSHA256')
+    return {'x-amz-checksum-sha256': checksum} if checksum else {}
+
+
+def _duplicate_payload(blob):
+    return jsonify(_duplicate_entry(blob))
+
+
+def _duplicate_entry(blob):
+    return {
+        'duplicate': True,
+        'key': blob.key,
+        'public_url': blob.url,
+        'preview_url': blob.preview_url,
+    }
+
+
+def _cover_key(organization, filename):
+    # 统一缩略图路径到 thumbnails/{org}/
+    return f"thumbnails/{organization.name.lower()}/{_secure_timestamp_name(filename)}"
+
+
 @admin.route('/presign-upload', methods=['POST'])
 @csrf.exempt
 def presign_upload():
     try:
         data = request.get_json() or {}
-        org_id = data.get('organization_id')
-        document_type = data.get('document_type')  # 'original' | 'translation'
-        title = data.get('title')
-        original_filename = data.get('filename')
         content_type = data.get('content_type') or 'application/octet-stream'
-
-        if not org_id or not original_filename or not document_type:
-            return jsonify({'error': '缺少必要参数'}), 400
-
-        organization = Organization.query.get(org_id)
-        if not organization:
-            return jsonify({'error': '组织不存在'}), 400
-
-        is_chinese = (document_type == 'translation')
-        filename = generate_filename(title, original_filename, is_chinese)
-        key = f"documents/{organization.name.lower()}/{filename}"
+        key, error, blob = _direct_upload_target(data)
+        if error is not None:
+            return error
+        if blob is not None:
+            return _duplicate_payload(blob)
 
         # Presign
         bucket, access_key, secret_key, endpoint, _ = _get_config()
         client = _s3_client()
-        params = {
-            'Bucket': bucket,
-            'Key': key,
-            'ContentType': content_type,
-        }
+        params = _put_params(bucket, key, content_type)
         url = client.generate_presigned_url(
             'put_object', Params=params, ExpiresIn=600
         )
@@ -442,6 +739,7 @@ def presign_upload():
             'key': key,
             'public_url': build_public_url(key),
             'content_type': content_type,
+            'headers': _put_headers(params),
             'expires_in': 600
         })
     except Exception as e:
@@ -449,6 +747,240 @@ def presign_upload():
         return jsonify({'error': str(e)}), 500
 
 
+# --------- 批量直传（原版/中文版/封面一次预签名、一次落库） ---------
+BATCH_KINDS = ('original', 'translation', 'cover')
+
+
+def _batch_files(data):
+    """批量请求中的文件列表，返回 (files, 错误响应)；每种用途最多一个文件。"""
+    files = data.get('files')
+    if not isinstance(files, list) or not files:
+        return None, (jsonify({'error': '缺少必要参数（files）'}), 400)
+    kinds = [f.get('kind') if isinstance(f, dict) else None for f in files]
+    if any(kind not in BATCH_KINDS for kind in kinds) or len(set(kinds)) != len(kinds):
+        return None, (jsonify({'error': f'files 的 kind 须为 {"/".join(BATCH_KINDS)} 且不能重复'}), 400)
+    return files, None
+
+
+@admin.route('/presign-batch', methods=['POST'])
+@csrf.exempt
+def presign_batch():
+    """一次为文档的多个文件（原版/中文版/封面）预签名，共用一次组织查询与一个 R2 客户端。
+
+    返回 {"files": [...]}，顺序与请求一致，每项与 presign-upload/presign-cover 的返回相同并带 kind；
+    超过一个分片（UPLOAD_PART_SIZE）的文档返回 {"multipart": true}，由浏览器改走分片直传。
+    """
+    try:
+        data = request.get_json() or {}
+        files, error = _batch_files(data)
+        if error is not None:
+            return error
+        if not data.get('organization_id'):
+            return jsonify({'error': '缺少必要参数'}), 400
+        organization = Organization.query.get(data.get('organization_id'))
+        if not organization:
+            return jsonify({'error': '组织不存在'}), 400
+
+        bucket, *_ = _get_config()
+        client = _s3_client()
+        part_size = current_app.config.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024)
+        results = []
+        for f in files:
+            kind = f['kind']
+            filename = f.get('filename')
+            content_type = f.get('content_type') or ('image/png' if kind == 'cover' else 'application/octet-stream')
+            if not filename:
+                return jsonify({'error': f'{kind} 缺少文件名'}), 400
+            if kind == 'cover':
+                key = _cover_key(organization, filename)
+            else:
+                key, error, blob = _direct_upload_target(
+                    dict(f, document_type=kind, title=data.get('title')), organization=organization
+                )
+                if error is not None:
+                    return error
+                if blob is not None:
+                    results.append(dict(_duplicate_entry(blob), kind=kind))
+                    continue
+                try:
+                    size = int(f.get('size') or 0)
+                except (TypeError, ValueError):
+                    size = 0
+                if size > part_size:
+                    results.append({'kind': kind, 'multipart': True})
+                    continue
+            params = _put_params(bucket, key, content_type)
+            url = client.generate_presigned_url('put_object', Params=params, ExpiresIn=600)
+            results.append({
+                'kind': kind,
+                'url': url,
+                'key': key,
+                'public_url': build_public_url(key),
+                'content_type': content_type,
+                'headers': _put_headers(params),
+                'expires_in': 600,
+            })
+        return jsonify({'files': results})
+    except Exception as e:
+        logger.exception('presign batch failed')
+        return jsonify({'error': str(e)}), 500
+
+
+# --------- 浏览器分片直传（大文件） ---------
+# 浏览器按 part_size 切片，并发 PUT 到按批签名的分片 URL；中断后用同一 upload_id 查询已上传的分片，
+# 只补传缺失部分。完成时服务端按 R2 记录的分片（ETag/大小）完成上传，随后照常调用 finalize_upload。
+def _multipart_params(data):
+    key = (data.get('key') or '').lstrip('/')
+    upload_id = data.get('upload_id')
+    if not key or not upload_id:
+        return None, None, (jsonify({'error': '缺少必要参数（key 或 upload_id）'}), 400)
+    if not key.startswith('documents/'):
+        return None, None, (jsonify({'error': '不允许的对象路径'}), 400)
+    return key, upload_id, None
+
+
+def _is_no_such_upload(exc) -> bool:
+    return getattr(exc, 'response', {}).get('Error', {}).get('Code') == 'NoSuchUpload'
+
+
+@admin.route('/multipart-upload/create', methods=['POST'])
+@csrf.exempt
+def create_multipart_upload():
+    """创建分片上传：参数同 presign-upload，另需 size；返回 upload_id、分片大小/数量与建议并发数。"""
+    try:
+        data = request.get_json() or {}
+        content_type = data.get('content_type') or 'application/octet-stream'
+        try:
+            size = int(data.get('size') or 0)
+        except (TypeError, ValueError):
+            size = 0
+        max_size = current_app.config.get('UPLOAD_MAX_BYTES', 200 * 1024 * 1024)
+        if size <= 0 or size > max_size:
+            return jsonify({'error': f'文件大小不符合要求（最大 {max_size//1024//1024}MB）'}), 400
+        key, error, blob = _direct_upload_target(data)
+        if error is not None:
+            return error
+        if blob is not None:
+            return _duplicate_payload(blob)
+
+        part_size, part_count = plan_parts(size, current_app.config.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+        bucket, *_ = _get_config()
+        client = _s3_client()
+        resp = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        logger.info('Created multipart upload %s for %s: %d bytes in %d parts', resp['UploadId'], key, size, part_count)
+        return jsonify({
+            'key': key,
+            'upload_id': resp['UploadId'],
+            'public_url': build_public_url(key),
+            'content_type': content_type,
+            'part_size': part_size,
+            'part_count': part_count,
+            'concurrency': current_app.config.get('UPLOAD_CONCURRENCY', 4),
+        })
+    except Exception as e:
+        logger.exception('create multipart upload failed')
+        return jsonify({'error': str(e)}), 500
+
+
+@admin.route('/multipart-upload/presign-parts', methods=['POST'])
+@csrf.exempt
+def presign_multipart_parts():
+    """按批（每次最多 MAX_PRESIGN_BATCH 个）签名分片 URL -> {"urls": {分片号: URL}}。"""
+    try:
+        data = request.get_json() or {}
+        key, upload_id, error = _multipart_params(data)
+        if error is not None:
+            return error
+        try:
+            part_numbers = sorted({int(n) for n in data.get('part_numbers') or []})
+        except (TypeError, ValueError):
+            return jsonify({'error': 'part_numbers 格式不正确'}), 400
+        if not part_numbers or len(part_numbers) > MAX_PRESIGN_BATCH \
+                or part_numbers[0] < 1 or part_numbers[-1] > MAX_PARTS:
+            return jsonify({'error': f'每次签名 1~{MAX_PRESIGN_BATCH} 个分片（分片号 1~{MAX_PARTS}）'}), 400
+        bucket, *_ = _get_config()
+        urls = presign_parts(_s3_client(), bucket, key, upload_id, part_numbers)
+        return jsonify({'urls': {str(n): url for n, url in urls.items()}, 'expires_in': 3600})
+    except Exception as e:
+        logger.exception('presign parts failed')
+        return jsonify({'error': str(e)}), 500
+
+
+@admin.route('/multipart-upload/parts', methods=['POST'])
+@csrf.exempt
+def list_multipart_parts():
+    """断点续传：返回已上传的分片 {"parts": {分片号: 大小}}；上传已失效时返回 404。"""
+    try:
+        data = request.get_json() or {}
+        key, upload_id, error = _multipart_params(data)
+        if error is not None:
+            return error
+        bucket, *_ = _get_config()
+        try:
+            parts = list_uploaded_parts(_s3_client(), bucket, key, upload_id)
+        except Exception as e:
+            if _is_no_such_upload(e):
+                return jsonify({'error': '分片上传不存在或已结束'}), 404
+            raise
+        return jsonify({'parts': {str(n): size for n, (_, size) in parts.items()}})
+    except Exception as e:
+        logger.exception('list parts failed')
+        return jsonify({'error': str(e)}), 500
+
+
+@admin.route('/multipart-upload/complete', methods=['POST'])
+@csrf.exempt
+def complete_multipart_upload():
+    """完成分片上传（需 size 与创建时返回的 part_size）；分片缺失或大小不符时返回 409，可补传后重试。"""
+    try:
+        data = request.get_json() or {}
+        key, upload_id, error = _multipart_params(data)
+        if error is not None:
+            return error
+        try:
+            size = int(data.get('size') or 0)
+            part_size = int(data.get('part_size') or 0)
+        except (TypeError, ValueError):
+            size = part_size = 0
+        if size <= 0 or part_size <= 0:
+            return jsonify({'error': '缺少必要参数（size 或 part_size）'}), 400
+        bucket, *_ = _get_config()
+        try:
+            complete_parts(_s3_client(), bucket, key, upload_id, size, part_size)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            if _is_no_such_upload(e):
+                return jsonify({'error': '分片上传不存在或已结束'}), 404
+            raise
+        logger.info('Completed multipart upload %s for %s (%d bytes)', upload_id, key, size)
+        return jsonify({'success': True, 'key': key})
+    except Exception as e:
+        logger.exception('complete multipart upload failed')
+        return jsonify({'error': str(e)}), 500
+
+
+@admin.route('/multipart-upload/abort', methods=['POST'])
+@csrf.exempt
+def abort_multipart_upload():
+    """放弃分片上传（幂等），R2 释放已上传的分片。"""
+    try:
+        data = request.get_json() or {}
+        key, upload_id, error = _multipart_params(data)
+        if error is not None:
+            return error
+        bucket, *_ = _get_config()
+        try:
+            _s3_client().abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            if not _is_no_such_upload(e):
+                raise
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.exception('abort multipart upload failed')
+        return jsonify({'error': str(e)}), 500
+
+
 @admin.route('/presign-cover', methods=['POST'])
 @csrf.exempt
 def presign_cover():
@@ -465,9 +997,7 @@ def presign_cover():
         if not organization:
             return jsonify({'error': '组织不存在'}), 400
 
-        safe_name = _secure_timestamp_name(filename)
-        # 统一缩略图路径到 thumbnails/{org}/
-        key = f"thumbnails/{organization.name.lower()}/{safe_name}"
+        key = _cover_key(organization, filename)
 
         bucket, access_key, secret_key, endpoint, _ = _get_config()
         client = _s3_client()
@@ -511,17 +1041,10 @@ def finalize_cover():
         bucket, *_ = _get_config()
         client = _s3_client()
         try:
-            head = client.head_object(Bucket=bucket, Key=key)
-            size = int(head.get('ContentLength', 0))
-            ctype = (head.get('ContentType') or '').lower()
-            allowed = {'image/png','image/jpeg','image/jpg','image/webp','image/gif','image/svg+xml'}
-            max_size = 20 * 1024 * 1024  # 20MB
-            if size <= 0 or size > max_size:
+            error = _verify_uploaded_cover(client, bucket, key)
+            if error:
                 _delete_r2_object_safely(key)
-                return jsonify({'error': f'封面大小不符合要求（最大 {max_size//1024//1024}MB）'}), 400
-            if ctype and ctype not in allowed:
-                _delete_r2_object_safely(key)
-                return jsonify({'error': f'不支持的图片类型: {ctype}'}), 400
+                return jsonify({'error': error}), 400
         except Exception:
             logger.exception('head_object failed for cover key %s', key)
             _delete_r2_object_safely(key)
@@ -537,7 +1060,7 @@ def finalize_cover():
                 return jsonify({'error': '文档不存在'}), 404
             # 删除旧封面（仅当旧封面在 R2 且 key 不同）
             try:
-                old_cover_key = _extract_r2_key_from_url(getattr(doc, 'cover_url', None))
+                old_cover_key = _old_cover_key(getattr(doc, 'cover_url', None))
                 if old_cover_key and old_cover_key != key:
                     _delete_r2_object_safely(old_cover_key)
             except Exception:
@@ -559,6 +1082,141 @@ def finalize_cover():
         return jsonify({'error': str(e)}), 500
 
 
+# 直传文档允许的类型（可根据需要扩展）
+ALLOWED_DOCUMENT_TYPES = {
+    'application/pdf',
+    'application/zip', 'application/x-zip-compressed',
+    'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.ms-powerpoint', 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+}
+ALLOWED_COVER_TYPES = {'image/png', 'image/jpeg', 'image/jpg', 'image/webp', 'image/gif', 'image/svg+xml'}
+COVER_MAX_BYTES = 20 * 1024 * 1024
+
+
+def _old_cover_key(cover_url):
+    """被替换的封面中可随之删除的对象 key。
+
+    自动封面是预览第一页的页面图片（documents/preview/ 下），同时属于文档与相同内容的 blob 的页面图片，
+    可能被其他文档共用，不在这里删除，由 gc_r2_orphans 在无人引用后清理。
+    """
+    key = _extract_r2_key_from_url(cover_url)
+    if not key or key.startswith('documents/preview/'):
+        return None
+    return key
+
+
+def _verify_uploaded_cover(client, bucket, key):
+    """HEAD 校验直传的封面（类型与体积），不符合要求时返回错误信息。"""
+    head = client.head_object(Bucket=bucket, Key=key)
+    size = int(head.get('ContentLength', 0))
+    ctype = (head.get('ContentType') or '').lower()
+    if size <= 0 or size > COVER_MAX_BYTES:
+        return f'封面大小不符合要求（最大 {COVER_MAX_BYTES//1024//1024}MB）'
+    if ctype and ctype not in ALLOWED_COVER_TYPES:
+        return f'不支持的图片类型: {ctype}'
+    return None
+
+
+def _verify_uploaded_document(client, bucket, key, expected_size=None):
+    """校验直传完成的文档对象，返回 (大小, Content-Type, SHA-256 校验和, 错误信息)。
+
+    HEAD 取大小/类型与 R2 记录的校验和；浏览器上报的文件大小须与对象一致（分片上传时确认没有缺失/重复的分片），
+    并以 Range 读取文件头校验真实类型与扩展名一致。
+    """
+    head = client.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
+    size = int(head.get('ContentLength', 0))
+    ctype = head.get('ContentType') or ''
+    checksum = head.get('ChecksumSHA256')
+    max_size = current_app.config.get('UPLOAD_MAX_BYTES', 200 * 1024 * 1024)
+    if size <= 0 or size > max_size:
+        return size, ctype, checksum, f'文件大小不符合要求（最大 {max_size//1024//1024}MB）'
+    if ctype and ctype not in ALLOWED_DOCUMENT_TYPES:
+        return size, ctype, checksum, f'不支持的文件类型: {ctype}'
+    if expected_size is not None and int(expected_size) != size:
+        return size, ctype, checksum, f'上传的文件不完整（{size} / {int(expected_size)} 字节）'
+    head_bytes = client.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{SNIFF_BYTES - 1}')['Body'].read()
+    try:
+        sniff_content_type(head_bytes, key)
+    except UploadRejected as e:
+        return size, ctype, checksum, str(e)
+    return size, ctype, checksum, None
+
+
+def _check_uploaded_document(client, bucket, key, expected_size=None):
+    """校验直传完成的文档，返回 (文件信息, 错误信息)；不登记 blob，见 ``_register_uploaded_document``。
+
+    文件信息 dict：key、blob（复用的已存储内容）、sha256/size/content_type（待登记的内容地址对象）、
+    unverified（内容地址对象的内容尚未校验）、owned（对象为本次上传、失败时可删除）。
+    内容地址 key：预签名时按 SHA-256 命中已存储的相同内容时，浏览器不上传，直接复用且无需校验
+    （已存储的对象可能被其他文档引用，失败时也不能删除）。其余对象校验失败时删除。
+    浏览器上报的 SHA-256 不可信：单次直传时 R2 已按签入 URL 的校验和校验请求体，HEAD 取回的校验和一致
+    即可登记；分片上传等没有该校验和的对象不在请求内读取整个文件，先按普通文件落库，
+    由预览队列的校验任务计算 SHA-256 后再登记（见 ``preview_queue._verify``）。
+    """
+    sha256 = sha256_from_key(key)
+    stored_blob = find_blob(sha256) if sha256 else None
+    if stored_blob is not None:
+        return {'key': key, 'blob': stored_blob, 'sha256': None, 'unverified': False, 'owned': False}, None
+    size, ctype, checksum, error = _verify_uploaded_document(client, bucket, key, expected_size)
+    if error:
+        _delete_r2_object_safely(key)
+        return None, error
+    verified = bool(sha256) and checksum == checksum_sha256(sha256)
+    return {
+        'key': key, 'blob': None, 'sha256': sha256 if verified else None,
+        'unverified': bool(sha256) and not verified,
+        'size': size, 'content_type': ctype or None, 'owned': True,
+    }, None
+
+
+def _register_uploaded_document(info):
+    """同一请求的所有文件校验通过后再登记 blob，返回 (blob, 公开 URL)。
+
+    登记后对象由 blob 行引用（之后相同内容的上传会复用它），不再视为本次上传所有，失败时也不能删除。
+    """
+    if info['blob'] is None and info['sha256']:
+        info['blob'] = register_blob(
+            info['sha256'], info['size'], info['key'], build_public_url(info['key']), info['content_type']
+        )
+        info['owned'] = False
+    blob = info['blob']
+    return blob, (blob.url if blob is not None else build_public_url(info['key']))
+
+
+def _find_target_document(document_id, title):
+    """优先按 document_id 查找要更新的文档，回退按 title。"""
+    document = None
+    if document_id:
+        try:
+            document = Document.query.get(int(document_id))
+        except Exception:
+            document = None
+    if not document and title:
+        document = Document.query.filter_by(title=title).first()
+    return document
+
+
+def _apply_document_file(document, variant, blob, public_url):
+    """把直传的文件写入文档（未提交），返回 (是否需要生成预览, 待清理的旧文件 key)。
+
+    旧预览由预览队列在新预览生成后清理；按内容存储的旧文件可能仍被其他文档引用，留给孤儿对象清理。
+    """
+    from ..utils.preview_queue import VARIANT_FIELDS, needs_preview
+    file_url_field, _ = VARIANT_FIELDS[variant]
+    blob_field = BLOB_FIELDS[file_url_field]
+    old_file_key = None
+    if document.id is not None and not getattr(document, blob_field, None):
+        try:
+            old_file_key = _extract_r2_key_from_url(getattr(document, file_url_field, None))
+        except Exception:
+            old_file_key = None
+    if blob is not None:
+        return apply_blob(document, variant, blob), old_file_key
+    setattr(document, file_url_field, public_url)
+    return needs_preview(public_url), old_file_key
+
+
 @admin.route('/finalize-upload', methods=['POST'])
 @csrf.exempt
 def finalize_upload():
@@ -574,105 +1232,47 @@ def finalize_upload():
         if not all([org_id, category_id, document_type, title, key]):
             return jsonify({'error': '缺少必要参数'}), 400
 
+        # 复用已存储的相同内容时对象可能被其他文档引用，失败时不删除
+        sha256 = sha256_from_key(key)
+        owned = not (sha256 and find_blob(sha256))
+
         organization = Organization.query.get(org_id)
         category = Category.query.get(category_id)
         if not organization or not category:
-            _delete_r2_object_safely(key)
+            if owned:
+                _delete_r2_object_safely(key)
             return jsonify({'error': '组织或分类不存在'}), 400
 
-        is_chinese = (document_type == 'translation')
-
-        # HEAD 校验上传对象（大小/类型）
+        # 校验上传对象（HEAD 取大小/类型，Range 读取文件头）；复用已存储的内容时无需校验
         try:
             bucket, *_ = _get_config()
-            client = _s3_client()
-            head = client.head_object(Bucket=bucket, Key=key)
-            size = int(head.get('ContentLength', 0))
-            ctype = head.get('ContentType') or ''
-            # 允许类型（可根据需要扩展）
-            allowed_types = {
-                'application/pdf',
-                'application/zip', 'application/x-zip-compressed',
-                'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                'application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'application/vnd.ms-powerpoint', 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
-            }
-            max_size = 200 * 1024 * 1024  # 200MB 上限
-            if size <= 0 or size > max_size:
-                _delete_r2_object_safely(key)
-                return jsonify({'error': f'文件大小不符合要求（最大 {max_size//1024//1024}MB）'}), 400
-            if ctype and ctype not in allowed_types:
-                _delete_r2_object_safely(key)
-                return jsonify({'error': f'不支持的文件类型: {ctype}'}), 400
+            info, error = _check_uploaded_document(_s3_client(), bucket, key, data.get('size'))
         except Exception:
             logger.exception('head_object failed for key %s', key)
-            _delete_r2_object_safely(key)
+            if owned:
+                _delete_r2_object_safely(key)
             return jsonify({'error': '对象元数据校验失败，请稍后重试'}), 500
+        if error:
+            return jsonify({'error': error}), 400
+        key = info['key']
+        blob, public_url = _register_uploaded_document(info)
+        owned = info['owned']
 
-        # Download uploaded object to temp for preview generation (if PDF)
-        preview_url = None
-        public_url = build_public_url(key)
-        if key.lower().endswith('.pdf'):
-            try:
-                local_path = download_to_temp(key)
-                preview_url = None
-                from ..utils.pdf_preview import generate_document_preview
-                preview_url = generate_document_preview(
-                    organization.name.lower(),
-                    os.path.basename(key),
-                    local_path,
-                    is_chinese=is_chinese,
-                    use_r2=True
-                )
-                try:
-                    os.remove(local_path)
-                except Exception:
-                    pass
-            except Exception:
-                logger.exception('preview generation failed for key %s', key)
-
-        # Update or create document record
-        file_url_field = 'translation_file_url' if is_chinese else 'original_file_url'
-        preview_url_field = 'translation_preview_url' if is_chinese else 'original_preview_url'
-
-        # 优先按 document_id 更新，回退按 title
-        existing_document = None
-        if document_id:
-            try:
-                existing_document = Document.query.get(int(document_id))
-            except Exception:
-                existing_document = None
-        if not existing_document:
-            existing_document = Document.query.filter_by(title=title).first()
+        # PDF 预览在文档提交后由预览队列生成（见 utils/preview_queue.py），相同内容已有预览时直接复用
+        from ..utils.preview_queue import enqueue_and_kick
+        variant = 'translation' if document_type == 'translation' else 'original'
 
+        existing_document = _find_target_document(document_id, title)
         if existing_document:
-            # 记录旧对象 key，用于清理
-            try:
-                old_file_key = _extract_r2_key_from_url(getattr(existing_document, file_url_field, None))
-                old_preview_key = _extract_r2_key_from_url(getattr(existing_document, preview_url_field, None))
-            except Exception:
-                old_file_key = None
-                old_preview_key = None
-
-            setattr(existing_document, file_url_field, public_url)
-            if preview_url:
-                setattr(existing_document, preview_url_field, preview_url)
+            wants_preview, old_file_key = _apply_document_file(existing_document, variant, blob, public_url)
             # 不要在上传中文文件时覆盖已有的中文标题
             existing_document.org_id = organization.id
             existing_document.category_id = category.id
             existing_document.updated_at = datetime.utcnow()
             db.session.commit()
             # 清理旧对象（若存在且与新 key 不同）
-            try:
-                if old_file_key and old_file_key != key:
-                    _delete_r2_object_safely(old_file_key)
-                if preview_url and old_preview_key:
-                    # 只有在本次生成了新预览时才清理旧预览
-                    new_preview_key = _extract_r2_key_from_url(preview_url)
-                    if old_preview_key != new_preview_key:
-                        _delete_r2_object_safely(old_preview_key)
-            except Exception:
-                logger.exception('failed to cleanup old objects for doc %s', existing_document.id)
+            if old_file_key and old_file_key != key:
+                _delete_r2_object_safely(old_file_key)
             doc_id = existing_document.id
         else:
             new_document = Document(
@@ -680,28 +1280,147 @@ def finalize_upload():
                 org_id=organization.id,
                 category_id=category.id
             )
-            setattr(new_document, file_url_field, public_url)
-            if preview_url:
-                setattr(new_document, preview_url_field, preview_url)
+            wants_preview, _ = _apply_document_file(new_document, variant, blob, public_url)
             # 新建时也不自动设置中文标题，避免误覆盖
             db.session.add(new_document)
             db.session.commit()
             doc_id = new_document.id
 
-        return jsonify({'success': True, 'file_url': public_url, 'preview_url': preview_url, 'document_id': doc_id})
+        preview_status = None
+        if info['unverified']:
+            # 内容尚未校验：队列校验并登记 blob 后再生成预览
+            queued = enqueue_and_kick(doc_id, variant, public_url, kind='verify')
+            preview_status = queued if wants_preview else None
+        elif wants_preview:
+            preview_status = enqueue_and_kick(doc_id, variant, public_url)
+
+        return jsonify({
+            'success': True, 'file_url': public_url, 'document_id': doc_id,
+            'preview_url': blob.preview_url if blob is not None else None,
+            'preview_status': preview_status
+        })
     except Exception as e:
         db.session.rollback()
         logger.exception('finalize failed')
         try:
             # best-effort cleanup
             key = (locals().get('key') or '').lstrip('/')
-            if key:
+            if key and locals().get('owned'):
                 _delete_r2_object_safely(key)
         except Exception:
             pass
         return jsonify({'error': str(e)}), 500
 
 
+@admin.route('/finalize-batch', methods=['POST'])
+@csrf.exempt
+def finalize_batch():
+    """批量直传完成后一次落库：逐个校验对象，全部通过后在同一事务中写入文档的各文件字段。
+
+    参数同 finalize-upload（不含 document_type/key/size），另有 files: [{kind, key, size}]；
+    任一文件校验失败时不修改文档，并删除本批次上传的对象。
+    """
+    owned_keys = []
+    try:
+        data = request.get_json() or {}
+        files, error = _batch_files(data)
+        if error is not None:
+            return error
+        title = data.get('title')
+        document_id = data.get('document_id')
+        if not all([data.get('organization_id'), data.get('category_id')]) or not (title or document_id) \
+                or not all(f.get('key') for f in files):
+            return jsonify({'error': '缺少必要参数'}), 400
+        for f in files:
+            sha256 = sha256_from_key(f['key'])
+            if f['kind'] == 'cover' or not (sha256 and find_blob(sha256)):
+                owned_keys.append(f['key'])
+
+        organization = Organization.query.get(data.get('organization_id'))
+        category = Category.query.get(data.get('category_id'))
+        if not organization or not category:
+            _delete_r2_objects_safely(owned_keys)
+            return jsonify({'error': '组织或分类不存在'}), 400
+
+        # 逐个校验（共用一个客户端）；任一失败则放弃整批
+        bucket, *_ = _get_config()
+        client = _s3_client()
+        checked = []
+        for f in files:
+            info = None
+            try:
+                if f['kind'] == 'cover':
+                    error = _verify_uploaded_cover(client, bucket, f['key'])
+                else:
+                    info, error = _check_uploaded_document(client, bucket, f['key'], f.get('size'))
+            except Exception:
+                logger.exception('head_object failed for key %s', f['key'])
+                error = '对象元数据校验失败，请稍后重试'
+            if error:
+                _delete_r2_objects_safely(owned_keys)
+                return jsonify({'error': error, 'kind': f['kind']}), 400
+            checked.append((f['kind'], info, f['key']))
+
+        # 全部校验通过后才登记 blob：已登记的对象可能被之后的重复上传复用，不能再随本批次删除
+        resolved = []
+        for kind, info, key in checked:
+            if info is None:
+                resolved.append((kind, key, None, build_public_url(key), False))
+                continue
+            blob, public_url = _register_uploaded_document(info)
+            if not info['owned']:
+                owned_keys = [k for k in owned_keys if k != info['key']]
+            resolved.append((kind, info['key'], blob, public_url, info['unverified']))
+
+        document = _find_target_document(document_id, title)
+        if document is None:
+            if not title:
+                return jsonify({'error': '文档不存在'}), 404
+            document = Document(title=title)
+            db.session.add(document)
+        old_keys, queued = [], []
+        for kind, key, blob, public_url, unverified in resolved:
+            if kind == 'cover':
+                old_key = _old_cover_key(document.cover_url) if document.id is not None else None
+                document.cover_url = public_url
+            else:
+                wants_preview, old_key = _apply_document_file(document, kind, blob, public_url)
+                # 内容尚未校验：队列校验并登记 blob 后再生成预览
+                if unverified:
+                    queued.append((kind, public_url, 'verify', wants_preview))
+                elif wants_preview:
+                    queued.append((kind, public_url, 'preview', True))
+            if old_key and old_key != key:
+                old_keys.append(old_key)
+        document.org_id = organization.id
+        document.category_id = category.id
+        document.updated_at = datetime.utcnow()
+        db.session.commit()
+        owned_keys = []
+
+        # 提交后再清理被替换的旧对象（一次批量删除）与登记预览
+        _delete_r2_objects_safely(old_keys)
+        from ..utils.preview_queue import VARIANT_FIELDS, enqueue_and_kick
+        statuses = {}
+        for kind, url, job_kind, wants_preview in queued:
+            status = enqueue_and_kick(document.id, kind, url, kind=job_kind)
+            if wants_preview:
+                statuses[kind] = status
+        results = {}
+        for kind, key, blob, public_url, _ in resolved:
+            entry = {'file_url': public_url}
+            if kind != 'cover':
+                entry['preview_url'] = getattr(document, VARIANT_FIELDS[kind][1])
+                entry['preview_status'] = statuses.get(kind)
+            results[kind] = entry
+        return jsonify({'success': True, 'document_id': document.id, 'files': results})
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('finalize batch failed')
+        _delete_r2_objects_safely(owned_keys)
+        return jsonify({'error': str(e)}), 500
+
+
 # --------- 文档导出（R2 -> ZIP） ---------
 @admin.route('/export-documents', methods=['GET'])
 def export_documents_page():
@@ -715,7 +1434,11 @@ def export_documents_page():
         admin_view=getattr(admin_inst, 'index_view', None),
         h=admin_helpers,
         helpers=admin_helpers,
-        get_url=admin_helpers.get_url
+        get_url=admin_helpers.get_url,
+        export_target=str(current_app.config.get('EXPORT_TARGET', 'r2')).lower(),
+        export_r2_prefix=current_app.config.get('EXPORT_R2_PREFIX', 'exports/'),
+        organizations=Organization.query.order_by(Organization.name).all(),
+        categories=Category.query.order_by(Category.name).all()
     )
 
 
@@ -723,67 +1446,224 @@ def export_documents_page():
 @csrf.exempt
 def start_export_documents():
     _expire_old_tasks()
-    task = _new_export_task()
+    try:
+        scope = ExportScope.from_args(request.get_json(silent=True) or request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    max_jobs = int(current_app.config.get('EXPORT_MAX_JOBS', 1))
+    task = export_tasks.create_task('documents', params=scope.to_json(), max_active=max_jobs)
+    if task is None:
+        return jsonify({'error': '已有导出任务在执行，请等待其完成或取消后再试'}), 429
     task_id = task['id']
-    app_obj = current_app._get_current_object()
-    worker = threading.Thread(target=_export_documents_worker, args=(app_obj, task_id), daemon=True)
-    worker.start()
+    try:
+        jobs.spawn_job(current_app._get_current_object(), 'export-documents', task_id)
+    except Exception as e:
+        logger.exception('启动导出任务失败')
+        export_tasks.update_task(task_id, status='failed', message=f'启动导出任务失败: {e}')
+        return jsonify({'error': '启动导出任务失败'}), 500
     return jsonify({'task_id': task_id, 'status': 'started'})
 
 
+@admin.route('/export-documents/stream', methods=['GET'])
+def stream_export_documents():
+    """流式导出：边打包边下载，不在服务器暂存 ZIP（不支持暂停/继续）。"""
+    from flask import Response, stream_with_context
+    try:
+        scope = ExportScope.from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if scope.incremental:
+        return jsonify({'error': '流式下载不支持增量导出，请使用“开始导出”'}), 400
+    try:
+        client = _s3_client()
+        bucket, *_ = _get_config()
+    except Exception as e:
+        logger.exception('流式导出初始化失败')
+        return jsonify({'error': str(e)}), 500
+    concurrency = max(1, int(current_app.config.get('EXPORT_PREFETCH_CONCURRENCY', 4)))
+    response = Response(
+        stream_with_context(_stream_export_zip(client, bucket, concurrency, CompressionPolicy.from_config(current_app.config), scope)),
+        mimetype='application/zip'
+    )
+    download_name = f'documents-export-{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.zip'
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    # 关闭反向代理缓冲，使首字节尽快到达浏览器
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _export_status_payload(task: dict, download_url: str) -> dict:
+    """返回给前端的任务状态（隐藏服务器路径、R2 key 与执行进程）。"""
+    data = dict(task)
+    data.pop('zip_path', None)
+    data.pop('result_key', None)
+    data.pop('owner', None)
+    if task.get('download_ready'):
+        data['download_url'] = download_url
+    return data
+
+
+def _sse_message(event: str, data: dict, event_id=None) -> str:
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _iter_export_events(task_id: str, task: dict, download_url: str, interval: float,
+                        heartbeat: float, max_seconds: float):
+    """逐次读取任务行，有变化时推送；首条为完整快照（snapshot），之后只推送变化的字段（progress）。
+
+    每个间隔最多推送一次；无变化超过 ``heartbeat`` 秒时发送注释行保持连接；任务结束后发送
+    ``end`` 并关闭，连接超过 ``max_seconds`` 时主动关闭，由浏览器按 ``retry`` 自动重连。
+    """
+    yield f'retry: {int(SSE_RETRY_MS)}\n\n'
+    started = last_write = time.monotonic()
+    last = None
+    seq = 0
+    while True:
+        payload = _export_status_payload(task, download_url)
+        for field in SSE_VOLATILE_FIELDS:
+            payload.pop(field, None)
+        if last is None:
+            seq += 1
+            yield _sse_message('snapshot', payload, seq)
+            last_write = time.monotonic()
+        else:
+            delta = {k: v for k, v in payload.items() if last.get(k) != v}
+            if delta:
+                seq += 1
+                yield _sse_message('progress', delta, seq)
+                last_write = time.monotonic()
+        last = payload
+        if payload.get('status') in export_tasks.TERMINAL_STATUSES:
+            yield _sse_message('end', {'status': payload.get('status')})
+            return
+        now = time.monotonic()
+        if now - started >= max_seconds:
+            return
+        if now - last_write >= heartbeat:
+            yield ': ping\n\n'
+            last_write = now
+        time.sleep(interval)
+        task = export_tasks.get_task(task_id)
+        if task is None:
+            yield _sse_message('gone', {'error': '任务不存在或已过期'})
+            return
+
+
+@admin.route('/r2-metrics', methods=['GET'])
+def r2_call_metrics():
+    """当前 worker 进程的 R2 调用次数、错误/重试次数与耗时；``?reset=1`` 读取后清零。"""
+    reset = request.args.get('reset', '').lower() in ('1', 'true', 'on')
+    return jsonify({'pid': os.getpid(), 'operations': r2_metrics(reset=reset)})
+
+
 @admin.route('/export-documents/status/<task_id>', methods=['GET'])
 def export_documents_status(task_id):
     _expire_old_tasks()
-    task = _get_task(task_id)
+    task = export_tasks.get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在或已过期'}), 404
-    data = dict(task)
-    if task.get('download_ready'):
-        data['download_url'] = url_for('admin_panel.download_exported_documents', task_id=task_id)
-    return jsonify(data)
+    return jsonify(_export_status_payload(
+        task, url_for('admin_panel.download_exported_documents', task_id=task_id)
+    ))
+
+
+@admin.route('/export-documents/events/<task_id>', methods=['GET'])
+def export_documents_events(task_id):
+    """以 Server-Sent Events 推送导出进度（前端不支持或连接失败时回退到轮询 status 接口）。
+
+    鉴权与过期任务回收只在建立连接时执行一次；之后每个间隔按主键读取一次任务行。
+    """
+    from flask import Response, stream_with_context
+    _expire_old_tasks()
+    task = export_tasks.get_task(task_id)
+    if not task:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    cfg = current_app.config
+    events = _iter_export_events(
+        task_id, task,
+        download_url=url_for('admin_panel.download_exported_documents', task_id=task_id),
+        interval=max(0.2, float(cfg.get('EXPORT_SSE_INTERVAL', 1.0))),
+        heartbeat=max(1.0, float(cfg.get('EXPORT_SSE_HEARTBEAT', 15))),
+        max_seconds=max(1.0, float(cfg.get('EXPORT_SSE_MAX_SECONDS', 300)))
+    )
+    # 连接期间不占用请求的数据库会话（任务行通过 export_tasks 的独立短连接读取）
+    db.session.close()
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @admin.route('/export-documents/pause/<task_id>', methods=['POST'])
 @csrf.exempt
 def pause_export_documents(task_id):
-    task = _get_task(task_id)
+    task = export_tasks.get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在'}), 404
     if task.get('status') not in {'running', 'pending'}:
         return jsonify({'error': '当前状态不可暂停', 'status': task.get('status')}), 400
-    updated = _set_paused(task_id, True)
-    return jsonify(updated or {'error': '状态更新失败'}), 200
+    updated = export_tasks.set_paused(task_id, True)
+    if not updated:
+        return jsonify({'error': '当前状态不可暂停'}), 400
+    return jsonify(updated)
 
 
 @admin.route('/export-documents/resume/<task_id>', methods=['POST'])
 @csrf.exempt
 def resume_export_documents(task_id):
-    task = _get_task(task_id)
+    task = export_tasks.get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在'}), 404
     if not task.get('paused'):
         return jsonify({'error': '任务未暂停', 'status': task.get('status')}), 400
-    updated = _set_paused(task_id, False)
-    return jsonify(updated or {'error': '状态更新失败'}), 200
+    updated = export_tasks.set_paused(task_id, False)
+    if not updated:
+        return jsonify({'error': '任务未暂停'}), 400
+    return jsonify(updated)
 
 
 @admin.route('/export-documents/cancel/<task_id>', methods=['POST'])
 @csrf.exempt
 def cancel_export_documents(task_id):
-    task = _get_task(task_id)
+    task = export_tasks.get_task(task_id)
     if not task:
         return jsonify({'error': '任务不存在'}), 404
-    if task.get('status') in {'success', 'delivered', 'failed', 'cancelled'}:
+    if task.get('status') in export_tasks.TERMINAL_STATUSES:
         return jsonify({'error': '当前状态不可取消', 'status': task.get('status')}), 400
-    _mark_cancel(task_id)
+    export_tasks.mark_cancel(task_id)
     return jsonify({'status': 'cancelling'})
 
 
 @admin.route('/export-documents/download/<task_id>', methods=['GET'])
 def download_exported_documents(task_id):
-    task = _get_task(task_id)
+    task = export_tasks.get_task(task_id)
     if not task or task.get('status') not in {'success', 'delivered'}:
         return jsonify({'error': '任务未完成或不存在'}), 404
+    download_name = f'documents-export-{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.zip'
+    if task.get('result_key'):
+        # 导出包在 R2 上：重定向到限时预签名 URL，下载流量不经过应用；对象在任务过期时删除
+        if not task.get('download_ready'):
+            return jsonify({'error': '导出文件已被清理'}), 404
+        try:
+            url = generate_presigned_get_url(
+                task['result_key'],
+                expires_in=int(current_app.config.get('EXPORT_URL_EXPIRES', 3600)),
+                download_name=download_name
+            )
+        except Exception as e:
+            logger.exception('生成导出下载链接失败: %s', task_id)
+            return jsonify({'error': f'生成下载链接失败: {e}'}), 500
+        export_tasks.update_task(task_id, status='delivered', message='已生成下载链接')
+        try:
+            mark_delivered(task_id)
+        except Exception:
+            db.session.rollback()
+            logger.exception('更新导出清单失败: %s', task_id)
+        return redirect(url)
     zip_path = task.get('zip_path')
     if not zip_path or not os.path.exists(zip_path):
         return jsonify({'error': '导出文件已被清理'}), 404
@@ -795,10 +1675,15 @@ def download_exported_documents(task_id):
                 os.remove(zip_path)
         except Exception:
             logger.exception('下载后清理 ZIP 失败: %s', zip_path)
-        _update_task(task_id, status='delivered', download_ready=False, message='已下载', zip_path=None)
+        export_tasks.update_task(task_id, status='delivered', download_ready=False, message='已下载', zip_path=None)
+        # 已交付的清单成为下次增量导出的基准
+        try:
+            mark_delivered(task_id)
+        except Exception:
+            db.session.rollback()
+            logger.exception('更新导出清单失败: %s', task_id)
         return response
 
-    download_name = f'documents-export-{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.zip'
     return send_file(zip_path, as_attachment=True, download_name=download_name, mimetype='application/zip')
 
 
@@ -871,10 +1756,24 @@ def upload_thumbnail():
 
 
 # --------- Helpers ---------
+def _registered_blob_keys(keys):
+    """已登记为 blob 的内容地址 key：blob 行仍在时相同内容的上传会复用该对象，不能删除。"""
+    registered = set()
+    for key in keys:
+        sha256 = sha256_from_key(key)
+        blob = find_blob(sha256) if sha256 else None
+        if blob is not None and blob.key == key:
+            registered.add(key)
+    return registered
+
+
 def _delete_r2_object_safely(key: str):
     try:
         if not key:
             return
+        if _registered_blob_keys([key]):
+            logger.warning('Skip deleting %s: registered as a blob', key)
+            return
         bucket, *_ = _get_config()
         client = _s3_client()
         client.delete_object(Bucket=bucket, Key=key)
@@ -883,33 +1782,29 @@ def _delete_r2_object_safely(key: str):
         logger.exception('Failed to delete R2 object: %s', key)
 
 
+def _delete_r2_objects_safely(keys):
+    """批量删除（一次 delete_objects 请求），失败只记日志。"""
+    keys = {k for k in keys if k}
+    try:
+        registered = _registered_blob_keys(keys)
+    except Exception:
+        logger.exception('Failed to check blobs before deleting: %s', sorted(keys))
+        return
+    if registered:
+        logger.warning('Skip deleting registered blobs: %s', sorted(registered))
+    keys = sorted(keys - registered)
+    if not keys:
+        return
+    try:
+        for key, code in delete_objects(keys):
+            logger.warning('Failed to delete R2 object %s: %s', key, code)
+        logger.info('Deleted %d R2 objects: %s', len(keys), keys)
+    except Exception:
+        logger.exception('Failed to delete R2 objects: %s', keys)
+
+
 def _secure_timestamp_name(original_filename: str) -> str:
     base, ext = os.path.splitext(original_filename or '')
     base = secure_filename(base or 'file')
     ts = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
     return f"{base}_{ts}{ext.lower()}"
-
-
-def _extract_r2_key_from_url(url: str | None) -> str | None:
-    """根据当前配置，从公开 URL 反推出 R2 的对象 key。
-    支持两种形式：
-    - CDN 前缀：CDN_URL/{key}
-    - 直连前缀：{endpoint}/{bucket}/{key}
-    其他前缀（如本地 /static）返回 None。
-    """
-    try:
-        if not url:
-            return None
-        bucket, _, _, endpoint, cdn_base = _get_config()
-        u = url.strip()
-        if cdn_base:
-            base = cdn_base.rstrip('/') + '/'
-            if u.startswith(base):
-                return u[len(base):]
-        default_base = f"{endpoint.rstrip('/')}/{bucket}"
-        base2 = default_base.rstrip('/') + '/'
-        if u.startswith(base2):
-            return u[len(base2):]
-    except Exception:
-        logger.exception('extract key from url failed: %s', url)
-    return None
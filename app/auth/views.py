@@ -62,8 +62,10 @@ def profile():
 def edit_profile():
     form = EditProfileForm()
     if form.validate_on_submit():
-        current_user.username = form.username.data
-        current_user.email = form.email.data
+        # current_user 为只读快照，修改需取回模型实例（提交后快照自动失效）
+        user = User.query.get_or_404(current_user.id)
+        user.username = form.username.data
+        user.email = form.email.data
         db.session.commit()
         flash('您的资料已更新')
         return redirect(url_for('auth.profile'))
@@ -78,8 +80,9 @@ def edit_profile():
 def change_password():
     form = ChangePasswordForm()
     if form.validate_on_submit():
+        user = User.query.get_or_404(current_user.id)
         # Check if old password is correct
-        if not current_user.check_password(form.old_password.data):
+        if not user.check_password(form.old_password.data):
             flash('当前密码不正确')
             return render_template('auth/change_password.html', form=form)
         
@@ -89,7 +92,7 @@ def change_password():
             return render_template('auth/change_password.html', form=form)
         
         # Update password
-        current_user.set_password(form.new_password.data)
+        user.set_password(form.new_password.data)
         db.session.commit()
         flash('您的密码已更新')
         return redirect(url_for('auth.profile'))
@@ -1,17 +1,11 @@
 from flask import render_template, request, jsonify, current_app
 from . import main
 from .. import db
-from ..models import Document, Organization, Category
+from ..models import Document, Organization, Category, DocumentNeighbor
 from sqlalchemy import func, desc, and_, or_
 from sqlalchemy.orm import joinedload
 from datetime import datetime
 import os
-import requests
-
-try:
-    from markdown import Markdown
-except Exception:
-    Markdown = None
 
 @main.route('/')
 def index():
@@ -43,31 +37,7 @@ def index():
 @main.route('/about/organizations')
 def organizations_intro():
     lang = request.args.get('lang', 'zh').lower()
-    # 定位 Markdown 文件
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    md_filename = 'organizations_en.md' if lang == 'en' else 'organizations.md'
-    md_path = os.path.join(base_dir, 'content', md_filename)
-
-    # 读取内容
-    if not os.path.exists(md_path):
-        content_html = '<p>内容文件缺失：app/content/organizations.md</p>'
-        toc_html = ''
-        updated_at = None
-    else:
-        with open(md_path, 'r', encoding='utf-8') as f:
-            md_text = f.read()
-        updated_at = datetime.fromtimestamp(os.path.getmtime(md_path))
-
-        if Markdown is None:
-            # 未安装 Markdown 依赖时的降级渲染
-            content_html = '<pre style="white-space: pre-wrap;">' + (
-                md_text.replace('<', '&lt;').replace('>', '&gt;')
-            ) + '</pre>'
-            toc_html = ''
-        else:
-            md = Markdown(extensions=['toc', 'fenced_code', 'tables'])
-            content_html = md.convert(md_text)
-            toc_html = getattr(md, 'toc', '')
+    content_html, toc_html, updated_at = _render_organizations_intro(lang)
 
     return render_template(
         'organizations_intro.html',
@@ -181,7 +151,12 @@ def document_detail(id):
         'original': _get_file_size_human(doc.original_file_url),
         'translation': _get_file_size_human(doc.translation_file_url)
     }
-    return render_template('document_detail.html', doc=doc, file_sizes=file_sizes)
+    # 相关文档由 scripts/build_related.py 离线计算，这里按 (document_id, rank) 索引一次查询
+    related = DocumentNeighbor.query.options(
+        joinedload(DocumentNeighbor.neighbor).joinedload(Document.organization)
+    ).filter(DocumentNeighbor.document_id == doc.id, DocumentNeighbor.rank >= 1).order_by(DocumentNeighbor.rank).all()
+    related_docs = [n.neighbor for n in related if n.neighbor is not None]
+    return render_template('document_detail.html', doc=doc, file_sizes=file_sizes, related_docs=related_docs)
 
 @main.route('/download-history')
 def download_history():
@@ -191,11 +166,61 @@ def download_history():
 
 
 # Helpers
+# 组织介绍页渲染结果缓存：{md_path: (mtime, (content_html, toc_html, updated_at))}
+# 只读内容，在 gunicorn preload 时由 warm_caches 预先生成，fork 后各 worker 共享
+_ORG_INTRO_CACHE: dict = {}
+
+
+def _render_organizations_intro(lang: str):
+    """渲染组织介绍 Markdown，按文件修改时间缓存结果。"""
+    # 定位 Markdown 文件
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    md_filename = 'organizations_en.md' if lang == 'en' else 'organizations.md'
+    md_path = os.path.join(base_dir, 'content', md_filename)
+
+    # 读取内容
+    if not os.path.exists(md_path):
+        return '<p>内容文件缺失：app/content/organizations.md</p>', '', None
+
+    mtime = os.path.getmtime(md_path)
+    cached = _ORG_INTRO_CACHE.get(md_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(md_path, 'r', encoding='utf-8') as f:
+        md_text = f.read()
+    updated_at = datetime.fromtimestamp(mtime)
+
+    from ..utils.markdown import _load_markdown
+    Markdown = _load_markdown()
+    if Markdown is None:
+        # 未安装 Markdown 依赖时的降级渲染
+        content_html = '<pre style="white-space: pre-wrap;">' + (
+            md_text.replace('<', '&lt;').replace('>', '&gt;')
+        ) + '</pre>'
+        toc_html = ''
+    else:
+        md = Markdown(extensions=['toc', 'fenced_code', 'tables'])
+        content_html = md.convert(md_text)
+        toc_html = getattr(md, 'toc', '')
+
+    result = (content_html, toc_html, updated_at)
+    _ORG_INTRO_CACHE[md_path] = (mtime, result)
+    return result
+
+
+def warm_public_caches():
+    """预热公共页面的只读缓存（供 gunicorn preload 阶段调用）。"""
+    for lang in ('zh', 'en'):
+        _render_organizations_intro(lang)
+
+
 def _get_file_size_human(url: str | None) -> str | None:
     """获取远程文件大小并格式化为可读字符串；失败时返回 None。"""
     if not url:
         return None
     try:
+        import requests
         resp = requests.head(url, allow_redirects=True, timeout=5)
         size = resp.headers.get('Content-Length')
         if not size:
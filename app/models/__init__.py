@@ -3,5 +3,10 @@ from .organization import Organization
 from .category import Category
 from .document import Document
 from .download_stat import DownloadStat
+from .document_neighbor import DocumentNeighbor
+from .export_task import ExportTask
+from .export_manifest import ExportManifest
+from .preview_job import PreviewJob
+from .blob import Blob
 
-__all__ = ['User', 'Organization', 'Category', 'Document', 'DownloadStat']
+__all__ = ['User', 'Organization', 'Category', 'Document', 'DownloadStat', 'DocumentNeighbor', 'ExportTask', 'ExportManifest', 'PreviewJob', 'Blob']
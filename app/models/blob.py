@@ -0,0 +1,28 @@
+from datetime import datetime
+
+# 延迟导入db以避免循环导入
+from app import db
+
+
+class Blob(db.Model):
+    """按内容（SHA-256）存储的文档文件，相同内容只保存一份（见 utils/blobs.py）。
+
+    ``ref_count`` 为引用该文件的文档字段数（``documents.original_blob_id``/``translation_blob_id``），
+    由文档的 ORM 事件维护；降为 0 的文件由孤儿对象清理回收。同一内容的 PDF 预览也只生成一次，
+    记在 ``preview_url``，预览前几页的 WebP 图片记在 ``page_images``。
+    """
+    __tablename__ = 'blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    content_type = db.Column(db.String(128))
+    key = db.Column(db.String(512), nullable=False)  # R2 key；本地存储时文件位于 static/uploads/{key}
+    url = db.Column(db.String(512), nullable=False, unique=True)
+    preview_url = db.Column(db.String(512))
+    page_images = db.Column(db.Text)  # JSON，见 utils/page_images.py
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Blob {self.id} {self.sha256[:12]} refs={self.ref_count}>'
@@ -20,6 +20,12 @@ class Document(db.Model):
     translation_file_url = db.Column(db.String(512))  # 中文版PDF链接
     original_preview_url = db.Column(db.String(512))  # 原版PDF预览链接（前10页）
     translation_preview_url = db.Column(db.String(512))  # 中文版PDF预览链接（前10页）
+    original_page_images = db.Column(db.Text)  # 原版预览前几页的 WebP 图片（JSON，见 utils/page_images.py）
+    translation_page_images = db.Column(db.Text)  # 中文版预览前几页的 WebP 图片
+    # 文件对应的按内容存储记录（由文件 URL 自动关联，见 utils/blobs.py）
+    original_blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), index=True)
+    translation_blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), index=True)
+    preview_status = db.Column(db.String(16))  # 预览生成状态：pending/processing/ready/failed（见 utils/preview_queue.py）
     price = db.Column(db.Integer, default=0)  # 价格(以人民币计价，单位元)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -29,6 +35,10 @@ class Document(db.Model):
     category = db.relationship('Category', backref=db.backref('cat_documents', lazy='dynamic'))
     # 下载统计已停用，保留字段可按需移除/迁移
     download_stats = db.relationship('DownloadStat', backref='document', lazy='dynamic')
+    # 预计算的相关文档（删除文档时一并删除其邻居行）
+    neighbors = db.relationship('DocumentNeighbor', foreign_keys='DocumentNeighbor.document_id',
+                                cascade='all, delete-orphan', lazy='dynamic',
+                                order_by='DocumentNeighbor.rank')
     
     def __repr__(self):
         return f'<Document {self.chinese_title or self.title}>'
@@ -60,6 +70,16 @@ class Document(db.Model):
         parts = [p.strip() for p in re.split(r"\n\s*\n", text) if p and p.strip()]
         return parts
 
+    @property
+    def preview_pages(self):
+        """详情页展示的页面图片：(版本, [页面])，优先原版；没有时返回 (None, [])。"""
+        from app.utils.page_images import parse_pages
+        for variant in ('original', 'translation'):
+            pages = parse_pages(getattr(self, f'{variant}_page_images'))
+            if pages:
+                return variant, pages
+        return None, []
+
     def set_summary_paragraphs(self, paragraphs):
         """传入段落数组，使用空行拼接为 Markdown 文本。"""
         if not paragraphs:
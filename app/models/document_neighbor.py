@@ -0,0 +1,28 @@
+from datetime import datetime
+
+# 延迟导入db以避免循环导入
+from app import db
+
+class DocumentNeighbor(db.Model):
+    """离线计算的“相关文档”：每篇文档按相似度保存前 k 个邻居。
+
+    由 ``scripts/build_related.py`` 生成，详情页按 (document_id, rank) 索引一次查询读取。
+    """
+    __tablename__ = 'document_neighbors'
+    __table_args__ = (
+        db.Index('ix_document_neighbors_doc_rank', 'document_id', 'rank'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)  # 余弦相似度
+    rank = db.Column(db.Integer, nullable=False)  # 从 1 开始；0 为没有邻居的空结果标记（neighbor_id 指向自身）
+    source_hash = db.Column(db.String(40), nullable=False)  # 计算时 document 文本的哈希，用于增量判断
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 关系
+    neighbor = db.relationship('Document', foreign_keys=[neighbor_id])
+
+    def __repr__(self):
+        return f'<DocumentNeighbor {self.document_id}->{self.neighbor_id} #{self.rank}>'
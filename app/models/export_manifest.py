@@ -0,0 +1,24 @@
+from datetime import datetime
+
+# 延迟导入db以避免循环导入
+from app import db
+
+class ExportManifest(db.Model):
+    """某次导出打包的对象清单（key -> ETag/大小），供增量导出比对。
+
+    ``scope`` 为规范化后的导出范围（见 ``utils/export_scope.py``），只有同一范围的清单可以互相比对；
+    导出包被下载后 ``delivered`` 置为 True，下次增量导出以最近一份已下载的清单为基准。
+    """
+    __tablename__ = 'export_manifests'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(512), nullable=False, index=True)
+    task_id = db.Column(db.String(32), index=True)
+    entries = db.Column(db.Text, nullable=False)  # JSON: {key: {"etag": ..., "size": ...}}
+    object_count = db.Column(db.Integer, nullable=False, default=0)
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    delivered = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ExportManifest {self.id} {self.scope} {self.object_count}>'
@@ -0,0 +1,41 @@
+import time
+
+# 延迟导入db以避免循环导入
+from app import db
+
+class ExportTask(db.Model):
+    """后台导出任务状态。
+
+    保存在数据库中而非进程内存，任意 gunicorn worker 都能查询进度、暂停/取消和下载；
+    执行任务的进程定期写入 heartbeat_at，超时未更新的任务视为孤儿并被回收。
+    时间字段为 Unix 时间戳（秒），与前端轮询接口保持一致。
+    """
+    __tablename__ = 'export_tasks'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False, default='documents')
+    params = db.Column(db.Text)  # JSON：导出范围等参数
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(512))
+    paused = db.Column(db.Boolean, nullable=False, default=False)
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    total_files = db.Column(db.Integer, nullable=False, default=0)
+    processed_files = db.Column(db.Integer, nullable=False, default=0)
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    processed_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    downloaded_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    uploaded_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    throughput_bps = db.Column(db.BigInteger, nullable=False, default=0)
+    avg_throughput_bps = db.Column(db.BigInteger, nullable=False, default=0)
+    elapsed_seconds = db.Column(db.Float, nullable=False, default=0)
+    zip_path = db.Column(db.String(512))
+    result_key = db.Column(db.String(512))  # 上传到 R2 的导出包 key（EXPORT_TARGET=r2）
+    download_ready = db.Column(db.Boolean, nullable=False, default=False)
+    owner = db.Column(db.String(128))  # 执行进程：主机名:PID
+    heartbeat_at = db.Column(db.Float)
+    created_at = db.Column(db.Float, default=time.time)
+    updated_at = db.Column(db.Float, default=time.time)
+
+    def __repr__(self):
+        return f'<ExportTask {self.id} {self.status}>'
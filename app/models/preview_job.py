@@ -0,0 +1,32 @@
+import time
+
+# 延迟导入db以避免循环导入
+from app import db
+
+
+class PreviewJob(db.Model):
+    """预览队列任务（见 utils/preview_queue.py）：生成 PDF 预览，或校验直传文件的内容。
+
+    记录入队时的文件 URL；执行时文档已更换文件则跳过。时间字段为 Unix 时间戳（秒）。
+    """
+    __tablename__ = 'preview_jobs'
+    __table_args__ = (
+        db.Index('ix_preview_jobs_status_next_run', 'status', 'next_run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    variant = db.Column(db.String(16), nullable=False)  # original / translation
+    kind = db.Column(db.String(16), nullable=False, default='preview', server_default='preview')  # preview / verify
+    file_url = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_run_at = db.Column(db.Float, nullable=False, default=time.time)
+    message = db.Column(db.String(512))
+    owner = db.Column(db.String(128))  # 执行进程：主机名:PID
+    started_at = db.Column(db.Float)
+    created_at = db.Column(db.Float, default=time.time)
+    updated_at = db.Column(db.Float, default=time.time)
+
+    def __repr__(self):
+        return f'<PreviewJob {self.id} doc={self.document_id} {self.variant} {self.kind} {self.status}>'
@@ -0,0 +1,189 @@
+// 大文件分片直传 R2（后台文档上传）
+// 服务端创建分片上传并按批签名分片 URL，浏览器按 part_size 切片并发 PUT；
+// 上传记录保存在 localStorage，中断（网络错误、关闭页面）后再次选择同一文件时只补传缺失的分片。
+// 分片 ETag 由服务端完成上传时向 R2 查询，R2 的 CORS 不需要暴露 ETag 头。
+(function (global) {
+    'use strict';
+
+    const STORE_PREFIX = 'gxp-multipart:';
+    const PRESIGN_BATCH = 100;
+    const PART_RETRIES = 3;
+
+    class UploadCancelled extends Error {
+        constructor() { super('已取消'); this.name = 'UploadCancelled'; }
+    }
+
+    async function postJson(url, body, headers) {
+        const res = await fetch(url, {
+            method: 'POST',
+            headers: Object.assign({ 'Content-Type': 'application/json' }, headers || {}),
+            body: JSON.stringify(body)
+        });
+        let json = {};
+        try { json = await res.json(); } catch (e) {}
+        return { res, json };
+    }
+
+    function storeKey(file, params) {
+        return STORE_PREFIX + [params.document_type, file.name, file.size, file.lastModified, params.sha256 || ''].join('|');
+    }
+    function loadRecord(id) {
+        try { return JSON.parse(localStorage.getItem(id) || 'null'); } catch (e) { return null; }
+    }
+    function saveRecord(id, record) {
+        try { localStorage.setItem(id, JSON.stringify(record)); } catch (e) {}
+    }
+    function dropRecord(id) {
+        try { localStorage.removeItem(id); } catch (e) {}
+    }
+
+    function putPart(url, blob, onProgress, xhrs) {
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+            xhrs.add(xhr);
+            xhr.open('PUT', url, true);
+            if (xhr.upload) xhr.upload.onprogress = (e) => { if (e.lengthComputable) onProgress(e.loaded); };
+            const done = (fn) => () => { xhrs.delete(xhr); fn(); };
+            xhr.onload = done(() => (xhr.status >= 200 && xhr.status < 300) ? resolve() : reject(new Error('分片上传失败: ' + xhr.status)));
+            xhr.onerror = done(() => reject(new Error('网络错误')));
+            xhr.onabort = done(() => reject(new UploadCancelled()));
+            xhr.send(blob);
+        });
+    }
+
+    // 是否使用分片上传：超过一个分片大小（与服务端中转上传的规则一致）
+    function shouldUse(file, partSize) {
+        return !!(file && partSize && file.size > partSize);
+    }
+
+    // options:
+    //   endpoints: { create, presign, parts, complete, abort }
+    //   params:    presign-upload 的参数（organization_id/document_type/title/filename/content_type/sha256）
+    //   file, headers（如 X-CSRFToken）, onProgress(loaded, total), onStart(handle)
+    // 返回 { key, public_url, duplicate, preview_url, resumed }；取消时抛出 UploadCancelled
+    async function upload(options) {
+        const { endpoints, file, headers } = options;
+        const params = Object.assign({}, options.params, { size: file.size });
+        const onProgress = options.onProgress || function () {};
+        const recordId = storeKey(file, params);
+        const xhrs = new Set();
+        let cancelled = false;
+        let upload = null;
+
+        // 与 XMLHttpRequest 一样以 abort() 取消，页面上的“取消上传”按钮可通用
+        const handle = {
+            abort() {
+                cancelled = true;
+                xhrs.forEach((xhr) => xhr.abort());
+                if (upload) {
+                    postJson(endpoints.abort, { key: upload.key, upload_id: upload.upload_id }, headers).catch(() => {});
+                    dropRecord(recordId);
+                }
+            }
+        };
+        if (typeof options.onStart === 'function') options.onStart(handle);
+        const checkCancelled = () => { if (cancelled) throw new UploadCancelled(); };
+        const partLength = (n) => n < upload.part_count ? upload.part_size : file.size - upload.part_size * (upload.part_count - 1);
+
+        // 1) 续传上次未完成的上传，或新建
+        let done = {};
+        let resumed = false;
+        const previous = loadRecord(recordId);
+        if (previous) {
+            const { res, json } = await postJson(endpoints.parts, { key: previous.key, upload_id: previous.upload_id }, headers);
+            if (res.ok) {
+                upload = previous;
+                resumed = true;
+                // 只认大小正确的分片，其余重传
+                Object.entries(json.parts || {}).forEach(([n, size]) => {
+                    if (size === partLength(Number(n))) done[n] = size;
+                });
+            } else {
+                dropRecord(recordId);
+            }
+        }
+        checkCancelled();
+        if (!upload) {
+            const { res, json } = await postJson(endpoints.create, params, headers);
+            if (!res.ok) throw new Error(json.error || '创建分片上传失败');
+            if (json.duplicate) { onProgress(file.size, file.size); return json; }
+            upload = json;
+            saveRecord(recordId, upload);
+        }
+        checkCancelled();
+
+        // 2) 并发上传缺失的分片；URL 按批签名
+        const pending = [];
+        for (let n = 1; n <= upload.part_count; n++) if (!(n in done)) pending.push(n);
+        const inflight = {};
+        let uploadedBytes = Object.values(done).reduce((a, b) => a + b, 0);
+        const report = () => onProgress(uploadedBytes + Object.values(inflight).reduce((a, b) => a + b, 0), file.size);
+        report();
+
+        const urls = {};
+        let signing = null;
+        async function urlFor(n) {
+            while (!urls[n]) {
+                if (!signing) {
+                    const batch = pending.filter((p) => !urls[p] && p >= n).slice(0, PRESIGN_BATCH);
+                    signing = postJson(endpoints.presign, { key: upload.key, upload_id: upload.upload_id, part_numbers: batch }, headers)
+                        .then(({ res, json }) => {
+                            if (!res.ok) throw new Error(json.error || '分片签名失败');
+                            Object.assign(urls, json.urls);
+                        })
+                        .finally(() => { signing = null; });
+                }
+                await signing;
+            }
+            return urls[n];
+        }
+
+        let next = 0;
+        async function worker() {
+            while (next < pending.length) {
+                checkCancelled();
+                const n = pending[next++];
+                const start = (n - 1) * upload.part_size;
+                const blob = file.slice(start, start + partLength(n));
+                for (let attempt = 1; ; attempt++) {
+                    try {
+                        await putPart(await urlFor(n), blob, (loaded) => { inflight[n] = loaded; report(); }, xhrs);
+                        break;
+                    } catch (e) {
+                        delete inflight[n];
+                        if (e instanceof UploadCancelled || cancelled || attempt >= PART_RETRIES) throw e;
+                        // 签名过期等原因时重新签名
+                        delete urls[n];
+                        await new Promise((r) => setTimeout(r, 1000 * attempt));
+                    }
+                }
+                delete inflight[n];
+                uploadedBytes += blob.size;
+                report();
+            }
+        }
+        const workers = [];
+        for (let i = 0; i < Math.max(1, upload.concurrency || 4); i++) workers.push(worker());
+        try {
+            await Promise.all(workers);
+        } catch (e) {
+            const userCancelled = cancelled || e instanceof UploadCancelled;
+            // 停止其余分片；已上传的分片保留在 R2，记录留给下次续传
+            cancelled = true;
+            xhrs.forEach((xhr) => xhr.abort());
+            if (!userCancelled) e.message += '（再次选择同一文件可继续上传）';
+            throw e;
+        }
+        checkCancelled();
+
+        // 3) 完成上传（服务端按 R2 记录的分片校验大小并拼接）
+        const { res, json } = await postJson(endpoints.complete, {
+            key: upload.key, upload_id: upload.upload_id, size: file.size, part_size: upload.part_size
+        }, headers);
+        if (!res.ok) throw new Error(json.error || '完成分片上传失败');
+        dropRecord(recordId);
+        return { key: upload.key, public_url: upload.public_url, duplicate: false, resumed };
+    }
+
+    global.MultipartUpload = { upload, shouldUse, UploadCancelled };
+})(window);
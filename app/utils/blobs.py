@@ -0,0 +1,259 @@
+"""文档文件的按内容存储（``blobs`` 表）。
+
+上传的文件以 SHA-256 命名存放在 ``BLOB_PREFIX`` 下（R2 不可用时存放在本地 static 的同名目录），
+相同内容只上传、只生成一次预览；再次上传相同内容时直接复用已有文件与预览。
+
+文档通过文件 URL 关联到 ``Blob``：``Document`` 插入/更新时按 ``original_file_url``/
+``translation_file_url`` 查出对应的 blob 写入 ``*_blob_id``，并增减 ``blobs.ref_count``；
+删除文档时释放引用。因此表单里手工修改 URL、导入脚本写入 URL 等 ORM 写入路径都会保持引用计数一致，
+Core 批量更新不触发事件，可用 ``scripts/blob_report.py --recount`` 校正。
+"""
+
+import base64
+import re
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+
+BLOB_PREFIX = 'documents/sha256/'
+# 文档文件字段 -> blob 外键字段
+BLOB_FIELDS = {
+    'original_file_url': 'original_blob_id',
+    'translation_file_url': 'translation_blob_id',
+}
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+_EXT_RE = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+
+def _blobs():
+    from ..models import Blob
+    return Blob.__table__
+
+
+def is_sha256(value) -> bool:
+    return bool(value) and bool(_SHA256_RE.match(value))
+
+
+def blob_key(sha256: str, ext: str = '') -> str:
+    """内容地址：documents/sha256/ab/abcdef….pdf（前两位分目录，避免单目录过大）。"""
+    ext = (ext or '').lower()
+    if not _EXT_RE.match(ext):
+        ext = ''
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256}{ext}'
+
+
+def sha256_from_key(key: str):
+    """从内容地址 key 取回 SHA-256；不是内容地址时返回 None。"""
+    if not key or not key.startswith(BLOB_PREFIX):
+        return None
+    digest = key.rsplit('/', 1)[-1].split('.', 1)[0]
+    return digest if is_sha256(digest) else None
+
+
+def checksum_sha256(sha256: str) -> str:
+    """十六进制 SHA-256 -> S3 校验和头（``x-amz-checksum-sha256``）使用的 base64 形式。"""
+    return base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+
+
+def find_blob(sha256: str):
+    from ..models import Blob
+    return Blob.query.filter_by(sha256=sha256).first()
+
+
+def register_blob(sha256: str, size: int, key: str, url: str, content_type: str = None):
+    """登记一个已存储的文件（独立短事务，不受调用方会话回滚影响）；已存在时返回已有记录。
+
+    并发上传相同内容时，唯一约束保证只有一条记录，后到者取回先到者的记录。
+    """
+    from .. import db
+    from ..models import Blob
+    blobs = _blobs()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(blobs).values(
+                sha256=sha256, size=int(size or 0), key=key, url=url,
+                content_type=content_type, ref_count=0, created_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        pass
+    # 记录由其他连接提交：会话中已有的实例按数据库最新值刷新
+    return Blob.query.filter_by(sha256=sha256).populate_existing().first()
+
+
+def link_documents(conn, blob_id: int, url: str) -> int:
+    """把文件 URL 为 ``url`` 但尚未关联 blob 的文档字段关联到 ``blob_id`` 并计入引用，返回关联数。
+
+    用于文件先以普通 URL 落库、之后才登记 blob 的情况（直传后在队列中校验内容，见 preview_queue）；
+    Core 更新不触发 ORM 事件，引用计数在这里一并调整。
+    """
+    from ..models import Document
+    docs = Document.__table__
+    blobs = _blobs()
+    linked = 0
+    for url_field, blob_field in BLOB_FIELDS.items():
+        linked += conn.execute(
+            update(docs).where(docs.c[url_field] == url, docs.c[blob_field].is_(None))
+            .values({blob_field: blob_id, 'updated_at': docs.c.updated_at})
+        ).rowcount
+    if linked:
+        conn.execute(update(blobs).where(blobs.c.id == blob_id).values(ref_count=blobs.c.ref_count + linked))
+    return linked
+
+
+def apply_blob(document, variant: str, blob) -> bool:
+    """把文档的原版/中文版文件指向 ``blob``；已有同内容的预览（及页面图片）时一并写入。
+
+    返回是否仍需生成预览（PDF 且 blob 尚无预览）。``*_blob_id`` 与引用计数在 flush 时由事件维护。
+    """
+    from .preview_queue import PAGE_IMAGE_FIELDS, VARIANT_FIELDS, needs_preview
+    file_field, preview_field = VARIANT_FIELDS[variant]
+    setattr(document, file_field, blob.url)
+    if blob.preview_url:
+        setattr(document, preview_field, blob.preview_url)
+        setattr(document, PAGE_IMAGE_FIELDS[variant], blob.page_images)
+        return False
+    if not needs_preview(blob.url):
+        # 非 PDF 没有页面图片，旧文件的图片不再展示
+        setattr(document, PAGE_IMAGE_FIELDS[variant], None)
+        return False
+    return True
+
+
+def record_preview(conn, file_url: str, preview_url: str, page_images: str = None, replace: bool = False) -> int:
+    """预览生成后记到对应 blob 上（尚无预览时），供之后相同内容的上传直接复用。
+
+    页面图片只记到预览正是 ``preview_url`` 且尚无图片的 blob 上；``replace=True``（批量重建）时
+    覆盖已有的预览与页面图片。
+    """
+    blobs = _blobs()
+    if replace:
+        return conn.execute(
+            update(blobs).where(blobs.c.url == file_url).values(preview_url=preview_url, page_images=page_images)
+        ).rowcount
+    recorded = conn.execute(
+        update(blobs).where(blobs.c.url == file_url, blobs.c.preview_url.is_(None))
+        .values(preview_url=preview_url)
+    ).rowcount
+    if page_images:
+        conn.execute(
+            update(blobs).where(
+                blobs.c.url == file_url, blobs.c.preview_url == preview_url, blobs.c.page_images.is_(None)
+            ).values(page_images=page_images)
+        )
+    return recorded
+
+
+def blob_preview(conn, file_url: str):
+    blobs = _blobs()
+    return conn.execute(select(blobs.c.preview_url).where(blobs.c.url == file_url)).scalar()
+
+
+def blob_page_images(conn, file_url: str):
+    blobs = _blobs()
+    return conn.execute(select(blobs.c.page_images).where(blobs.c.url == file_url)).scalar()
+
+
+def preview_in_use(conn, preview_url: str) -> bool:
+    """预览是否仍被某个文档或 blob 引用（共享预览不能随单个文档删除）。"""
+    from ..models import Document
+    docs = Document.__table__
+    blobs = _blobs()
+    referenced = conn.execute(
+        select(docs.c.id).where(
+            (docs.c.original_preview_url == preview_url) | (docs.c.translation_preview_url == preview_url)
+        ).limit(1)
+    ).first()
+    if referenced is not None:
+        return True
+    return conn.execute(select(blobs.c.id).where(blobs.c.preview_url == preview_url).limit(1)).first() is not None
+
+
+def page_images_in_use(conn, page_images: str) -> bool:
+    """页面图片（同一次渲染的 JSON）是否仍被某个文档或 blob 引用。"""
+    from ..models import Document
+    docs = Document.__table__
+    blobs = _blobs()
+    referenced = conn.execute(
+        select(docs.c.id).where(
+            (docs.c.original_page_images == page_images) | (docs.c.translation_page_images == page_images)
+        ).limit(1)
+    ).first()
+    if referenced is not None:
+        return True
+    return conn.execute(select(blobs.c.id).where(blobs.c.page_images == page_images).limit(1)).first() is not None
+
+
+# ---- 引用计数（Document 的 ORM 事件） ----
+def _adjust(connection, deltas: dict):
+    blobs = _blobs()
+    for blob_id, delta in deltas.items():
+        if blob_id is not None and delta:
+            connection.execute(
+                update(blobs).where(blobs.c.id == blob_id).values(ref_count=blobs.c.ref_count + delta)
+            )
+
+
+def _sync_blob_refs(mapper, connection, target):
+    """按文件 URL 关联 blob 并调整引用计数（before_insert/before_update）。"""
+    state = inspect(target)
+    blobs = _blobs()
+    deltas = {}
+    for url_field, blob_field in BLOB_FIELDS.items():
+        if state.persistent and not state.attrs[url_field].history.has_changes():
+            continue
+        url = getattr(target, url_field)
+        new_id = connection.execute(select(blobs.c.id).where(blobs.c.url == url)).scalar() if url else None
+        old_id = state.attrs[blob_field].loaded_value if state.persistent else None
+        if old_id is not None and not isinstance(old_id, int):
+            old_id = None
+        if new_id == old_id:
+            continue
+        setattr(target, blob_field, new_id)
+        deltas[old_id] = deltas.get(old_id, 0) - 1
+        deltas[new_id] = deltas.get(new_id, 0) + 1
+    _adjust(connection, deltas)
+
+
+def _release_blob_refs(mapper, connection, target):
+    deltas = {}
+    for blob_field in BLOB_FIELDS.values():
+        blob_id = getattr(target, blob_field)
+        deltas[blob_id] = deltas.get(blob_id, 0) - 1
+    _adjust(connection, deltas)
+
+
+def register_ref_counting(document_model):
+    """在 ``Document`` 写入/删除时维护 blob 关联与引用计数。"""
+    if not event.contains(document_model, 'before_insert', _sync_blob_refs):
+        event.listen(document_model, 'before_insert', _sync_blob_refs)
+        event.listen(document_model, 'before_update', _sync_blob_refs)
+        event.listen(document_model, 'before_delete', _release_blob_refs)
+
+
+def recount_refs() -> int:
+    """按文档当前的文件 URL 重建全部关联与引用计数，返回修正的 blob 数。"""
+    from .. import db
+    from ..models import Document
+    docs = Document.__table__
+    blobs = _blobs()
+    with db.engine.begin() as conn:
+        for url_field, blob_field in BLOB_FIELDS.items():
+            conn.execute(update(docs).values({
+                blob_field: select(blobs.c.id).where(blobs.c.url == docs.c[url_field]).scalar_subquery(),
+                'updated_at': docs.c.updated_at,
+            }))
+        counts = {}
+        for blob_field in BLOB_FIELDS.values():
+            column = docs.c[blob_field]
+            for blob_id, count in conn.execute(
+                select(column, func.count()).where(column.is_not(None)).group_by(column)
+            ):
+                counts[blob_id] = counts.get(blob_id, 0) + count
+        fixed = 0
+        for blob_id, ref_count in conn.execute(select(blobs.c.id, blobs.c.ref_count)).all():
+            actual = counts.get(blob_id, 0)
+            if actual != ref_count:
+                conn.execute(update(blobs).where(blobs.c.id == blob_id).values(ref_count=actual))
+                fixed += 1
+    return fixed
@@ -0,0 +1,112 @@
+"""SQLite 连接参数与读写分离。
+
+- 写引擎（默认引擎）：WAL、synchronous=NORMAL、busy_timeout，后台写入与导入脚本使用；
+- 只读引擎（bind ``readonly``）：``mode=ro`` + ``query_only``，更大的 mmap 与 page cache，
+  供公共页面与 API 的 GET/HEAD 请求使用。
+
+路由由 ``RoutingSession.get_bind`` 完成：会话被标记为只读且当前不在 flush 时，
+查询走只读引擎；任何写入（flush）仍然走写引擎。
+"""
+
+import sqlite3
+
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+READONLY_BIND = 'readonly'
+# 这些蓝图的 GET/HEAD 请求只读数据库
+READONLY_BLUEPRINTS = {'main', 'api'}
+_READONLY_FLAG = 'use_readonly'
+
+
+class RoutingSession(Session):
+    """在只读请求中把查询路由到只读引擎的会话。"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and self.info.get(_READONLY_FLAG):
+            engine = self._db.engines.get(READONLY_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def is_sqlite_file_uri(uri) -> bool:
+    if not isinstance(uri, str) or not uri.startswith('sqlite'):
+        return False
+    database = make_url(uri).database
+    return bool(database) and database != ':memory:' and not database.startswith('file:')
+
+
+def configure_engines(app):
+    """在 ``db.init_app`` 之前写入引擎配置；返回是否启用了只读引擎。"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not is_sqlite_file_uri(uri):
+        return False
+
+    # pysqlite 的 timeout 即 sqlite3_busy_timeout（秒），写锁竞争时等待而非立即报错
+    timeout = app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0
+    engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    connect_args = dict(engine_options.get('connect_args') or {})
+    connect_args.setdefault('timeout', timeout)
+    engine_options['connect_args'] = connect_args
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    if not app.config.get('SQLITE_READONLY_ROUTING', True):
+        return False
+
+    url = make_url(uri)
+    readonly_url = url.set(
+        database=f'file:{url.database}',
+        query={**url.query, 'mode': 'ro', 'uri': 'true'}
+    )
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[READONLY_BIND] = {
+        'url': readonly_url.render_as_string(hide_password=False),
+        'connect_args': {'timeout': timeout},
+    }
+    app.config['SQLALCHEMY_BINDS'] = binds
+    return True
+
+
+def install_pragmas(app, db, readonly_enabled: bool):
+    """为写引擎与只读引擎注册连接级 PRAGMA（需在应用上下文中调用）。"""
+    busy_timeout_ms = int(app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    mmap_size = int(app.config.get('SQLITE_READ_MMAP_SIZE', 256 * 1024 * 1024))
+    read_cache_kb = int(app.config.get('SQLITE_READ_CACHE_KB', 16 * 1024))
+
+    def _set_writer_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.execute('PRAGMA synchronous=NORMAL')
+                cursor.execute('PRAGMA temp_store=MEMORY')
+                # 负值表示 KB，-2000 约等于 2MB page cache
+                cursor.execute('PRAGMA cache_size=-2000')
+                cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+            finally:
+                cursor.close()
+
+    def _set_reader_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            cursor = dbapi_connection.cursor()
+            try:
+                # 只读连接不能修改 journal_mode，WAL 由写引擎负责开启
+                cursor.execute('PRAGMA query_only=ON')
+                cursor.execute('PRAGMA temp_store=MEMORY')
+                cursor.execute(f'PRAGMA cache_size=-{read_cache_kb}')
+                cursor.execute(f'PRAGMA mmap_size={mmap_size}')
+                cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+            finally:
+                cursor.close()
+
+    event.listen(db.engine, 'connect', _set_writer_pragmas)
+    if readonly_enabled:
+        event.listen(db.engines[READONLY_BIND], 'connect', _set_reader_pragmas)
+
+        @app.before_request
+        def _route_readonly_requests():
+            if request.method in ('GET', 'HEAD') and request.blueprint in READONLY_BLUEPRINTS:
+                db.session.info[_READONLY_FLAG] = True
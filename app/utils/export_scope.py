@@ -0,0 +1,227 @@
+"""文档导出的范围与增量清单。
+
+范围（``ExportScope``）可按机构、分类、出版日期区间、原版/中文版与文件类型筛选：
+- 含机构/分类/日期/原版或中文版条件时，从 ``documents`` 表的 ``original_file_url``/``translation_file_url``
+  反推出 R2 key，不再列出整个 ``documents/``；
+- 只有文件类型条件（或没有条件）时仍列出存储桶，可包含未登记到数据库的文件。
+
+增量导出与同一范围最近一份已下载的清单（``export_manifests``）比较 ETag，只打包新增或变化的对象，
+并在 ZIP 中写入 ``_export_manifest.json``（当前完整清单与已删除的 key），离线镜像据此同步删除。
+"""
+
+import json
+import os
+from datetime import date, datetime
+
+FILE_KINDS = ('both', 'original', 'translation')
+MANIFEST_ARCNAME = '_export_manifest.json'
+
+
+def normalize_etag(etag) -> str:
+    return (etag or '').strip().strip('"')
+
+
+def _parse_int(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} 必须为整数')
+
+
+def _parse_date(value, name):
+    if value in (None, ''):
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} 格式应为 YYYY-MM-DD')
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').lower() in ('true', 'on', '1', 'yes')
+
+
+class ExportScope:
+    """导出范围；``key()`` 为规范化字符串（不含增量开关），同一范围的导出共用增量基准。"""
+
+    def __init__(self, org_id=None, category_id=None, date_from=None, date_to=None,
+                 file_types=None, files='both', incremental=False):
+        self.org_id = org_id
+        self.category_id = category_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.file_types = tuple(sorted({t.lower().lstrip('.') for t in (file_types or ()) if t}))
+        self.files = files if files in FILE_KINDS else 'both'
+        self.incremental = bool(incremental)
+
+    @classmethod
+    def from_args(cls, args) -> 'ExportScope':
+        """从请求参数（表单、查询串或 JSON dict）解析；参数非法时抛出 ValueError。"""
+        args = args or {}
+        files = args.get('files') or 'both'
+        if files not in FILE_KINDS:
+            raise ValueError('files 只能为 both、original 或 translation')
+        raw_types = args.get('file_types') or ''
+        if isinstance(raw_types, str):
+            raw_types = raw_types.replace('，', ',').split(',')
+        scope = cls(
+            org_id=_parse_int(args.get('org_id'), 'org_id'),
+            category_id=_parse_int(args.get('category_id'), 'category_id'),
+            date_from=_parse_date(args.get('date_from'), 'date_from'),
+            date_to=_parse_date(args.get('date_to'), 'date_to'),
+            file_types=[t.strip() for t in raw_types if t and t.strip()],
+            files=files,
+            incremental=_parse_bool(args.get('incremental')),
+        )
+        if scope.date_from and scope.date_to and scope.date_from > scope.date_to:
+            raise ValueError('date_from 不能晚于 date_to')
+        return scope
+
+    @classmethod
+    def from_json(cls, raw) -> 'ExportScope':
+        return cls.from_args(json.loads(raw) if raw else {})
+
+    def to_dict(self) -> dict:
+        return {
+            'org_id': self.org_id,
+            'category_id': self.category_id,
+            'date_from': self.date_from.isoformat() if self.date_from else None,
+            'date_to': self.date_to.isoformat() if self.date_to else None,
+            'file_types': list(self.file_types),
+            'files': self.files,
+            'incremental': self.incremental,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True)
+
+    def key(self) -> str:
+        data = self.to_dict()
+        data.pop('incremental')
+        return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+    @property
+    def uses_database(self) -> bool:
+        return any((self.org_id, self.category_id, self.date_from, self.date_to, self.files != 'both'))
+
+    def matches_key(self, key: str) -> bool:
+        if not self.file_types:
+            return True
+        return os.path.splitext(key)[1].lower().lstrip('.') in self.file_types
+
+    def resolve_keys(self, extract_key) -> list:
+        """按数据库条件列出文档文件的 R2 key（按文档 ID 排序、去重）。
+
+        ``extract_key`` 把公开 URL 转为 key，无法识别的 URL（如本地 /static）被跳过。
+        """
+        from .. import db
+        from ..models import Document
+
+        columns = []
+        if self.files in ('both', 'original'):
+            columns.append(Document.original_file_url)
+        if self.files in ('both', 'translation'):
+            columns.append(Document.translation_file_url)
+        query = db.session.query(*columns)
+        if self.org_id:
+            query = query.filter(Document.org_id == self.org_id)
+        if self.category_id:
+            query = query.filter(Document.category_id == self.category_id)
+        if self.date_from:
+            query = query.filter(Document.publish_date >= self.date_from)
+        if self.date_to:
+            query = query.filter(Document.publish_date <= self.date_to)
+
+        keys, seen = [], set()
+        for row in query.order_by(Document.id):
+            for url in row:
+                key = extract_key(url) if url else None
+                if not key or key in seen or not self.matches_key(key):
+                    continue
+                seen.add(key)
+                keys.append(key)
+        return keys
+
+    def describe(self) -> str:
+        parts = []
+        if self.org_id:
+            parts.append(f'机构 #{self.org_id}')
+        if self.category_id:
+            parts.append(f'分类 #{self.category_id}')
+        if self.date_from or self.date_to:
+            parts.append(f'出版日期 {self.date_from or "…"} ~ {self.date_to or "…"}')
+        if self.files != 'both':
+            parts.append('仅原版' if self.files == 'original' else '仅中文版')
+        if self.file_types:
+            parts.append('类型 ' + '/'.join(self.file_types))
+        text = '、'.join(parts) or '全部文档'
+        return text + ('（增量）' if self.incremental else '')
+
+
+def load_base_manifest(scope_key: str):
+    """同一范围最近一份已下载的清单；返回 (ExportManifest 或 None, {key: {"etag", "size"}})。"""
+    from ..models import ExportManifest
+    manifest = (
+        ExportManifest.query
+        .filter_by(scope=scope_key, delivered=True)
+        .order_by(ExportManifest.created_at.desc(), ExportManifest.id.desc())
+        .first()
+    )
+    if manifest is None:
+        return None, {}
+    return manifest, json.loads(manifest.entries or '{}')
+
+
+def diff_manifest(objects, base_entries):
+    """比较当前对象与基准清单，返回 (需打包的对象, 已删除的 key 列表)。
+
+    ``objects`` 为 [(key, size, etag)]；ETag 缺失的对象视为已变化。
+    """
+    current = {key for key, _, _ in objects}
+    changed = [
+        (key, size, etag) for key, size, etag in objects
+        if not etag or (base_entries.get(key) or {}).get('etag') != etag
+    ]
+    deleted = sorted(key for key in base_entries if key not in current)
+    return changed, deleted
+
+
+def save_manifest(scope_key: str, task_id: str, entries: dict):
+    """保存本次导出的完整清单（下载后才成为增量基准），同范围未下载的旧清单被替换。"""
+    from .. import db
+    from ..models import ExportManifest
+    manifest = ExportManifest(
+        scope=scope_key,
+        task_id=task_id,
+        entries=json.dumps(entries, ensure_ascii=False, sort_keys=True),
+        object_count=len(entries),
+        total_bytes=sum(max(int(v.get('size') or 0), 0) for v in entries.values()),
+    )
+    # 尚未下载的旧清单已被本次导出取代
+    ExportManifest.query.filter_by(scope=scope_key, delivered=False).delete(synchronize_session=False)
+    db.session.add(manifest)
+    db.session.commit()
+    return manifest
+
+
+def mark_delivered(task_id: str) -> int:
+    """导出包已下载：对应清单成为该范围的增量基准，同范围更早的清单随之删除。"""
+    from .. import db
+    from ..models import ExportManifest
+    manifest = ExportManifest.query.filter_by(task_id=task_id).first()
+    if manifest is None:
+        return 0
+    manifest.delivered = True
+    ExportManifest.query.filter(
+        ExportManifest.scope == manifest.scope,
+        ExportManifest.id != manifest.id,
+        ExportManifest.created_at <= manifest.created_at,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return 1
@@ -0,0 +1,314 @@
+"""导出任务登记（``export_tasks`` 表）。
+
+所有 gunicorn worker 共享同一张表：
+- 状态查询、暂停/继续、取消与下载可以落在任意 worker 上；
+- 执行任务的线程通过 ``TaskReporter`` 合并进度写入（默认每秒最多一次）并读取暂停/取消标记；
+  心跳由独立线程在任务执行期间定时刷新，收集文件列表或等待下载等长时间无进度的阶段也不会超时；
+- 同机执行进程已不存在、或心跳超时且执行进程不在本机（无法确认存活）的运行中任务视为孤儿，
+  标记失败并清理临时 ZIP；同机 PID 仍存在的任务在心跳超时 ``LIVE_OWNER_STALE_FACTOR`` 倍后同样回收
+  （容器重启后 PID 会被其他进程复用，仅凭 PID 存在不能确认是原执行进程）。
+
+每次写入都是单条 UPDATE 语句，在独立连接上短事务提交，不占用请求的 ``db.session``。
+需在应用上下文中调用（使用 ``db.engine``）。
+"""
+
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, func, insert, literal, select, update
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('failed', 'cancelled', 'success', 'delivered')
+ACTIVE_STATUSES = ('pending', 'running', 'paused', 'cancelling')
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_HEARTBEAT_TIMEOUT = 30
+PROGRESS_FLUSH_SECONDS = 1.0
+HEARTBEAT_SECONDS = 5.0
+CONTROL_POLL_SECONDS = 0.5
+# 同机 PID 仍存在时，心跳超过 heartbeat_timeout 的这个倍数才视为执行进程已退出（PID 已被复用）
+LIVE_OWNER_STALE_FACTOR = 4
+
+
+class ExportCancelled(Exception):
+    """Raised when an export task is cancelled."""
+
+
+def _table():
+    from ..models import ExportTask
+    return ExportTask.__table__
+
+
+def _engine():
+    from .. import db
+    return db.engine
+
+
+def worker_identity() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _row_to_dict(row):
+    return dict(row._mapping) if row is not None else None
+
+
+def create_task(kind: str = 'documents', params: str = None, max_active: int = 0):
+    """登记待执行的任务并返回任务行；``max_active > 0`` 且未结束的任务已达上限时不登记，返回 None。
+
+    上限检查与插入是同一条 ``INSERT ... SELECT ... WHERE (未结束任务数) < max_active`` 语句
+    （SQLite 中写语句在写锁内执行），并发发起的任务不会同时越过上限。
+    """
+    task_id = uuid.uuid4().hex
+    now = time.time()
+    values = {
+        'id': task_id,
+        'kind': kind,
+        'params': params,
+        'status': 'pending',
+        'progress': 0,
+        'message': '等待开始',
+        'zip_path': os.path.join(tempfile.gettempdir(), f'export-{kind}-{task_id}.zip'),
+        'owner': worker_identity(),
+        'heartbeat_at': now,
+        'created_at': now,
+        'updated_at': now,
+    }
+    table = _table()
+    stmt = insert(table).values(**values)
+    if max_active > 0:
+        active = select(func.count()).select_from(table).where(table.c.status.in_(ACTIVE_STATUSES)).scalar_subquery()
+        stmt = insert(table).from_select(
+            list(values), select(*[literal(v) for v in values.values()]).where(active < max_active)
+        )
+    with _engine().begin() as conn:
+        if not conn.execute(stmt).rowcount:
+            return None
+    return get_task(task_id)
+
+
+def get_task(task_id: str):
+    table = _table()
+    with _engine().connect() as conn:
+        return _row_to_dict(conn.execute(select(table).where(table.c.id == task_id)).first())
+
+
+def update_task(task_id: str, only_if_status=None, **fields):
+    """原子更新任务字段；``only_if_status`` 给出时仅在当前状态属于其中时更新。
+
+    返回更新后的任务 dict；任务不存在或状态不满足时返回 None。
+    """
+    table = _table()
+    fields.setdefault('updated_at', time.time())
+    stmt = update(table).where(table.c.id == task_id).values(**fields)
+    if only_if_status:
+        stmt = stmt.where(table.c.status.in_(tuple(only_if_status)))
+    with _engine().begin() as conn:
+        if conn.execute(stmt).rowcount == 0:
+            return None
+        return _row_to_dict(conn.execute(select(table).where(table.c.id == task_id)).first())
+
+
+def set_paused(task_id: str, paused: bool):
+    status = 'paused' if paused else 'running'
+    message = '任务已暂停' if paused else '继续打包'
+    allowed = ('running', 'pending') if paused else ('paused',)
+    return update_task(task_id, only_if_status=allowed, paused=paused, status=status, message=message)
+
+
+def mark_cancel(task_id: str):
+    return update_task(task_id, only_if_status=ACTIVE_STATUSES, cancelled=True, status='cancelling', message='正在取消')
+
+
+def cleanup_task_file(task: dict):
+    """删除任务的临时 ZIP；导出包上传到 R2 的任务同时删除 R2 对象。"""
+    path = (task or {}).get('zip_path')
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception:
+            logger.exception('清理导出 ZIP 失败: %s', path)
+    key = (task or {}).get('result_key')
+    if key:
+        try:
+            from .r2 import delete_object
+            delete_object(key)
+        except Exception:
+            logger.exception('删除 R2 导出包失败: %s', key)
+
+
+def _owner_alive(owner: str):
+    """同一主机上的执行进程是否存在；执行者在其他主机或无法识别时返回 None。"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reclaim_orphans(heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT) -> int:
+    """把执行进程已退出的运行中任务标记为失败并清理文件。
+
+    同机 PID 不存在时立即回收；执行者在其他主机时以心跳超时为准；同机 PID 仍存在时
+    心跳超过 ``heartbeat_timeout * LIVE_OWNER_STALE_FACTOR`` 才回收（执行中的任务由心跳线程每
+    ``HEARTBEAT_SECONDS`` 秒刷新，长时间不刷新说明 PID 已被其他进程复用，如容器重启后）。
+    """
+    table = _table()
+    now = time.time()
+    with _engine().connect() as conn:
+        rows = conn.execute(select(table).where(table.c.status.in_(ACTIVE_STATUSES))).fetchall()
+    reclaimed = 0
+    for row in rows:
+        task = _row_to_dict(row)
+        alive = _owner_alive(task.get('owner'))
+        heartbeat_at = task.get('heartbeat_at') or 0
+        if alive and heartbeat_at >= now - heartbeat_timeout * LIVE_OWNER_STALE_FACTOR:
+            continue
+        if alive is None and heartbeat_at >= now - heartbeat_timeout:
+            continue
+        updated = update_task(
+            task['id'], only_if_status=ACTIVE_STATUSES,
+            status='failed', message='执行任务的进程已退出，任务已中止，请重新导出',
+            download_ready=False, zip_path=None
+        )
+        if updated is not None:
+            cleanup_task_file(task)
+            reclaimed += 1
+            logger.warning('回收孤儿导出任务 %s（执行进程 %s）', task['id'], task.get('owner'))
+    return reclaimed
+
+
+def expire_old_tasks(ttl_seconds: float = DEFAULT_TTL_SECONDS, heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT):
+    """回收孤儿任务，并删除超过 TTL 的已结束任务及其临时 ZIP。"""
+    reclaim_orphans(heartbeat_timeout)
+    table = _table()
+    cutoff = time.time() - ttl_seconds
+    with _engine().connect() as conn:
+        rows = conn.execute(
+            select(table).where(table.c.status.in_(TERMINAL_STATUSES), table.c.updated_at < cutoff)
+        ).fetchall()
+    for row in rows:
+        cleanup_task_file(_row_to_dict(row))
+    if rows:
+        with _engine().begin() as conn:
+            conn.execute(delete(table).where(table.c.id.in_([r.id for r in rows])))
+
+
+class TaskReporter:
+    """执行线程一侧的进度上报与控制信号。
+
+    - ``update(**fields)`` 合并字段，距上次写入超过 ``flush_interval`` 才写库（``force=True`` 立即写）；
+    - ``checkpoint()`` 在执行线程中调用：按 ``poll_interval`` 读取暂停/取消标记，
+      暂停期间阻塞并保持心跳，取消时抛出 ``ExportCancelled``；
+    - ``wait_if_paused()`` 供下载线程池使用，只读取缓存的标记，不访问数据库；
+    - ``claim()`` 启动心跳线程，每 ``heartbeat_interval`` 秒刷新一次 ``heartbeat_at``，
+      任务结束时由 ``stop()`` 停止。
+    """
+
+    def __init__(self, task_id: str, flush_interval: float = PROGRESS_FLUSH_SECONDS,
+                 poll_interval: float = CONTROL_POLL_SECONDS, heartbeat_interval: float = HEARTBEAT_SECONDS):
+        self.task_id = task_id
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = None
+        self._pending = {}
+        self._last_flush = 0.0
+        self._last_poll = 0.0
+        self._paused = False
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def claim(self, message: str = None):
+        """登记当前进程为执行者，并启动心跳线程。
+
+        只有仍为 pending 的任务才转为 running（带上 ``message``）；开始执行前已被暂停或取消的任务
+        保持原状态，随后的 ``checkpoint()`` 会等待继续或抛出 ``ExportCancelled``。
+        """
+        from flask import current_app
+        started = update_task(
+            self.task_id, only_if_status=('pending',),
+            owner=worker_identity(), status='running', message=message or '正在执行', heartbeat_at=time.time()
+        )
+        if started is None:
+            self.update(force=True, owner=worker_identity())
+        self._poll(force=True)
+        app = current_app._get_current_object()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, args=(app,), name=f'export-heartbeat-{self.task_id[:8]}', daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self, app):
+        # 只写 heartbeat_at，不触碰进度字段；任务结束后状态不在 ACTIVE_STATUSES 中，写入自然失效
+        with app.app_context():
+            while not self._heartbeat_stop.wait(self.heartbeat_interval):
+                try:
+                    update_task(self.task_id, only_if_status=ACTIVE_STATUSES, heartbeat_at=time.time())
+                except Exception:
+                    logger.exception('刷新导出任务心跳失败: %s', self.task_id)
+
+    def stop(self):
+        """停止心跳线程。"""
+        self._heartbeat_stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def update(self, force: bool = False, **fields):
+        self._pending.update(fields)
+        if force or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        fields = dict(self._pending)
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+        # 已取消/结束的任务不再被进度覆盖状态
+        update_task(self.task_id, only_if_status=ACTIVE_STATUSES, heartbeat_at=time.time(), **fields)
+
+    def _poll(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        task = get_task(self.task_id)
+        if not task or task.get('cancelled'):
+            self._cancelled.set()
+        self._paused = bool(task and task.get('paused'))
+
+    def checkpoint(self):
+        self._poll()
+        while self._paused and not self.cancelled:
+            time.sleep(self.poll_interval)
+            self._poll(force=True)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                # 暂停期间只刷新心跳与计数，不覆盖“任务已暂停”的提示
+                self._pending.pop('message', None)
+                self._pending.pop('status', None)
+                self.flush()
+        if self.cancelled:
+            raise ExportCancelled()
+
+    def wait_if_paused(self):
+        while self._paused and not self.cancelled:
+            time.sleep(self.poll_interval)
+        if self.cancelled:
+            raise ExportCancelled()
+
+    def cancel_local(self):
+        """通知下载线程尽快退出（执行线程自身出错时使用）。"""
+        self._cancelled.set()
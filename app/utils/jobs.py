@@ -0,0 +1,139 @@
+"""后台重任务（导出等）的独立进程执行。
+
+打包导出需要长时间压缩/拷贝数据，放在 web worker 的线程里会与公共请求争抢 GIL。
+``spawn_job`` 以 ``scripts/run_job.py`` 启动一个全新的 Python 进程执行任务：
+
+- 子进程自行创建应用（不继承 worker 的连接与锁），进度与暂停/取消仍通过 ``export_tasks`` 表交换；
+- 子进程启动后降低 CPU 优先级（``EXPORT_JOB_NICE``）与 IO 优先级（``EXPORT_JOB_IONICE``，如 ``2:7``、``idle``）；
+- 子进程启动后即登记为任务执行者，web worker 因 ``max_requests`` 等原因重启时任务不受影响；
+- 子进程与 gunicorn 留在同一会话：启用了调度 autogroup 的内核按会话分配 CPU，
+  另开会话会让 nice 失效（子进程与整个 web 服务平分 CPU）；
+- 父进程用一个守护线程等待子进程退出，非零退出码且任务仍在进行时立即标记失败
+  （父进程自身退出时由心跳超时回收）。
+
+``EXPORT_RUNNER=thread`` 时仍在当前进程的线程中执行（本地调试用）。
+
+队列型后台进程（``WORKERS``，如预览生成）不对应单个任务：``spawn_worker`` 启动后由进程自行
+领取队列中的任务，处理完即退出，并发上限由队列模块控制。
+"""
+
+import importlib
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 任务类型 -> 执行函数（签名 func(app, task_id)）
+JOBS = {
+    'export-documents': 'app.admin.views:_export_documents_worker',
+}
+# 队列进程类型 -> 入口函数（签名 func(app, slot_fd=None)，slot_fd 为父进程交给队列进程的槽位锁）
+WORKERS = {
+    'previews': 'app.utils.preview_queue:run_worker',
+}
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_RUNNER_SCRIPT = os.path.join(_PROJECT_ROOT, 'scripts', 'run_job.py')
+_IONICE_CLASSES = {'realtime': '1', 'best-effort': '2', 'idle': '3'}
+
+
+def resolve_job(kind: str):
+    target = JOBS.get(kind) or WORKERS.get(kind)
+    if not target:
+        raise ValueError(f'未知任务类型: {kind}')
+    module_name, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def apply_resource_limits(nice: int = 0, ionice: str = None):
+    """在当前进程中降低 CPU/IO 优先级；失败只记录日志。"""
+    if nice:
+        try:
+            os.nice(int(nice))
+        except (AttributeError, OSError, ValueError):
+            logger.warning('设置 nice 失败: %s', nice, exc_info=True)
+    if not ionice:
+        return
+    cls, _, level = str(ionice).partition(':')
+    cls = _IONICE_CLASSES.get(cls, cls)
+    binary = shutil.which('ionice')
+    if binary is None:
+        logger.warning('未找到 ionice，跳过 IO 优先级设置')
+        return
+    cmd = [binary, '-c', cls]
+    if level and cls != '3':
+        cmd += ['-n', level]
+    cmd += ['-p', str(os.getpid())]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=5)
+    except Exception:
+        logger.warning('设置 IO 优先级失败: %s', ionice, exc_info=True)
+
+
+def _watch(app, proc, task_id: str):
+    returncode = proc.wait()
+    if returncode == 0:
+        return
+    from . import export_tasks
+    with app.app_context():
+        updated = export_tasks.update_task(
+            task_id, only_if_status=export_tasks.ACTIVE_STATUSES,
+            status='failed', message=f'导出进程异常退出（退出码 {returncode}）', download_ready=False
+        )
+        if updated is not None:
+            export_tasks.cleanup_task_file(export_tasks.get_task(task_id))
+    logger.error('任务进程退出码 %s: %s %s', returncode, proc.args, task_id)
+
+
+def spawn_job(app, kind: str, task_id: str):
+    """按 ``EXPORT_RUNNER`` 启动任务：``process``（默认）为独立进程，``thread`` 为当前进程线程。"""
+    if str(app.config.get('EXPORT_RUNNER', 'process')).lower() == 'thread':
+        worker = threading.Thread(target=resolve_job(kind), args=(app, task_id), daemon=True)
+        worker.start()
+        return worker
+
+    cmd = [sys.executable, _RUNNER_SCRIPT, kind, task_id]
+    proc = subprocess.Popen(cmd, cwd=_PROJECT_ROOT, stdin=subprocess.DEVNULL)
+    # 立即把执行者登记为子进程：当前 worker 随后被回收（max_requests）时任务不会被误判为孤儿
+    from .export_tasks import update_task
+    update_task(task_id, owner=f'{socket.gethostname()}:{proc.pid}')
+    threading.Thread(target=_watch, args=(app, proc, task_id), daemon=True, name=f'job-watch-{task_id[:8]}').start()
+    logger.info('已启动任务进程 pid=%s: %s %s', proc.pid, kind, task_id)
+    return proc
+
+
+def spawn_worker(app, kind: str, slot_fd: int = None):
+    """启动一个队列进程（``scripts/run_job.py <kind>``），与导出任务进程使用相同的优先级设置。
+
+    ``slot_fd`` 给出时子进程继承该文件描述符（``--slot-fd``），调用方可随后关闭自己的副本。
+    """
+    resolve_job(kind)
+    cmd = [sys.executable, _RUNNER_SCRIPT, kind]
+    pass_fds = ()
+    if slot_fd is not None:
+        cmd += ['--slot-fd', str(slot_fd)]
+        pass_fds = (slot_fd,)
+    proc = subprocess.Popen(cmd, cwd=_PROJECT_ROOT, stdin=subprocess.DEVNULL, pass_fds=pass_fds)
+    # 回收子进程，避免留下僵尸进程
+    threading.Thread(target=proc.wait, daemon=True, name=f'worker-wait-{proc.pid}').start()
+    logger.info('已启动队列进程 pid=%s: %s', proc.pid, kind)
+    return proc
+
+
+def run_job(app, kind: str, task_id: str = None, slot_fd: int = None):
+    """子进程入口：应用资源限制后执行任务（队列进程不需要 task_id，可带父进程交来的 slot_fd）。"""
+    apply_resource_limits(app.config.get('EXPORT_JOB_NICE', 0), app.config.get('EXPORT_JOB_IONICE'))
+    try:
+        if kind in WORKERS:
+            return resolve_job(kind)(app, slot_fd)
+        return resolve_job(kind)(app, task_id)
+    finally:
+        from .r2 import r2_metrics
+        metrics = r2_metrics()
+        if metrics:
+            logger.info('任务进程 %s 的 R2 调用统计: %s', kind, metrics)
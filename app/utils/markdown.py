@@ -1,16 +1,35 @@
 from typing import Optional
 
-try:
-    from markdown import Markdown
-except Exception:
-    Markdown = None  # type: ignore
+from markupsafe import Markup, escape
 
-try:
-    import bleach
-except Exception:
-    bleach = None  # type: ignore
 
-from markupsafe import Markup, escape
+_UNLOADED = object()
+_markdown_cls = _UNLOADED
+_bleach = _UNLOADED
+
+
+def _load_markdown():
+    """首次渲染时再导入 Markdown（未安装时返回 None）。"""
+    global _markdown_cls
+    if _markdown_cls is _UNLOADED:
+        try:
+            from markdown import Markdown
+        except Exception:
+            Markdown = None  # type: ignore
+        _markdown_cls = Markdown
+    return _markdown_cls
+
+
+def _load_bleach():
+    """首次清洗时再导入 bleach（未安装时返回 None）。"""
+    global _bleach
+    if _bleach is _UNLOADED:
+        try:
+            import bleach
+        except Exception:
+            bleach = None  # type: ignore
+        _bleach = bleach
+    return _bleach
 
 
 ALLOWED_TAGS = [
@@ -32,6 +51,7 @@ ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
 
 
 def _markdown_to_html(text: str) -> str:
+    Markdown = _load_markdown()
     if not Markdown:
         # 无 markdown 依赖时，按纯文本段落处理
         lines = [l.strip() for l in (text or '').split('\n\n') if l and l.strip()]
@@ -49,6 +69,7 @@ def render_markdown_safe(text: Optional[str]) -> Markup:
     """
     raw_html = _markdown_to_html(text or '')
 
+    bleach = _load_bleach()
     if bleach:
         cleaned = bleach.clean(
             raw_html,
@@ -0,0 +1,166 @@
+"""PDF 页面图片（WebP）。
+
+读者在详情页只想看一眼内容时不必下载并解析整份预览 PDF：预览任务生成预览后，用 pypdfium2 把预览的
+前 ``PREVIEW_IMAGE_PAGES`` 页渲染为 ``PREVIEW_IMAGE_WIDTHS`` 几种宽度的 WebP，与预览 PDF 存放在同一位置
+（R2 的 ``documents/preview/`` 或本地 static），详情页以 ``srcset`` 直接展示；第一页同时作为
+没有封面的文档的封面。
+
+页面图片以 JSON 记在文档的 ``original_page_images``/``translation_page_images`` 与对应 blob 的
+``page_images`` 上（格式见 ``render_pages``），相同内容只渲染一次。pypdfium2 与 Pillow 是可选依赖
+（``pip install .[previews]``），未安装时跳过渲染，预览 PDF 不受影响。
+"""
+
+import json
+import logging
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (360, 1080)
+# 单页渲染的最大高宽比，避免超长页面（如长图转成的 PDF）渲染出过大的位图
+MAX_ASPECT = 3.0
+_warned_missing = False
+
+
+def _load_renderer():
+    """延迟导入 pypdfium2 与 Pillow；未安装时返回 None（只提示一次）。"""
+    global _warned_missing
+    try:
+        import pypdfium2
+        from PIL import Image
+    except ImportError:
+        if not _warned_missing:
+            logger.info('未安装 pypdfium2/Pillow，跳过页面图片生成')
+            _warned_missing = True
+        return None
+    return pypdfium2, Image
+
+
+def _widths(value) -> tuple:
+    try:
+        widths = sorted({int(w) for w in str(value).split(',') if w.strip() and int(w) > 0})
+    except ValueError:
+        widths = []
+    return tuple(widths) or DEFAULT_WIDTHS
+
+
+def image_settings(cfg) -> tuple:
+    """配置中的 (渲染页数, 宽度, WebP 质量)。"""
+    return (int(cfg.get('PREVIEW_IMAGE_PAGES', 3)), _widths(cfg.get('PREVIEW_IMAGE_WIDTHS', '')),
+            int(cfg.get('PREVIEW_IMAGE_QUALITY', 75)))
+
+
+def parse_pages(value) -> list:
+    """页面图片 JSON（或已解析的列表）-> 列表；为空或格式不对时返回 []。"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        pages = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return pages if isinstance(pages, list) else []
+
+
+def dump_pages(pages) -> str:
+    return json.dumps(pages, ensure_ascii=False, separators=(',', ':')) if pages else None
+
+
+def page_image_urls(value) -> list:
+    """页面图片 JSON 中的全部图片 URL。"""
+    return [image['url'] for page in parse_pages(value) for image in page.get('images', []) if image.get('url')]
+
+
+def cover_from_pages(value):
+    """取第一页最大宽度的图片作为封面；没有页面图片时返回 None。"""
+    pages = parse_pages(value)
+    images = pages[0].get('images') if pages else None
+    return images[-1].get('url') if images else None
+
+
+def render_pages(renderer, pdf_path, out_dir, pages, widths, quality):
+    """渲染 pdf_path 的前 pages 页，返回
+    ``[{'width', 'height', 'images': [{'width', 'name'}, ...]}]``（name 为 out_dir 下的文件名，按宽度升序）。
+
+    每页只按最大宽度渲染一次，较小的宽度由该位图缩放得到。
+    """
+    pdfium, Image = renderer
+    largest = max(widths)
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        result = []
+        for index in range(min(pages, len(pdf))):
+            page = pdf[index]
+            try:
+                page_width, page_height = page.get_size()
+                scale = min(largest / page_width, largest * MAX_ASPECT / page_height)
+                image = page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            entry = {'width': image.width, 'height': image.height, 'images': []}
+            for width in widths:
+                scaled = image
+                if width < image.width:
+                    scaled = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+                name = f'p{index + 1}-{width}.webp'
+                scaled.save(os.path.join(out_dir, name), 'WEBP', quality=quality, method=4)
+                entry['images'].append({'width': scaled.width, 'name': name})
+            result.append(entry)
+        return result
+    finally:
+        pdf.close()
+
+
+def generate_page_images(organization_name, preview_url):
+    """把预览 PDF（R2 或本地 static）的前几页渲染为 WebP 并存放到预览同一位置。
+
+    返回页面图片列表（``render_pages`` 的格式，name 换成 url）；未启用或未安装渲染库时返回 None，
+    渲染或上传失败时抛出异常。
+    """
+    from .r2 import download_to_temp, extract_key_from_url
+
+    pages, widths, quality = image_settings(current_app.config)
+    if pages <= 0 or not preview_url:
+        return None
+    renderer = _load_renderer()
+    if renderer is None:
+        return None
+
+    use_r2 = not preview_url.startswith('/static/')
+    if use_r2:
+        key = extract_key_from_url(preview_url)
+        if not key:
+            raise ValueError(f'无法识别的预览地址: {preview_url}')
+        source = download_to_temp(key)
+    else:
+        source = os.path.join(current_app.root_path, preview_url.split('?', 1)[0].lstrip('/'))
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            rendered = render_pages(renderer, source, td, pages, widths, quality)
+            return store_pages(rendered, td, organization_name, use_r2)
+    finally:
+        if use_r2:
+            os.remove(source)
+
+
+def store_pages(rendered, directory, organization_name, use_r2=True):
+    """上传 ``render_pages`` 在 directory 中生成的图片，返回把 name 换成 url 的页面图片列表。"""
+    from .pdf_preview import _store_preview
+    # 同一文件的各页放在一个目录下：日期分片/UUID/p{页码}-{宽度}.webp
+    date_shard, folder = datetime.utcnow().strftime('%Y%m%d'), uuid.uuid4().hex
+    for entry in rendered or ():
+        for image in entry['images']:
+            name = image.pop('name')
+            image['url'] = _store_preview(
+                os.path.join(directory, name), organization_name, date_shard, f'{folder}/{name}',
+                use_r2, content_type='image/webp'
+            )
+    return rendered or None
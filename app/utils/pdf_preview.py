@@ -1,12 +1,63 @@
 import os
+import logging
 import tempfile
 import uuid
 from datetime import datetime
 from flask import current_app
-try:
-    from pypdf import PdfReader, PdfWriter
-except ImportError:
-    from PyPDF2 import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+# 按 Range 读取 R2 上的 PDF 时最多取回对象大小的这一比例，超出（如 xref 损坏需全文扫描）即改为整体下载
+RANGE_FETCH_BUDGET = 0.5
+# 小于此大小的 PDF 直接整体下载（一次请求即可）
+RANGE_MIN_SIZE = 4 * 1024 * 1024
+
+
+def _load_pdf_lib():
+    """延迟导入 pypdf（回退 PyPDF2），避免应用启动时加载。"""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        from PyPDF2 import PdfReader, PdfWriter
+    return PdfReader, PdfWriter
+
+
+def _first_pages(reader, limit):
+    """沿页面树按顺序取前 limit 页。
+
+    ``reader.pages`` 会展开整个页面树、读取每个页面对象；按 Range 读取时这意味着每页一次请求。
+    这里只解析前 limit 页所在的分支，继承属性（Resources/MediaBox/CropBox/Rotate）的处理与 pypdf 一致。
+    """
+    try:
+        from pypdf import PageObject
+        from pypdf.generic import IndirectObject
+    except ImportError:
+        from PyPDF2 import PageObject
+        from PyPDF2.generic import IndirectObject
+    inheritable = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+    pages = []
+
+    def walk(node, inherit, ref=None):
+        is_tree = node.get('/Type') == '/Pages' if '/Type' in node else '/Kids' in node
+        if is_tree:
+            inherit = dict(inherit)
+            inherit.update({k: node[k] for k in inheritable if k in node})
+            for kid in node['/Kids']:
+                if len(pages) >= limit:
+                    return
+                obj = kid.get_object()
+                if obj:
+                    walk(obj, inherit, kid if isinstance(kid, IndirectObject) else None)
+        else:
+            for k, v in inherit.items():
+                if k not in node:
+                    node[k] = v
+            page = PageObject(reader, ref)
+            page.update(node)
+            pages.append(page)
+
+    walk(reader.trailer['/Root'].get_object()['/Pages'].get_object(), {})
+    return pages
 
 def create_preview_pdf(input_path, output_path, pages=10):
     """
@@ -30,30 +81,82 @@ def create_preview_pdf(input_path, output_path, pages=10):
         output_dir = os.path.dirname(output_path)
         os.makedirs(output_dir, exist_ok=True)
         
-        # 读取PDF文件
-        reader = PdfReader(input_path)
-        
-        # 创建新的PDF写入器
-        writer = PdfWriter()
-        
-        # 确定要提取的页数（不能超过总页数）
-        total_pages = len(reader.pages)
-        pages_to_extract = min(pages, total_pages)
-        
-        # 提取指定页数
-        for i in range(pages_to_extract):
-            writer.add_page(reader.pages[i])
-        
-        # 写入输出文件
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
-            
+        _write_preview(input_path, output_path, pages)
         return True
     except Exception as e:
         print(f"创建预览PDF时出错: {str(e)}")
         return False
 
-def generate_document_preview(organization_name, filename, full_file_path, is_chinese=False, use_r2=True):
+
+def _write_preview(source, output_path, pages=10):
+    """把 source（文件路径或可 seek 的二进制流）的前 pages 页写入 output_path，出错时抛出异常。"""
+    # 读取PDF文件
+    PdfReader, PdfWriter = _load_pdf_lib()
+    reader = PdfReader(source)
+
+    # 创建新的PDF写入器
+    writer = PdfWriter()
+
+    # 只解析前几页（不能超过总页数）；页面树不规范时回退到完整展开
+    try:
+        selected = _first_pages(reader, pages)
+    except Exception:
+        selected = [reader.pages[i] for i in range(min(pages, len(reader.pages)))]
+
+    # 提取指定页数（页面引用的内容流、字体、图片在此时读取）
+    for page in selected:
+        writer.add_page(page)
+
+    # 写入输出文件
+    with open(output_path, "wb") as output_file:
+        writer.write(output_file)
+
+
+def build_preview_files(source_path, out_dir, pages=10, image_pages=0, widths=(), quality=75):
+    """在 out_dir 中生成预览 PDF（preview.pdf）及其前 image_pages 页的页面图片（pages/ 子目录）。
+
+    返回 (预览路径, ``page_images.render_pages`` 的结果或 None)；页面图片渲染失败只记录日志。
+    不依赖应用上下文，批量重建（scripts/regenerate_previews.py）在进程池中调用。
+    """
+    preview_path = os.path.join(out_dir, 'preview.pdf')
+    _write_preview(source_path, preview_path, pages)
+    rendered = None
+    if image_pages > 0 and widths:
+        from .page_images import _load_renderer, render_pages
+        renderer = _load_renderer()
+        if renderer is not None:
+            image_dir = os.path.join(out_dir, 'pages')
+            os.makedirs(image_dir, exist_ok=True)
+            try:
+                rendered = render_pages(renderer, preview_path, image_dir, image_pages, widths, quality)
+            except Exception:
+                logger.warning('页面图片渲染失败: %s', source_path, exc_info=True)
+    return preview_path, rendered
+
+
+def _new_preview_name():
+    """预览文件名与原文件名无关（日期分片 + UUID），避免通过预览名推断原始路径/文件名。"""
+    return datetime.utcnow().strftime('%Y%m%d'), f"{uuid.uuid4().hex}.pdf"
+
+
+def _store_preview(preview_file_path, organization_name, date_shard, preview_filename, use_r2=True,
+                   content_type='application/pdf'):
+    """上传预览（或页面图片，preview_filename 可含子目录）到 R2 或落地本地静态目录，返回 URL。"""
+    if use_r2:
+        from .r2 import upload_file
+        key = f"documents/preview/{organization_name}/{date_shard}/{preview_filename}"
+        return upload_file(preview_file_path, key, content_type=content_type)
+    # 本地静态回退
+    final_path = os.path.join(
+        current_app.root_path,
+        'static', 'uploads', 'documents', 'preview', organization_name, date_shard, *preview_filename.split('/')
+    )
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    with open(preview_file_path, 'rb') as src, open(final_path, 'wb') as dst:
+        dst.write(src.read())
+    return f"/static/uploads/documents/preview/{organization_name}/{date_shard}/{preview_filename}"
+
+def generate_document_preview(organization_name, filename, full_file_path, is_chinese=False, use_r2=True, pages=10):
     """
     为文档生成预览PDF
     
@@ -62,39 +165,90 @@ def generate_document_preview(organization_name, filename, full_file_path, is_ch
         filename (str): 文件名
         full_file_path (str): 完整PDF文件路径
         is_chinese (bool): 是否为中文版本
+        pages (int): 预览页数，默认为10
     
     Returns:
         str: 预览文件的URL路径，如果失败则返回None
     """
     try:
-        # 使用与原文件名无关的不可推断名称，避免通过预览名推断原始路径/文件名
-        # 采用日期分片 + UUID 的方式；预览文件统一使用 .pdf 扩展名
-        date_shard = datetime.utcnow().strftime('%Y%m%d')
-        random_id = uuid.uuid4().hex
-        preview_filename = f"{random_id}.pdf"
+        date_shard, preview_filename = _new_preview_name()
 
         # 生成预览PDF到临时目录
         with tempfile.TemporaryDirectory() as td:
             preview_file_path = os.path.join(td, preview_filename)
-            if not create_preview_pdf(full_file_path, preview_file_path):
+            if not create_preview_pdf(full_file_path, preview_file_path, pages):
                 return None
             # 上传到 R2 或落地本地
-            if use_r2:
-                from .r2 import upload_file, build_public_url
-                key = f"documents/preview/{organization_name}/{date_shard}/{preview_filename}"
-                url = upload_file(preview_file_path, key, content_type='application/pdf')
-                return url
-            else:
-                # 本地静态回退
-                preview_dir = os.path.join(
-                    current_app.root_path,
-                    'static', 'uploads', 'documents', 'preview', organization_name, date_shard
-                )
-                os.makedirs(preview_dir, exist_ok=True)
-                final_path = os.path.join(preview_dir, preview_filename)
-                with open(preview_file_path, 'rb') as src, open(final_path, 'wb') as dst:
-                    dst.write(src.read())
-                return f"/static/uploads/documents/preview/{organization_name}/{date_shard}/{preview_filename}"
+            return _store_preview(preview_file_path, organization_name, date_shard, preview_filename, use_r2)
     except Exception as e:
         print(f"生成文档预览时出错: {str(e)}")
         return None
+
+
+def generate_document_preview_from_r2(organization_name, key, size=None, is_chinese=False, pages=10):
+    """
+    直接从 R2 上的 PDF 生成预览并上传
+
+    优先通过 RangedObjectReader 按需读取，只取回 xref、trailer 与前几页引用的对象；
+    对象较小、服务端不支持 Range、读取量超过 RANGE_FETCH_BUDGET 或解析失败时改为整体下载后生成。
+
+    Args:
+        organization_name (str): 组织名称
+        key (str): PDF 在 R2 上的 key
+        size (int): 对象大小（已知时传入，省一次 HEAD）
+        is_chinese (bool): 是否为中文版本
+
+    Returns:
+        tuple: (预览 URL 或 None, 读取统计 {"mode", "size", "bytes_fetched", "requests"})
+    """
+    from .r2 import _get_config, _s3_client, download_to_temp
+    from .r2_range import DEFAULT_BLOCK_SIZE, RangedObjectReader
+
+    cfg = current_app.config
+    stats = {'mode': 'range', 'size': size, 'bytes_fetched': 0, 'requests': 0}
+    date_shard, preview_filename = _new_preview_name()
+    try:
+        with tempfile.TemporaryDirectory() as td:
+            preview_file_path = os.path.join(td, preview_filename)
+            built = False
+            if cfg.get('PREVIEW_RANGE_READS', True) and (size is None or size > RANGE_MIN_SIZE):
+                reader = None
+                try:
+                    client = _s3_client()
+                    bucket, *_ = _get_config()
+                    reader = RangedObjectReader(
+                        client, bucket, key, size=size,
+                        block_size=cfg.get('PREVIEW_RANGE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+                    )
+                    stats['size'] = reader.size
+                    reader.max_fetch_bytes = int(reader.size * RANGE_FETCH_BUDGET)
+                    if reader.size > RANGE_MIN_SIZE:
+                        _write_preview(reader, preview_file_path, pages)
+                        built = True
+                except Exception as e:
+                    logger.info('按 Range 读取生成预览失败，改为整体下载: %s (%s)', key, e)
+                finally:
+                    if reader is not None:
+                        stats['bytes_fetched'] += reader.bytes_fetched
+                        stats['requests'] += reader.requests
+                        reader.close()
+            if not built:
+                stats['mode'] = 'full'
+                local_path = download_to_temp(key)
+                try:
+                    stats['size'] = os.path.getsize(local_path)
+                    stats['bytes_fetched'] += stats['size']
+                    stats['requests'] += 1
+                    if not create_preview_pdf(local_path, preview_file_path, pages):
+                        return None, stats
+                finally:
+                    os.remove(local_path)
+            url = _store_preview(preview_file_path, organization_name, date_shard, preview_filename)
+        logger.info(
+            '预览生成读取 %s / %s 字节（%s 次请求，%s）: %s',
+            stats['bytes_fetched'], stats['size'], stats['requests'], stats['mode'], key
+        )
+        return url, stats
+    except Exception:
+        logger.exception('从 R2 生成文档预览失败: %s', key)
+        return None, stats
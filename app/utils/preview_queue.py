@@ -0,0 +1,550 @@
+"""PDF 预览生成队列（``preview_jobs`` 表），同时负责直传文件的内容校验。
+
+上传请求只登记任务（``enqueue``）并唤醒队列进程（``kick``），不再在请求内生成预览：
+- 队列进程默认以 ``scripts/run_job.py previews`` 独立运行（低 CPU/IO 优先级，见 ``jobs.spawn_worker``），
+  ``PREVIEW_RUNNER=thread`` 时在当前进程的线程中运行（本地调试用）；
+- 同时运行的队列进程不超过 ``PREVIEW_WORKERS`` 个（临时目录下的文件锁槽位，由 ``kick`` 占用后交给
+  队列进程），批量上传不会占满 CPU，也不会在进程启动前重复拉起进程；
+- 队列进程逐个领取到期任务（条件 UPDATE，同一任务只会被一个进程领取），队列清空后退出；
+- 失败按指数退避重试（``PREVIEW_RETRY_BASE_SECONDS`` 起，最长 ``MAX_RETRY_DELAY``），
+  共尝试 ``PREVIEW_MAX_ATTEMPTS`` 次；执行超过 ``PREVIEW_JOB_TIMEOUT`` 仍未结束的任务重新排队；
+- 文档的 ``preview_status`` 反映其预览任务的状态（pending/processing/ready/failed）；
+- 校验任务（``kind='verify'``）：直传到内容地址、但 R2 未按 SHA-256 校验过请求体的文件（分片上传等）
+  先以普通文件落库，由队列读取对象计算 SHA-256，一致时登记 blob，不一致时改存普通路径，
+  之后再登记预览任务（PDF 的校验任务同样反映到 ``preview_status``），上传请求不再读取整个文件。
+
+任务记录入队时的文件 URL，执行时文档已更换文件（或已删除）则跳过。预览生成后再把前几页渲染为
+WebP 页面图片（见 ``utils/page_images.py``，失败不影响预览），文档没有封面时以第一页作为封面。
+预览与页面图片同时记到文件对应的 blob 上（见 ``utils/blobs.py``），相同内容的文件只生成一次。
+与 ``export_tasks`` 一样，读写都在独立连接上以短事务完成，需在应用上下文中调用。
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+
+from .export_tasks import worker_identity
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+# 任务类型：生成预览 / 校验直传文件的内容
+PREVIEW, VERIFY = 'preview', 'verify'
+# 版本 -> (文件字段, 预览字段)
+VARIANT_FIELDS = {
+    'original': ('original_file_url', 'original_preview_url'),
+    'translation': ('translation_file_url', 'translation_preview_url'),
+}
+# 版本 -> 页面图片字段
+PAGE_IMAGE_FIELDS = {
+    'original': 'original_page_images',
+    'translation': 'translation_page_images',
+}
+MAX_RETRY_DELAY = 600
+# 等待退避中的任务时的最长睡眠间隔（秒）
+IDLE_POLL_SECONDS = 5.0
+# 已完成任务的保留时长
+DONE_RETENTION_SECONDS = 7 * 24 * 3600
+
+
+def _jobs():
+    from ..models import PreviewJob
+    return PreviewJob.__table__
+
+
+def _documents():
+    from ..models import Document
+    return Document.__table__
+
+
+def _engine():
+    from .. import db
+    return db.engine
+
+
+def _row_to_dict(row):
+    return dict(row._mapping) if row is not None else None
+
+
+def _set_document_status(conn, document_id: int, status):
+    docs = _documents()
+    # 保持 updated_at 不变：预览状态不算文档数据的更新
+    conn.execute(
+        update(docs).where(docs.c.id == document_id)
+        .values(preview_status=status, updated_at=docs.c.updated_at)
+    )
+
+
+def _tracks_status(job) -> bool:
+    """任务是否反映到文档的 preview_status：预览任务，以及 PDF 的校验任务（校验后才生成预览）。"""
+    return job['kind'] == PREVIEW or needs_preview(job['file_url'])
+
+
+def _settle_document_status(conn, document_id: int, status):
+    """任务结束后更新文档状态；同一文档仍有排队/执行中的（反映状态的）任务时保持 pending。"""
+    jobs = _jobs()
+    active = conn.execute(
+        select(jobs.c.kind, jobs.c.file_url)
+        .where(jobs.c.document_id == document_id, jobs.c.status.in_(ACTIVE_STATUSES))
+    ).all()
+    pending = any(_tracks_status(row._mapping) for row in active)
+    _set_document_status(conn, document_id, 'pending' if pending else status)
+
+
+def needs_preview(file_url) -> bool:
+    return bool(file_url) and file_url.split('?', 1)[0].lower().endswith('.pdf')
+
+
+def enqueue(document_id: int, variant: str, file_url: str, kind: str = PREVIEW) -> int:
+    """登记任务（文档需已提交），同一文档同一版本同类尚未执行的旧任务被取代；返回任务 ID。"""
+    if variant not in VARIANT_FIELDS:
+        raise ValueError(f'未知的文档版本: {variant}')
+    if kind not in (PREVIEW, VERIFY):
+        raise ValueError(f'未知的任务类型: {kind}')
+    jobs = _jobs()
+    now = time.time()
+    with _engine().begin() as conn:
+        conn.execute(delete(jobs).where(
+            jobs.c.document_id == document_id, jobs.c.variant == variant, jobs.c.kind == kind,
+            jobs.c.status == QUEUED
+        ))
+        job_id = conn.execute(insert(jobs).values(
+            document_id=document_id, variant=variant, kind=kind, file_url=file_url, status=QUEUED,
+            attempts=0, next_run_at=now, created_at=now, updated_at=now
+        )).inserted_primary_key[0]
+        if _tracks_status({'kind': kind, 'file_url': file_url}):
+            _set_document_status(conn, document_id, 'pending')
+    return job_id
+
+
+def enqueue_and_kick(document_id: int, variant: str, file_url: str, kind: str = PREVIEW):
+    """登记任务并唤醒队列进程；失败只记录日志（上传本身已成功）。"""
+    try:
+        enqueue(document_id, variant, file_url, kind)
+        kick(current_app._get_current_object())
+        return 'pending'
+    except Exception:
+        logger.exception('登记队列任务失败: doc=%s %s %s', document_id, variant, kind)
+        return None
+
+
+# ---- 队列进程槽位（文件锁，跨 gunicorn worker 与线程均有效） ----
+def _slot_path(index: int) -> str:
+    return os.path.join(tempfile.gettempdir(), f'gxp-preview-worker-{index}.lock')
+
+
+def _acquire_slot(workers: int):
+    import fcntl
+    for index in range(max(1, workers)):
+        fd = os.open(_slot_path(index), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:
+            os.close(fd)
+    return None
+
+
+def _release_slot(fd):
+    import fcntl
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def kick(app):
+    """确保有队列进程在处理；已有 ``PREVIEW_WORKERS`` 个在运行时不再启动。
+
+    槽位在这里占用后直接交给队列进程（线程参数或子进程继承的文件描述符），
+    批量上传时连续的 kick 会看到槽位已满，不会在子进程启动前重复拉起进程。
+    """
+    workers = int(app.config.get('PREVIEW_WORKERS', 1))
+    if workers <= 0:
+        return None
+    fd = _acquire_slot(workers)
+    if fd is None:
+        return None
+    try:
+        if str(app.config.get('PREVIEW_RUNNER', 'process')).lower() == 'thread':
+            worker = threading.Thread(target=run_worker, args=(app, fd), daemon=True, name='preview-worker')
+            worker.start()
+            return worker
+        from .jobs import spawn_worker
+        proc = spawn_worker(app, 'previews', slot_fd=fd)
+    except BaseException:
+        _release_slot(fd)
+        raise
+    # 子进程持有同一打开文件上的锁；父进程关闭自己的描述符，锁随子进程退出释放
+    os.close(fd)
+    return proc
+
+
+# ---- 领取与执行 ----
+def _reclaim_stale(timeout: float, max_attempts: int):
+    """执行超时的任务（进程崩溃等）重新排队，已用完尝试次数的标记失败。"""
+    jobs = _jobs()
+    now = time.time()
+    stale = (jobs.c.status == RUNNING) & (jobs.c.started_at < now - timeout)
+    with _engine().begin() as conn:
+        failed = conn.execute(
+            select(jobs.c.document_id, jobs.c.kind, jobs.c.file_url).where(stale, jobs.c.attempts >= max_attempts)
+        ).all()
+        conn.execute(update(jobs).where(stale, jobs.c.attempts >= max_attempts).values(
+            status=FAILED, message='执行超时', updated_at=now
+        ))
+        conn.execute(update(jobs).where(stale).values(status=QUEUED, next_run_at=now, updated_at=now))
+        for document_id in {row.document_id for row in failed if _tracks_status(row._mapping)}:
+            _settle_document_status(conn, document_id, 'failed')
+        conn.execute(delete(jobs).where(jobs.c.status == DONE, jobs.c.updated_at < now - DONE_RETENTION_SECONDS))
+
+
+def _claim_next():
+    jobs = _jobs()
+    for _ in range(5):
+        now = time.time()
+        with _engine().begin() as conn:
+            row = conn.execute(
+                select(jobs).where(jobs.c.status == QUEUED, jobs.c.next_run_at <= now)
+                .order_by(jobs.c.next_run_at, jobs.c.id).limit(1)
+            ).first()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                update(jobs).where(jobs.c.id == row.id, jobs.c.status == QUEUED).values(
+                    status=RUNNING, attempts=jobs.c.attempts + 1, owner=worker_identity(),
+                    started_at=now, updated_at=now
+                )
+            ).rowcount
+            if claimed:
+                if _tracks_status(row._mapping):
+                    _set_document_status(conn, row.document_id, 'processing')
+                return _row_to_dict(conn.execute(select(jobs).where(jobs.c.id == row.id)).first())
+    return None
+
+
+def _next_due_in():
+    """距最近一个排队任务到期的秒数；没有排队任务时返回 None。"""
+    jobs = _jobs()
+    with _engine().connect() as conn:
+        due = conn.execute(select(func.min(jobs.c.next_run_at)).where(jobs.c.status == QUEUED)).scalar()
+    return None if due is None else max(0.0, due - time.time())
+
+
+def _delete_preview_safely(url):
+    from .blobs import preview_in_use
+    from .r2 import delete_object, extract_key_from_url
+    key = extract_key_from_url(url)
+    if not key or not key.startswith('documents/preview/'):
+        return
+    # 相同内容的文档共用预览：仍有文档或 blob 引用时保留
+    with _engine().connect() as conn:
+        if preview_in_use(conn, url):
+            return
+    try:
+        delete_object(key)
+    except Exception:
+        logger.warning('删除旧预览失败: %s', key, exc_info=True)
+
+
+def _delete_page_images_safely(page_images):
+    from .blobs import page_images_in_use
+    from .page_images import page_image_urls
+    from .r2 import delete_objects, extract_key_from_url
+    urls = page_image_urls(page_images)
+    if not urls:
+        return
+    docs = _documents()
+    with _engine().connect() as conn:
+        if page_images_in_use(conn, page_images):
+            return
+        # 用作封面的第一页图片随封面保留
+        covers = set(conn.execute(select(docs.c.cover_url).where(docs.c.cover_url.in_(urls))).scalars())
+    keys = [extract_key_from_url(url) for url in urls if url not in covers]
+    keys = [key for key in keys if key and key.startswith('documents/preview/')]
+    try:
+        for key, code in delete_objects(keys):
+            logger.warning('删除旧页面图片失败: %s (%s)', key, code)
+    except Exception:
+        logger.warning('删除旧页面图片失败: %s', keys, exc_info=True)
+
+
+def write_preview(conn, document_id: int, variant: str, file_url: str, preview_url: str,
+                  page_images=None, old_page_images=None) -> int:
+    """把预览与页面图片写回文档，返回写回的行数。
+
+    仅在文件仍是 ``file_url`` 时写回，避免覆盖期间新上传的文件的预览；文档没有封面时以第一页作为封面，
+    封面是旧文件第一页（``old_page_images``）时随文件更换。
+    """
+    from .page_images import cover_from_pages
+    docs = _documents()
+    file_field, preview_field = VARIANT_FIELDS[variant]
+    written = conn.execute(
+        update(docs).where(docs.c.id == document_id, docs.c[file_field] == file_url)
+        .values({preview_field: preview_url, PAGE_IMAGE_FIELDS[variant]: page_images, 'updated_at': docs.c.updated_at})
+    ).rowcount
+    cover_url = cover_from_pages(page_images)
+    if written and cover_url:
+        no_cover = docs.c.cover_url.is_(None) | (docs.c.cover_url == '')
+        old_cover = cover_from_pages(old_page_images)
+        if old_cover:
+            no_cover = no_cover | (docs.c.cover_url == old_cover)
+        conn.execute(
+            update(docs).where(docs.c.id == document_id, no_cover)
+            .values(cover_url=cover_url, updated_at=docs.c.updated_at)
+        )
+    return written
+
+
+def _render_page_images(organization_name, preview_url):
+    """渲染预览的页面图片，返回 JSON；未启用或失败时返回 None（只记录日志，预览照常写回）。"""
+    from .page_images import dump_pages, generate_page_images
+    try:
+        return dump_pages(generate_page_images(organization_name, preview_url))
+    except Exception:
+        logger.warning('生成页面图片失败: %s', preview_url, exc_info=True)
+        return None
+
+
+def _generate(job: dict):
+    """生成并写回预览，返回 (结果说明, 文档预览状态)；失败时抛出异常（由调用方安排重试）。
+
+    文档已删除或已更换文件时跳过，预览状态返回 None（新文件若需要预览会有自己的任务）。
+    """
+    from .. import db
+    from ..models import Document
+    from .blobs import blob_page_images, blob_preview, record_preview
+    from .page_images import page_image_urls
+    from .pdf_preview import generate_document_preview, generate_document_preview_from_r2
+    from .r2 import extract_key_from_url
+
+    file_field, preview_field = VARIANT_FIELDS[job['variant']]
+    page_field = PAGE_IMAGE_FIELDS[job['variant']]
+    pages_per_preview = int(current_app.config.get('PREVIEW_PAGES', 10))
+    is_chinese = job['variant'] == 'translation'
+    try:
+        doc = db.session.get(Document, job['document_id'])
+        if doc is None:
+            return '文档已删除，跳过', None
+        if getattr(doc, file_field) != job['file_url']:
+            return '文档已更换文件，跳过', None
+        organization_name = (doc.org.name if doc.org else 'unknown').lower()
+        old_preview = getattr(doc, preview_field)
+        old_pages = getattr(doc, page_field)
+    finally:
+        db.session.remove()
+
+    url = job['file_url']
+    with _engine().connect() as conn:
+        shared_preview = blob_preview(conn, url)
+        shared_pages = blob_page_images(conn, url) if shared_preview else None
+    if shared_preview:
+        # 相同内容已有预览（另一文档的任务先完成）
+        preview_url = shared_preview
+        detail = '复用相同内容的预览'
+    elif url.startswith('/static/'):
+        # R2 不可用时 save_file 回退保存的本地文件
+        path = os.path.join(current_app.root_path, url.lstrip('/'))
+        preview_url = generate_document_preview(
+            organization_name, os.path.basename(path), path, is_chinese, use_r2=False, pages=pages_per_preview
+        )
+        detail = '本地文件'
+    else:
+        key = extract_key_from_url(url)
+        if not key:
+            raise ValueError(f'无法识别的文件地址: {url}')
+        preview_url, stats = generate_document_preview_from_r2(
+            organization_name, key, is_chinese=is_chinese, pages=pages_per_preview
+        )
+        detail = f"读取 {stats['bytes_fetched']}/{stats['size']} 字节"
+    if not preview_url:
+        raise RuntimeError('预览生成失败')
+    pages = shared_pages or _render_page_images(organization_name, preview_url)
+
+    with _engine().begin() as conn:
+        written = write_preview(conn, job['document_id'], job['variant'], url, preview_url, pages, old_pages)
+        # 记到 blob 上：相同内容的其他文档与之后的重复上传直接复用
+        record_preview(conn, url, preview_url, pages)
+    if not written:
+        _delete_preview_safely(preview_url)
+        if pages and pages != shared_pages:
+            _delete_page_images_safely(pages)
+        return '文档已更换文件，跳过', None
+    if old_preview and old_preview != preview_url:
+        _delete_preview_safely(old_preview)
+    if old_pages and old_pages != pages:
+        _delete_page_images_safely(old_pages)
+    if pages:
+        detail += f'，页面图片 {len(page_image_urls(pages))} 张'
+    return f'已生成（{detail}）', 'ready'
+
+
+def _file_refs(conn, file_url: str) -> list:
+    """文件字段为 ``file_url`` 的文档，返回 [(文档 ID, 版本)]。"""
+    docs = _documents()
+    refs = []
+    for variant, (file_field, _) in VARIANT_FIELDS.items():
+        refs.extend((doc_id, variant) for doc_id in conn.execute(
+            select(docs.c.id).where(docs.c[file_field] == file_url)
+        ).scalars())
+    return refs
+
+
+def _verify(job: dict):
+    """校验直传到内容地址的文件，返回 (结果说明, 文档预览状态)；失败时抛出异常（由调用方安排重试）。
+
+    内容与 key 中的 SHA-256 一致时登记 blob 并关联引用该文件的文档；不一致时复制到普通路径
+    ``documents/{org}/``、文档改用新 URL，内容地址不再被引用（之后相同内容的上传会覆盖它，
+    原对象留给孤儿对象清理）。随后为引用该文件的 PDF 登记预览任务。没有文档引用该文件时跳过。
+    """
+    from datetime import datetime
+
+    from .. import db
+    from ..models import Blob, Document
+    from .blobs import link_documents, register_blob, sha256_from_key
+    from .r2 import copy_object, extract_key_from_url, head_object, sha256_object
+
+    url = job['file_url']
+    key = extract_key_from_url(url)
+    sha256 = sha256_from_key(key)
+    if not sha256:
+        raise ValueError(f'不是内容地址: {url}')
+    blobs = Blob.__table__
+    with _engine().connect() as conn:
+        refs = _file_refs(conn, url)
+        stored = conn.execute(select(blobs.c.id, blobs.c.url).where(blobs.c.sha256 == sha256)).first()
+    if not refs:
+        return '文档已更换文件，跳过', None
+
+    if stored is not None and stored.url == url:
+        # 期间相同内容的单次直传已由 R2 校验并登记
+        with _engine().begin() as conn:
+            link_documents(conn, stored.id, url)
+        detail = '相同内容已登记'
+    else:
+        head = head_object(key)
+        actual = sha256_object(key)
+        if actual == sha256 and stored is None:
+            try:
+                blob_id = register_blob(
+                    sha256, head.get('ContentLength', 0), key, url, head.get('ContentType') or None
+                ).id
+            finally:
+                db.session.remove()
+            with _engine().begin() as conn:
+                link_documents(conn, blob_id, url)
+            detail = 'SHA-256 一致，已登记'
+        elif actual == sha256:
+            # 相同内容已按其他扩展名登记，这份文件不参与去重
+            detail = 'SHA-256 一致（相同内容已登记为其他文件）'
+        else:
+            try:
+                doc = db.session.get(Document, refs[0][0])
+                organization_name = (doc.org.name if doc is not None and doc.org else 'unknown').lower()
+            finally:
+                db.session.remove()
+            ext = os.path.splitext(key)[1]
+            new_key = f"documents/{organization_name}/upload_{datetime.utcnow():%Y%m%d_%H%M%S}_{job['id']}{ext}"
+            new_url = copy_object(key, new_key)
+            docs = _documents()
+            with _engine().begin() as conn:
+                for file_field, _ in VARIANT_FIELDS.values():
+                    conn.execute(
+                        update(docs).where(docs.c[file_field] == url)
+                        .values({file_field: new_url, 'updated_at': docs.c.updated_at})
+                    )
+                refs = _file_refs(conn, new_url)
+            logger.warning('直传文件 %s 的内容与 SHA-256 不符（实际 %s），已改存 %s', key, actual, new_key)
+            url = new_url
+            detail = f'SHA-256 不一致，已改存 {new_key}'
+
+    # 预览任务由当前队列进程接着处理
+    previews = [(doc_id, variant) for doc_id, variant in refs if needs_preview(url)]
+    for doc_id, variant in previews:
+        enqueue(doc_id, variant, url)
+    return detail, ('pending' if previews else None)
+
+
+def _finish(job: dict, message: str, document_status):
+    jobs = _jobs()
+    with _engine().begin() as conn:
+        conn.execute(update(jobs).where(jobs.c.id == job['id']).values(
+            status=DONE, message=message[:512], updated_at=time.time()
+        ))
+        if _tracks_status(job):
+            _settle_document_status(conn, job['document_id'], document_status)
+
+
+def _fail(job: dict, error: Exception, max_attempts: int, base_delay: float):
+    jobs = _jobs()
+    now = time.time()
+    message = f'{type(error).__name__}: {error}'[:512]
+    with _engine().begin() as conn:
+        if job['attempts'] >= max_attempts:
+            conn.execute(update(jobs).where(jobs.c.id == job['id']).values(
+                status=FAILED, message=message, updated_at=now
+            ))
+            if _tracks_status(job):
+                _settle_document_status(conn, job['document_id'], 'failed')
+            logger.error('预览任务失败（已尝试 %s 次）: %s %s', job['attempts'], job['id'], message)
+            return
+        delay = min(MAX_RETRY_DELAY, base_delay * (2 ** (job['attempts'] - 1)))
+        conn.execute(update(jobs).where(jobs.c.id == job['id']).values(
+            status=QUEUED, next_run_at=now + delay, message=message, updated_at=now
+        ))
+        if _tracks_status(job):
+            _set_document_status(conn, job['document_id'], 'pending')
+    logger.warning('预览任务 %s 第 %s 次失败，%.0f 秒后重试: %s', job['id'], job['attempts'], delay, message)
+
+
+def _drain(app) -> int:
+    cfg = app.config
+    max_attempts = max(1, int(cfg.get('PREVIEW_MAX_ATTEMPTS', 3)))
+    base_delay = max(1.0, float(cfg.get('PREVIEW_RETRY_BASE_SECONDS', 30)))
+    _reclaim_stale(float(cfg.get('PREVIEW_JOB_TIMEOUT', 600)), max_attempts)
+    processed = 0
+    while True:
+        job = _claim_next()
+        if job is None:
+            wait = _next_due_in()
+            if wait is None:
+                return processed
+            time.sleep(min(max(wait, 0.1), IDLE_POLL_SECONDS))
+            continue
+        try:
+            message, document_status = (_verify if job['kind'] == VERIFY else _generate)(job)
+        except Exception as e:
+            _fail(job, e, max_attempts, base_delay)
+        else:
+            _finish(job, message, document_status)
+            logger.info('队列任务 %s（文档 %s %s %s）: %s', job['id'], job['document_id'], job['variant'],
+                        job['kind'], message)
+        processed += 1
+
+
+def run_worker(app, slot_fd=None) -> int:
+    """队列进程入口：占用一个槽位处理到期任务，队列清空后退出；返回处理的任务数。
+
+    ``slot_fd`` 为 ``kick`` 已占用并交给本进程的槽位，首轮直接使用。
+    """
+    processed = 0
+    with app.app_context():
+        workers = max(1, int(app.config.get('PREVIEW_WORKERS', 1)))
+        while True:
+            fd = slot_fd if slot_fd is not None else _acquire_slot(workers)
+            slot_fd = None
+            if fd is None:
+                return processed
+            try:
+                processed += _drain(app)
+            finally:
+                _release_slot(fd)
+            # 释放槽位后再确认一次：退出前刚入队、而 kick 时槽位仍被占用的任务不会无人处理
+            if _next_due_in() is None:
+                return processed
@@ -1,13 +1,21 @@
 import os
+import logging
 import mimetypes
+import threading
+import time
 from flask import current_app
 
-try:
-    import boto3
-    from botocore.config import Config as BotoConfig
-except Exception:  # pragma: no cover
-    boto3 = None
-    BotoConfig = None
+logger = logging.getLogger(__name__)
+
+
+def _load_boto3():
+    """延迟导入 boto3/botocore（体积较大），仅在首次创建客户端时加载。"""
+    try:
+        import boto3
+        from botocore.config import Config as BotoConfig
+    except Exception:  # pragma: no cover
+        return None, None
+    return boto3, BotoConfig
 
 
 def _get_config():
@@ -19,15 +27,59 @@ def _get_config():
     return bucket, access_key, secret_key, endpoint, cdn_base
 
 
+# ---- 客户端缓存 ----
+# 每个进程按配置缓存一个客户端（boto3 客户端线程安全，内部的 urllib3 连接池在调用间复用）；
+# fork 出的子进程（gunicorn worker、导出/预览进程）不沿用父进程的客户端与连接。
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _reset_clients():
+    _clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_clients)
+
+
+def _client_options() -> tuple:
+    cfg = current_app.config
+    return (
+        int(cfg.get('R2_MAX_POOL_CONNECTIONS', 16)),
+        float(cfg.get('R2_CONNECT_TIMEOUT', 5)),
+        float(cfg.get('R2_READ_TIMEOUT', 60)),
+        int(cfg.get('R2_MAX_ATTEMPTS', 5)),
+        str(cfg.get('R2_RETRY_MODE', 'standard')),
+    )
+
+
 # Cloudflare R2 兼容 S3，但要求：
 # - 必须使用 Signature V4 进行预签名（返回 X-Amz-* 参数）；
 # - 推荐使用 path-style addressing（避免虚拟主机式带来签名/解析问题）。
 def _s3_client():
-    if boto3 is None:
-        raise RuntimeError('boto3 not installed; cannot use R2 client')
+    """返回当前进程按配置缓存的 R2 客户端（配置变化时新建）。"""
     bucket, access_key, secret_key, endpoint, _ = _get_config()
     if not all([bucket, access_key, secret_key, endpoint]):
         raise RuntimeError('R2 configuration missing; please set R2_* env vars in .env')
+    options = _client_options()
+    cache_key = (os.getpid(), access_key, secret_key, endpoint, options)
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _create_client(access_key, secret_key, endpoint, options)
+            _clients.clear()
+            _clients[cache_key] = client
+    return client
+
+
+def _create_client(access_key, secret_key, endpoint, options):
+    boto3, BotoConfig = _load_boto3()
+    if boto3 is None:
+        raise RuntimeError('boto3 not installed; cannot use R2 client')
+    max_pool, connect_timeout, read_timeout, max_attempts, retry_mode = options
     session = boto3.session.Session()
     client = session.client(
         's3',
@@ -37,12 +89,78 @@ def _s3_client():
         region_name='auto',
         config=BotoConfig(
             signature_version='s3v4',           # R2 需要 SigV4 预签名
-            s3={'addressing_style': 'path'}     # 使用 path 样式 /<bucket>/<key>
+            s3={'addressing_style': 'path'},    # 使用 path 样式 /<bucket>/<key>
+            max_pool_connections=max_pool,      # 分片上传/导出预取等并发调用共用连接池
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={'total_max_attempts': max_attempts, 'mode': retry_mode},
         )
     )
+    events = client.meta.events
+    events.register('before-call.s3', _on_before_call)
+    events.register('after-call.s3', _on_after_call)
+    events.register('after-call-error.s3', _on_after_call_error)
     return client
 
 
+# ---- 调用耗时统计（每进程） ----
+# 操作名 -> {"calls", "errors", "retries", "total_ms", "max_ms"}；耗时含 botocore 内部重试
+_metrics = {}
+_metrics_lock = threading.Lock()
+SLOW_CALL_MS = 2000
+
+
+def _on_before_call(model=None, context=None, **kwargs):
+    if context is not None:
+        context['r2_operation'] = getattr(model, 'name', 'unknown')
+        context['r2_started'] = time.perf_counter()
+
+
+def _on_after_call(http_response=None, parsed=None, context=None, **kwargs):
+    retries = ((parsed or {}).get('ResponseMetadata') or {}).get('RetryAttempts', 0)
+    failed = http_response is not None and http_response.status_code >= 300
+    _record_call(context, failed, retries)
+
+
+def _on_after_call_error(exception=None, context=None, **kwargs):
+    _record_call(context, True, 0)
+
+
+def _record_call(context, failed: bool, retries: int):
+    started = (context or {}).pop('r2_started', None)
+    if started is None:
+        return
+    operation = context.get('r2_operation', 'unknown')
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _metrics_lock:
+        stats = _metrics.setdefault(operation, {'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += int(failed)
+        stats['retries'] += int(retries or 0)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    if elapsed_ms >= SLOW_CALL_MS:
+        logger.warning('R2 %s 耗时 %.0fms（重试 %s 次）', operation, elapsed_ms, retries or 0)
+
+
+def r2_metrics(reset: bool = False) -> dict:
+    """当前进程的 R2 调用统计：{操作名: {"calls", "errors", "retries", "avg_ms", "max_ms"}}。"""
+    with _metrics_lock:
+        snapshot = {
+            operation: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'retries': stats['retries'],
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0.0,
+                'max_ms': round(stats['max_ms'], 1),
+            }
+            for operation, stats in sorted(_metrics.items())
+        }
+        if reset:
+            _metrics.clear()
+    return snapshot
+
+
 def build_public_url(key: str) -> str:
     """Build a public URL for the given object key.
     Prefer CDN_URL if configured; otherwise use endpoint/bucket path.
@@ -55,6 +173,31 @@ def build_public_url(key: str) -> str:
     return f"{endpoint}/{bucket}/{key}"
 
 
+def extract_key_from_url(url: str | None) -> str | None:
+    """根据当前配置，从公开 URL 反推出 R2 的对象 key（``build_public_url`` 的逆操作）。
+    支持两种形式：
+    - CDN 前缀：CDN_URL/{key}
+    - 直连前缀：{endpoint}/{bucket}/{key}
+    其他前缀（如本地 /static）返回 None。
+    """
+    try:
+        if not url:
+            return None
+        bucket, _, _, endpoint, cdn_base = _get_config()
+        u = url.strip()
+        if cdn_base:
+            base = cdn_base.rstrip('/') + '/'
+            if u.startswith(base):
+                return u[len(base):]
+        default_base = f"{endpoint.rstrip('/')}/{bucket}"
+        base2 = default_base.rstrip('/') + '/'
+        if u.startswith(base2):
+            return u[len(base2):]
+    except Exception:
+        logger.exception('extract key from url failed: %s', url)
+    return None
+
+
 def upload_file(local_path: str, key: str, content_type: str | None = None):
     """Upload a local file to R2 under the given key.
     Detect content-type if not provided.
@@ -72,6 +215,35 @@ def upload_file(local_path: str, key: str, content_type: str | None = None):
     return build_public_url(key)
 
 
+def upload_stream(fileobj, key: str, content_type: str | None = None,
+                  part_size: int | None = None, concurrency: int | None = None):
+    """把只读文件对象（可不支持 seek，如上传请求体）顺序读一遍上传到 R2。
+    不超过 ``part_size`` 的文件一次 PUT；更大的按 ``part_size`` 分片、``concurrency`` 个分片并发上传，
+    默认取 UPLOAD_PART_SIZE / UPLOAD_CONCURRENCY。读取出错时 boto3 会放弃已开始的分片上传。
+    """
+    from boto3.s3.transfer import TransferConfig
+    from .r2_multipart import MIN_PART_SIZE
+
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    key = key.lstrip('/')
+    if part_size is None:
+        part_size = current_app.config.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024)
+    if concurrency is None:
+        concurrency = current_app.config.get('UPLOAD_CONCURRENCY', 4)
+    part_size = max(MIN_PART_SIZE, int(part_size))
+    concurrency = max(1, int(concurrency))
+    transfer = TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=concurrency,
+        use_threads=concurrency > 1,
+    )
+    extra_args = {'ContentType': content_type} if content_type else {}
+    client.upload_fileobj(fileobj, bucket, key, ExtraArgs=extra_args, Config=transfer)
+    return build_public_url(key)
+
+
 def download_to_path(key: str, local_path: str):
     """Download an object to a specific local path."""
     client = _s3_client()
@@ -100,6 +272,29 @@ def head_object(key: str):
     return client.head_object(Bucket=bucket, Key=key)
 
 
+def sha256_object(key: str, chunk_size: int = 1024 * 1024) -> str:
+    """流式读取对象计算 SHA-256（不落盘，内存占用与对象大小无关）。"""
+    import hashlib
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    digest = hashlib.sha256()
+    body = client.get_object(Bucket=bucket, Key=key.lstrip('/'))['Body']
+    try:
+        for chunk in iter(lambda: body.read(chunk_size), b''):
+            digest.update(chunk)
+    finally:
+        body.close()
+    return digest.hexdigest()
+
+
+def copy_object(source_key: str, key: str):
+    """在同一桶内复制对象（服务端复制，不经过本机）。"""
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    client.copy_object(Bucket=bucket, Key=key.lstrip('/'), CopySource={'Bucket': bucket, 'Key': source_key.lstrip('/')})
+    return build_public_url(key)
+
+
 # Helper to generate a SigV4 presigned PUT URL for direct-to-R2 uploads
 def generate_presigned_put_url(key: str, content_type: str = 'application/octet-stream', expires_in: int = 600) -> str:
     """Generate a SigV4 presigned PUT URL for direct-to-R2 uploads.
@@ -115,3 +310,39 @@ def generate_presigned_put_url(key: str, content_type: str = 'application/octet-
     if content_type:
         params['ContentType'] = content_type
     return client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in)
+
+
+def generate_presigned_get_url(key: str, expires_in: int = 3600, download_name: str | None = None) -> str:
+    """Generate a SigV4 presigned GET URL; ``download_name`` sets the attachment filename."""
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    params = {
+        'Bucket': bucket,
+        'Key': key.lstrip('/'),
+    }
+    if download_name:
+        params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+    return client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+
+
+def delete_object(key: str):
+    """Delete an object (no error if it does not exist)."""
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    client.delete_object(Bucket=bucket, Key=key.lstrip('/'))
+
+
+DELETE_BATCH_SIZE = 1000
+
+
+def delete_objects(keys) -> list:
+    """批量删除对象（每次请求最多 1000 个 key），返回删除失败的 [(key, 错误码)]。"""
+    client = _s3_client()
+    bucket, *_ = _get_config()
+    keys = [k.lstrip('/') for k in keys]
+    failed = []
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = [{'Key': k} for k in keys[start:start + DELETE_BATCH_SIZE]]
+        resp = client.delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+        failed.extend((err.get('Key'), err.get('Code')) for err in resp.get('Errors', []))
+    return failed
@@ -0,0 +1,204 @@
+"""把顺序写入的字节流（如 ZipFile 的输出）以分片并发上传到 R2。
+
+``MultipartUploadWriter`` 是只写、不可 seek 的文件对象：缓冲满 ``part_size`` 即提交一个
+``upload_part`` 到线程池，同时在途的分片不超过 ``concurrency`` 个（内存约为
+``part_size × (concurrency + 1)``）。``close()`` 上传最后一个分片并完成上传；出错或
+调用 ``abort()`` 时放弃上传，R2 上不会留下不完整的对象。
+
+ZipFile 检测到不可 seek 的输出时会改用数据描述符记录 CRC 与大小，不需要回写本地头。
+
+文件末尾的 ``plan_parts``/``presign_parts``/``complete_parts`` 供浏览器直传大文件使用：
+浏览器并发 PUT 预签名的分片，中断后按 ``list_uploaded_parts`` 只补传缺失的分片；
+``abort_stale_uploads`` 供清理脚本放弃遗留的未完成上传。
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# S3/R2 要求除最后一个分片外每片至少 5MB，最多 10000 片
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+
+class MultipartUploadWriter:
+    def __init__(self, client, bucket: str, key: str, part_size: int = DEFAULT_PART_SIZE,
+                 concurrency: int = 4, content_type: str = 'application/zip', on_part=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, int(part_size))
+        self.on_part = on_part
+        self._buffer = bytearray()
+        self._position = 0
+        self._parts = {}
+        self._futures = []
+        self._next_part = 1
+        self._slots = threading.BoundedSemaphore(max(1, int(concurrency)))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix='r2-part')
+        self._closed = False
+        self._completed = False
+        self._aborted = False
+        resp = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        self.upload_id = resp['UploadId']
+
+    # ---- 文件对象接口（ZipFile 只需要 write/tell/flush） ----
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def write(self, data) -> int:
+        if self._closed:
+            raise ValueError('write to closed MultipartUploadWriter')
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            chunk = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(chunk)
+        return len(data)
+
+    # ---- 分片上传 ----
+    def _raise_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def _submit(self, chunk: bytes):
+        if self._next_part > MAX_PARTS:
+            raise RuntimeError(f'分片数超过 {MAX_PARTS}，请增大 EXPORT_PART_SIZE')
+        self._raise_failed()
+        # 在途分片已满时阻塞，限制内存占用
+        self._slots.acquire()
+        part_number = self._next_part
+        self._next_part += 1
+        try:
+            future = self._executor.submit(self._upload_part, part_number, chunk)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._futures.append(future)
+
+    def _upload_part(self, part_number: int, chunk: bytes):
+        try:
+            resp = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=chunk
+            )
+            self._parts[part_number] = resp['ETag']
+            if self.on_part:
+                self.on_part(len(chunk))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """上传剩余数据并完成上传；任一分片失败时放弃上传并抛出异常。"""
+        if self._closed:
+            return
+        try:
+            if self._buffer or self._next_part == 1:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            for future in self._futures:
+                future.result()
+            parts = [{'PartNumber': n, 'ETag': self._parts[n]} for n in sorted(self._parts)]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            self._completed = True
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._closed = True
+            self._executor.shutdown(wait=True)
+
+    def abort(self):
+        """放弃上传（幂等）：等待在途分片结束后调用 abort_multipart_upload；已完成的上传不受影响。"""
+        self._closed = True
+        if self._completed or self._aborted:
+            return
+        self._aborted = True
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception:
+            logger.warning('放弃分片上传失败: %s (%s)', self.key, self.upload_id, exc_info=True)
+
+
+# ---- 浏览器直传的分片上传（服务端只负责创建、签名与完成，分片由浏览器直接 PUT 到 R2） ----
+MAX_PRESIGN_BATCH = 100
+
+
+def plan_parts(size: int, part_size: int) -> tuple:
+    """按文件大小确定 (分片大小, 分片数)：分片不小于 MIN_PART_SIZE，总数不超过 MAX_PARTS。"""
+    part_size = max(MIN_PART_SIZE, int(part_size), -(-int(size) // MAX_PARTS))
+    return part_size, max(1, -(-int(size) // part_size))
+
+
+def presign_parts(client, bucket: str, key: str, upload_id: str, part_numbers, expires_in: int = 3600) -> dict:
+    """为一批分片生成预签名 PUT URL -> {分片号: URL}（本地签名，不访问 R2）。"""
+    return {
+        n: client.generate_presigned_url('upload_part', Params={
+            'Bucket': bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': n,
+        }, ExpiresIn=expires_in)
+        for n in part_numbers
+    }
+
+
+def list_uploaded_parts(client, bucket: str, key: str, upload_id: str) -> dict:
+    """已上传的分片 -> {分片号: (ETag, 大小)}；上传已完成或放弃时抛出 NoSuchUpload。"""
+    parts = {}
+    paginator = client.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+        for part in page.get('Parts', []):
+            parts[part['PartNumber']] = (part['ETag'], int(part.get('Size', 0)))
+    return parts
+
+
+def complete_parts(client, bucket: str, key: str, upload_id: str, size: int, part_size: int):
+    """按 R2 记录的分片（而非浏览器上报的 ETag）完成上传；分片缺失或大小不符时抛出 ValueError。"""
+    part_size, part_count = plan_parts(size, part_size)
+    parts = list_uploaded_parts(client, bucket, key, upload_id)
+    for n in range(1, part_count + 1):
+        expected = part_size if n < part_count else size - part_size * (part_count - 1)
+        if n not in parts:
+            raise ValueError(f'分片 {n} 尚未上传')
+        if parts[n][1] != expected:
+            raise ValueError(f'分片 {n} 大小不符（{parts[n][1]} != {expected}）')
+    client.complete_multipart_upload(
+        Bucket=bucket, Key=key, UploadId=upload_id,
+        MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': parts[n][0]} for n in range(1, part_count + 1)]}
+    )
+
+
+def abort_stale_uploads(client, bucket: str, prefix: str, cutoff, dry_run: bool = False) -> list:
+    """放弃 prefix 下早于 cutoff 发起、仍未完成的分片上传（进程崩溃、浏览器中断等遗留）。
+
+    返回 [(key, 发起时间)]；``dry_run`` 时只列出不放弃。
+    """
+    stale = []
+    paginator = client.get_paginator('list_multipart_uploads')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for upload in page.get('Uploads', []):
+            if upload['Initiated'] >= cutoff:
+                continue
+            stale.append((upload['Key'], upload['Initiated']))
+            if not dry_run:
+                client.abort_multipart_upload(Bucket=bucket, Key=upload['Key'], UploadId=upload['UploadId'])
+                logger.info('Aborted stale multipart upload %s for %s', upload['UploadId'], upload['Key'])
+    return stale
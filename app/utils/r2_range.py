@@ -0,0 +1,146 @@
+"""按需读取 R2 对象的只读文件对象。
+
+``RangedObjectReader`` 把 seek/read 映射为 ``Range`` GET：对象按 ``block_size`` 分块，读到的块放入
+LRU 缓存，一次读取中连续缺失的块合并为一个请求。pypdf 等按偏移随机读取的库只会取回实际用到的
+部分（xref、trailer 与被引用的对象），而不是整个文件。
+
+``max_fetch_bytes`` 限制累计取回的字节数，超出时抛出 ``FetchBudgetExceeded``，调用方可改为整体
+下载；服务端忽略 Range（返回完整对象）时抛出 ``RangeNotSupported``。
+"""
+
+import io
+import os
+from collections import OrderedDict
+
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_CACHE_BLOCKS = 64
+
+
+class RangeNotSupported(Exception):
+    """服务端未按 Range 返回部分内容。"""
+
+
+class FetchBudgetExceeded(Exception):
+    """累计取回的字节数超过预算。"""
+
+
+class RangedObjectReader(io.RawIOBase):
+    def __init__(self, client, bucket: str, key: str, size: int = None, block_size: int = DEFAULT_BLOCK_SIZE,
+                 cache_blocks: int = DEFAULT_CACHE_BLOCKS, max_fetch_bytes: int = None):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        if size is None:
+            size = int(client.head_object(Bucket=bucket, Key=key).get('ContentLength', 0))
+        self.size = int(size)
+        self.block_size = max(4096, int(block_size))
+        self.cache_blocks = max(1, int(cache_blocks))
+        self.max_fetch_bytes = max_fetch_bytes
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._blocks = OrderedDict()
+        self._pos = 0
+
+    # ---- 文件对象接口 ----
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f'invalid whence: {whence}')
+        if pos < 0:
+            raise ValueError('negative seek position')
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._pos
+        size = min(size, self.size - self._pos)
+        if size <= 0:
+            return b''
+        first = self._pos // self.block_size
+        last = (self._pos + size - 1) // self.block_size
+        blocks = self._get_blocks(first, last)
+        start = self._pos - first * self.block_size
+        data = b''.join(blocks[i] for i in range(first, last + 1))[start:start + size]
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    # ---- 块缓存 ----
+    def _get_blocks(self, first: int, last: int) -> dict:
+        blocks, missing = {}, []
+        for index in range(first, last + 1):
+            block = self._blocks.get(index)
+            if block is None:
+                missing.append(index)
+            else:
+                self._blocks.move_to_end(index)
+                blocks[index] = block
+        # 连续缺失的块合并为一次请求
+        run_start = None
+        for i, index in enumerate(missing):
+            if run_start is None:
+                run_start = index
+            if i + 1 == len(missing) or missing[i + 1] != index + 1:
+                blocks.update(self._fetch(run_start, index))
+                run_start = None
+        return blocks
+
+    def _fetch(self, first: int, last: int) -> dict:
+        start = first * self.block_size
+        end = min(self.size, (last + 1) * self.block_size) - 1
+        length = end - start + 1
+        if self.max_fetch_bytes is not None and self.bytes_fetched + length > self.max_fetch_bytes:
+            raise FetchBudgetExceeded(
+                f'已读取 {self.bytes_fetched} 字节，再读 {length} 字节将超过预算 {self.max_fetch_bytes}'
+            )
+        resp = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')
+        body = resp['Body']
+        try:
+            if not resp.get('ContentRange') and length < self.size:
+                raise RangeNotSupported(f'{self.key}: 服务端未返回 Content-Range')
+            data = body.read()
+        finally:
+            body.close()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        if len(data) != length:
+            raise RangeNotSupported(f'{self.key}: 期望 {length} 字节，实际 {len(data)} 字节')
+        fetched = {}
+        for index in range(first, last + 1):
+            offset = (index - first) * self.block_size
+            fetched[index] = data[offset:offset + self.block_size]
+            self._blocks[index] = fetched[index]
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return fetched
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'bytes_fetched': self.bytes_fetched,
+            'requests': self.requests,
+        }
+
+    def close(self):
+        self._blocks.clear()
+        super().close()
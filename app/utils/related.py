@@ -0,0 +1,245 @@
+"""相关文档：基于 TF-IDF 余弦相似度的离线近邻计算。
+
+文本取自 ``title``/``chinese_title``/``summary``/``chinese_summary``：英文按单词切分，
+中日韩文字按字符二元组（bigram）切分，因此中英文概述可以在同一个向量空间中比较。
+相似度以稀疏矩阵分批相乘得到，每批只保留前 k 个邻居写入 ``document_neighbors`` 表；
+没有达到最低相似度的邻居的文档写入一行 rank 为 0 的空结果标记（``EMPTY_RANK``），增量时不必重算。
+
+增量模式下只重算：
+- 文本哈希发生变化（或从未计算过）的文档；
+- 邻居列表中含有已变化/已删除文档的文档；
+- 变化文档与其相似度足以挤进其前 k 名的文档。
+IDF 每次按全量语料重建，未重算文档的已存分数会有轻微漂移，可定期执行全量重算。
+文档或邻居已不存在的行（如文档被 Core 语句删除、未触发级联）每次都会清理。
+
+依赖 numpy 与 scipy（可选依赖：``pip install "gmp-seeker[related]"``）。
+"""
+
+import hashlib
+import math
+import re
+from collections import Counter
+
+DEFAULT_TOP_K = 6
+DEFAULT_BATCH_SIZE = 256
+# 低于该相似度的邻居不保存，避免为“孤立”文档展示无关内容
+DEFAULT_MIN_SCORE = 0.05
+# 空结果标记的 rank（neighbor_id 指向文档自身，详情页只读取 rank >= 1 的行）
+EMPTY_RANK = 0
+# SQLite 单条语句的参数上限较低，IN 查询按块执行
+_IN_CHUNK = 500
+
+_LATIN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in into is it its of on or that the their this to was were
+which with within will can may should must not also such these those other than more most use used using
+""".split())
+
+
+def _load_numeric():
+    try:
+        import numpy as np
+        import scipy.sparse as sp
+    except ImportError as e:
+        raise RuntimeError('计算相关文档需要 numpy 与 scipy，请执行: pip install "gmp-seeker[related]"') from e
+    return np, sp
+
+
+def tokenize(text: str) -> list:
+    """英文单词 + 中文字符二元组。"""
+    if not text:
+        return []
+    text = text.lower()
+    tokens = [w for w in _LATIN_RE.findall(text) if len(w) > 1 and w not in _STOPWORDS]
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def document_tokens(title, chinese_title, summary, chinese_summary) -> list:
+    # 标题更能代表主题，权重加倍
+    title_tokens = tokenize(title or '') + tokenize(chinese_title or '')
+    return title_tokens * 2 + tokenize(summary or '') + tokenize(chinese_summary or '')
+
+
+def source_hash(title, chinese_title, summary, chinese_summary) -> str:
+    raw = '\x1f'.join(v or '' for v in (title, chinese_title, summary, chinese_summary))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def build_tfidf(token_lists):
+    """返回按行 L2 归一化的 CSR 矩阵（行 = 文档，列 = 词项）。"""
+    np, sp = _load_numeric()
+    vocab = {}
+    rows, cols, values = [], [], []
+    for row, tokens in enumerate(token_lists):
+        for term, count in Counter(tokens).items():
+            col = vocab.setdefault(term, len(vocab))
+            rows.append(row)
+            cols.append(col)
+            # 次线性 TF，削弱长概述中高频词的影响
+            values.append(1.0 + math.log(count))
+    n_docs = len(token_lists)
+    matrix = sp.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (np.asarray(rows), np.asarray(cols))),
+        shape=(n_docs, max(len(vocab), 1)), dtype=np.float32
+    )
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    matrix = matrix @ sp.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms) @ matrix, dtype=np.float32)
+
+
+def _similarity_batches(matrix, row_indices, batch_size):
+    """逐批产出 (批内行号, 稠密相似度矩阵)，每批内存约 batch_size × 文档数。"""
+    np, _ = _load_numeric()
+    row_indices = np.asarray(row_indices, dtype=np.int64)
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(row_indices), batch_size):
+        batch = row_indices[start:start + batch_size]
+        scores = (matrix[batch] @ transposed).toarray()
+        # 排除自身
+        scores[np.arange(len(batch)), batch] = -1.0
+        yield batch, scores
+
+
+def top_k_neighbors(matrix, row_indices, k=DEFAULT_TOP_K, batch_size=DEFAULT_BATCH_SIZE, min_score=DEFAULT_MIN_SCORE):
+    """产出 (行号, [(邻居行号, 分数), ...])，邻居按分数降序。"""
+    np, _ = _load_numeric()
+    n_docs = matrix.shape[0]
+    k = min(k, n_docs - 1)
+    if k <= 0:
+        return
+    for batch, scores in _similarity_batches(matrix, row_indices, batch_size):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for i, row in enumerate(batch):
+            yield int(row), [
+                (int(col), float(score))
+                for col, score in zip(top[i], top_scores[i]) if score >= min_score
+            ]
+
+
+def _chunks(values, size=_IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def recompute_neighbors(full=False, top_k=DEFAULT_TOP_K, batch_size=DEFAULT_BATCH_SIZE,
+                        min_score=DEFAULT_MIN_SCORE, log=None):
+    """重算相关文档并写入 ``document_neighbors``（需在应用上下文中调用）。
+
+    返回统计信息 dict：documents、recomputed、rows、removed、orphaned（文档或邻居已不存在而清理的行数）。
+    """
+    np, _ = _load_numeric()
+    from sqlalchemy import or_, select
+    from .. import db
+    from ..models import Document, DocumentNeighbor
+    log = log or (lambda msg: None)
+
+    docs = db.session.query(
+        Document.id, Document.title, Document.chinese_title, Document.summary, Document.chinese_summary
+    ).order_by(Document.id).all()
+
+    ids, hashes, token_lists = [], {}, []
+    for doc_id, title, chinese_title, summary, chinese_summary in docs:
+        tokens = document_tokens(title, chinese_title, summary, chinese_summary)
+        if not tokens:
+            continue
+        ids.append(doc_id)
+        hashes[doc_id] = source_hash(title, chinese_title, summary, chinese_summary)
+        token_lists.append(tokens)
+    row_of = {doc_id: row for row, doc_id in enumerate(ids)}
+
+    # 已存结果：document_id -> (source_hash, [(neighbor_id, score), ...])；空结果标记只记哈希
+    stored = {}
+    for doc_id, digest, neighbor_id, score, rank in db.session.query(
+        DocumentNeighbor.document_id, DocumentNeighbor.source_hash,
+        DocumentNeighbor.neighbor_id, DocumentNeighbor.score, DocumentNeighbor.rank
+    ):
+        neighbors = stored.setdefault(doc_id, (digest, []))[1]
+        if rank != EMPTY_RANK:
+            neighbors.append((neighbor_id, score))
+
+    # 已删除或文本变空的文档：删除其结果，并使引用它们的文档失效
+    removed = {doc_id for doc_id in stored if doc_id not in row_of}
+    log(f'文档 {len(docs)} 篇，参与计算 {len(ids)} 篇，待清理 {len(removed)} 篇')
+
+    matrix = build_tfidf(token_lists) if ids else None
+
+    if full:
+        targets = set(ids)
+    else:
+        changed = {doc_id for doc_id in ids if stored.get(doc_id, (None,))[0] != hashes[doc_id]}
+        # 邻居本身已被删除（其结果行可能已随文档级联删除）
+        vanished = {n for _, neighbors in stored.values() for n, _ in neighbors if n not in row_of}
+        dirty = changed | removed | vanished
+        targets = set(changed)
+        for doc_id, (_, neighbors) in stored.items():
+            if doc_id in row_of and any(n in dirty for n, _ in neighbors):
+                targets.add(doc_id)
+        # 变化文档可能挤进其他文档的前 k 名：相似度矩阵对称，按列取变化文档的最高分比较
+        if changed and matrix is not None:
+            best = np.full(len(ids), -1.0, dtype=np.float32)
+            for _, scores in _similarity_batches(matrix, [row_of[d] for d in changed], batch_size):
+                np.maximum(best, scores.max(axis=0), out=best)
+            for row, doc_id in enumerate(ids):
+                if doc_id in targets or best[row] < min_score:
+                    continue
+                neighbors = stored.get(doc_id, (None, []))[1]
+                if len(neighbors) < top_k or best[row] > min(s for _, s in neighbors):
+                    targets.add(doc_id)
+        log(f'文本变化 {len(changed)} 篇，需重算 {len(targets)} 篇')
+
+    new_rows, neighbor_rows = [], 0
+    if targets:
+        target_rows = sorted(row_of[d] for d in targets)
+        results = dict(top_k_neighbors(matrix, target_rows, top_k, batch_size, min_score))
+        for row in target_rows:
+            doc_id = ids[row]
+            neighbors = results.get(row) or []
+            for rank, (col, score) in enumerate(neighbors, start=1):
+                new_rows.append({
+                    'document_id': doc_id,
+                    'neighbor_id': ids[col],
+                    'score': round(score, 6),
+                    'rank': rank,
+                    'source_hash': hashes[doc_id],
+                })
+            neighbor_rows += len(neighbors)
+            if not neighbors:
+                new_rows.append({
+                    'document_id': doc_id,
+                    'neighbor_id': doc_id,
+                    'score': 0.0,
+                    'rank': EMPTY_RANK,
+                    'source_hash': hashes[doc_id],
+                })
+
+    for chunk in _chunks(targets | removed):
+        DocumentNeighbor.query.filter(DocumentNeighbor.document_id.in_(chunk)).delete(synchronize_session=False)
+    existing = select(Document.id)
+    orphaned = DocumentNeighbor.query.filter(or_(
+        DocumentNeighbor.document_id.not_in(existing), DocumentNeighbor.neighbor_id.not_in(existing)
+    )).delete(synchronize_session=False)
+    for chunk in _chunks(new_rows, 1000):
+        db.session.execute(DocumentNeighbor.__table__.insert(), chunk)
+    db.session.commit()
+
+    return {
+        'documents': len(ids),
+        'recomputed': len(targets),
+        'rows': neighbor_rows,
+        'removed': len(removed),
+        'orphaned': orphaned,
+    }
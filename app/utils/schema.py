@@ -0,0 +1,61 @@
+"""已有数据库的结构补齐。
+
+``scripts/init_db.py`` 负责首次建库；之后新增的数据表在应用启动时按需补建
+（``create_all`` 只创建缺失的表，不修改已有表），已有表中缺失的列以 ``ALTER TABLE ... ADD COLUMN``
+补上（按可空列添加，默认值取列的 ``server_default``）。尚未初始化的数据库不做处理，
+以免影响 ``start.sh`` 对“空库”的判断。
+
+多个进程可能同时启动应用（未启用 preload 的 gunicorn worker、队列/导出进程），各自补列：
+逐列添加，某列已被其他进程补上时跳过，不影响其余列。
+"""
+
+from sqlalchemy import inspect, text
+
+
+def _add_missing_columns(app, db, inspector, existing):
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    ddl_compiler = dialect.ddl_compiler(dialect, None)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = (
+                f'ALTER TABLE {preparer.format_table(table)} '
+                f'ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=dialect)}'
+            )
+            default = ddl_compiler.get_column_default_string(column)
+            if default is not None:
+                ddl += f' DEFAULT {default}'
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(text(ddl))
+            except Exception:
+                # 并发启动的其他进程已补上该列（duplicate column）：重新读取表结构确认后跳过
+                if column.name in {c['name'] for c in inspect(db.engine).get_columns(table.name)}:
+                    continue
+                app.logger.exception('补建数据列失败: %s.%s', table.name, column.name)
+                continue
+            added.append(f'{table.name}.{column.name}')
+    if added:
+        app.logger.info('已补建数据列: %s', ', '.join(added))
+
+
+def ensure_schema(app, db):
+    """为已初始化的数据库补建缺失的数据表与数据列（需在应用上下文中调用）。"""
+    try:
+        inspector = inspect(db.engine)
+        existing = set(inspector.get_table_names())
+        if 'documents' not in existing:
+            return
+        missing = [t.name for t in db.metadata.sorted_tables if t.name not in existing]
+        if missing:
+            db.create_all(bind_key=None)
+            app.logger.info('已补建数据表: %s', ', '.join(missing))
+        _add_missing_columns(app, db, inspector, existing)
+    except Exception:
+        app.logger.exception('补建数据表失败')
@@ -1,13 +1,125 @@
 import os
+import shutil
+import hashlib
+import logging
+import mimetypes
 import tempfile
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask import current_app
-from .pdf_preview import generate_document_preview
-from .r2 import upload_file, build_public_url
+from .pdf_preview import generate_document_preview, generate_document_preview_from_r2
+from .r2 import upload_stream
+from .blobs import blob_key, find_blob, record_preview, register_blob
 
-def _key_base(organization_name: str) -> str:
-    return f"documents/{organization_name.lower()}"
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 用于识别真实类型的文件头长度（PDF 允许 %PDF- 之前有最多 1024 字节的前导数据）
+SNIFF_BYTES = 2048
+COPY_CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# 扩展名 -> (文件头类别, Content-Type)；docx/xlsx/pptx 本身是 ZIP，doc/xls/ppt 是 OLE 复合文档
+FILE_TYPES = {
+    '.pdf': ('pdf', 'application/pdf'),
+    '.doc': ('ole', 'application/msword'),
+    '.xls': ('ole', 'application/vnd.ms-excel'),
+    '.ppt': ('ole', 'application/vnd.ms-powerpoint'),
+    '.docx': ('zip', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    '.xlsx': ('zip', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    '.pptx': ('zip', 'application/vnd.openxmlformats-officedocument.presentationml.presentation'),
+    '.zip': ('zip', 'application/zip'),
+    '.rar': ('rar', 'application/vnd.rar'),
+    '.7z': ('7z', 'application/x-7z-compressed'),
+}
+_MAGIC = (
+    (b'PK\x03\x04', 'zip'),
+    (b'PK\x05\x06', 'zip'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),
+    (b'Rar!\x1a\x07', 'rar'),
+    (b"7z\xbc\xaf'\x1c", '7z'),
+)
+
+
+class UploadRejected(ValueError):
+    """上传内容不符合要求（为空、超过大小上限或与扩展名不符）。"""
+
+
+def detect_kind(head: bytes):
+    """按文件头返回类别（pdf/zip/ole/rar/7z），无法识别时返回 None。"""
+    if b'%PDF-' in head[:1024 + 5]:
+        return 'pdf'
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def sniff_content_type(head: bytes, filename: str) -> str:
+    """校验文件头与扩展名一致并返回 Content-Type；已知扩展名的内容对不上时抛出 UploadRejected。"""
+    if not head:
+        raise UploadRejected('文件为空')
+    ext = os.path.splitext(filename or '')[1].lower()
+    known = FILE_TYPES.get(ext)
+    if known is None:
+        return mimetypes.guess_type(filename or '')[0] or 'application/octet-stream'
+    expected, content_type = known
+    if detect_kind(head) != expected:
+        raise UploadRejected(f'文件内容与扩展名 {ext} 不符')
+    return content_type
+
+
+class InspectingReader:
+    """包装上传流的只读文件对象：先重放已读出的文件头，边读边计算 SHA-256 并统计大小，
+    超过 ``max_bytes`` 时抛出 UploadRejected（R2 分片上传随之放弃）。"""
+
+    def __init__(self, stream, head: bytes = b'', max_bytes: int = None):
+        self._stream = stream
+        self._head = head
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.delivered = 0
+        self._sha = hashlib.sha256()
+        self._account(head)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def _account(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadRejected(f'文件超过大小上限（最大 {self.max_bytes // 1024 // 1024}MB）')
+        self._sha.update(data)
+
+    def read(self, size=-1) -> bytes:
+        if not self._head:
+            data = self._read_stream(size)
+        elif size is None or size < 0:
+            data, self._head = self._head + self._read_stream(-1), b''
+        else:
+            # boto3 把不足请求长度的读取视为结束，文件头不够时继续从流中补足
+            data, self._head = self._head[:size], self._head[size:]
+            if len(data) < size:
+                data += self._read_stream(size - len(data))
+        self.delivered += len(data)
+        return data
+
+    def _read_stream(self, size):
+        data = self._stream.read(size if size is not None else -1)
+        self._account(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def open_inspected(stream, filename: str, max_bytes: int = None):
+    """读出文件头校验类型，返回 (InspectingReader, Content-Type)。"""
+    head = stream.read(SNIFF_BYTES)
+    return InspectingReader(stream, head, max_bytes), sniff_content_type(head, filename)
 
 def generate_filename(title, original_filename, is_chinese=False):
     """Generate filename based on title or original filename with timestamp"""
@@ -26,37 +138,90 @@ def generate_filename(title, original_filename, is_chinese=False):
     filename = f"{base_name}_{timestamp}{extension}"
     return secure_filename(filename)
 
-def save_file(file, organization_name, title, is_chinese=False):
-    """Save file to Cloudflare R2 and return the public URL (and preview for PDFs).
+def store_blob(file):
+    """按内容保存上传文件，返回 (Blob, 是否新保存)。
+
+    第一遍顺序读取请求体（werkzeug 已暂存在内存或临时文件中）：计算 SHA-256、统计大小
+    （超过 UPLOAD_MAX_BYTES 即中止）并按文件头校验真实类型。相同内容已保存过时直接返回已有记录，
+    不再上传；否则回到开头把文件分片上传到内容地址（R2 不可用时保存到本地 static）并登记。
+    内容不符合要求时抛出 ``UploadRejected``。
+    """
+    max_bytes = current_app.config.get('UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+    stream = file.stream
+    reader, content_type = open_inspected(stream, file.filename, max_bytes)
+    if _seekable(stream):
+        while reader.read(COPY_CHUNK_SIZE):
+            pass
+    else:
+        # 不可回退的流先暂存（超过 SPOOL_MAX_BYTES 落盘），上传时再从头读取
+        stream = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        shutil.copyfileobj(reader, stream, COPY_CHUNK_SIZE)
+    sha256 = reader.hexdigest()
+    blob = find_blob(sha256)
+    if blob is not None:
+        logger.info('Upload %s matches stored blob %s (%d bytes), skipped', file.filename, sha256, reader.size)
+        return blob, False
+
+    key = blob_key(sha256, os.path.splitext(file.filename)[1])
+    stream.seek(0)
+    # Try R2 upload
+    try:
+        url = upload_stream(stream, key, content_type)
+    except Exception as e:
+        logger.warning('R2 upload failed for %s, falling back to local storage: %s', key, e)
+        stream.seek(0)
+        url = _save_local(stream, key)
+    _log_stored(url, reader, content_type)
+    return register_blob(sha256, reader.size, key, url, content_type), True
+
+
+def save_file(file, organization_name, title, is_chinese=False, generate_preview=True):
+    """Save file by content (see ``store_blob``) and return the public URL (and preview for PDFs).
     Falls back to local static storage only if R2 config is missing.
+    With ``generate_preview=False`` the preview URL is only returned when the same content
+    already has one; callers enqueue preview generation instead (see utils/preview_queue.py).
     """
-    filename = generate_filename(title, file.filename, is_chinese)
+    blob, _ = store_blob(file)
+    if blob.preview_url or not generate_preview or not blob.url.lower().endswith('.pdf'):
+        return blob.url, blob.preview_url
     org_dir_name = organization_name.lower()
-    key = f"{_key_base(organization_name)}/{filename}"
+    if blob.url.startswith('/static/'):
+        path = os.path.join(current_app.root_path, blob.url.lstrip('/'))
+        preview_url = generate_document_preview(org_dir_name, os.path.basename(path), path, is_chinese, use_r2=False)
+    else:
+        preview_url, _ = generate_document_preview_from_r2(org_dir_name, blob.key, blob.size, is_chinese)
+    if preview_url:
+        from .. import db
+        with db.engine.begin() as conn:
+            record_preview(conn, blob.url, preview_url)
+    return blob.url, preview_url
+
 
-    # Write to a temporary file first
-    with tempfile.TemporaryDirectory() as td:
-        temp_path = os.path.join(td, filename)
-        file.save(temp_path)
+def _seekable(stream) -> bool:
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
 
-        # Try R2 upload
+
+def _save_local(stream, key):
+    """保存到 static/uploads/{key}：先写同目录临时文件再原子替换，失败时不留下半个文件。"""
+    final_path = os.path.join(current_app.root_path, 'static', 'uploads', *key.split('/'))
+    upload_dir = os.path.dirname(final_path)
+    os.makedirs(upload_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix='.upload-', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as dst:
+            shutil.copyfileobj(stream, dst, COPY_CHUNK_SIZE)
+        os.replace(temp_path, final_path)
+    except BaseException:
         try:
-            public_url = upload_file(temp_path, key)
-            if filename.lower().endswith('.pdf'):
-                preview_url = generate_document_preview(org_dir_name, filename, temp_path, is_chinese, use_r2=True)
-            else:
-                preview_url = None
-            return public_url, preview_url
-        except Exception as e:
-            # Fallback to local static if R2 not configured/failed
-            upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'documents', org_dir_name)
-            os.makedirs(upload_dir, exist_ok=True)
-            final_path = os.path.join(upload_dir, filename)
-            with open(temp_path, 'rb') as src, open(final_path, 'wb') as dst:
-                dst.write(src.read())
-            file_url = f"/static/uploads/documents/{org_dir_name}/{filename}"
-            if filename.lower().endswith('.pdf'):
-                preview_url = generate_document_preview(org_dir_name, filename, final_path, is_chinese, use_r2=False)
-            else:
-                preview_url = None
-            return file_url, preview_url
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return f"/static/uploads/{key}"
+
+
+def _log_stored(target, reader, content_type):
+    logger.info('Stored upload %s: %d bytes, %s, sha256=%s', target, reader.size, content_type, reader.hexdigest())
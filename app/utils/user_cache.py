@@ -0,0 +1,124 @@
+"""登录用户快照缓存（进程内、短 TTL）。
+
+``login_manager.user_loader`` 在每个已登录请求上都会被调用（包括导出进度轮询等
+AJAX 请求）。这里按用户 ID 缓存一个只读快照，命中时不再查询数据库。
+
+失效策略：
+- 本进程内对 ``User`` 行的更新/删除（编辑资料、修改角色等）通过 SQLAlchemy
+  事件立即失效；
+- 其他进程（如 ``scripts/manage.py set-admin``、其他 gunicorn worker）的修改
+  最迟在 TTL 到期后生效。
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from flask_login import UserMixin
+
+# 默认 TTL（秒），可通过配置 USER_CACHE_TTL 覆盖；0 表示禁用缓存
+DEFAULT_TTL_SECONDS = 60
+# 单进程最多缓存的用户数，超过时优先淘汰已过期/最早写入的条目
+MAX_ENTRIES = 2048
+
+_cache: dict = {}
+_lock = threading.Lock()
+
+
+class CachedUser(UserMixin):
+    """``User`` 的不可变快照，仅包含模板与权限判断需要的字段。
+
+    需要修改用户数据的视图应通过 ``User.query.get(current_user.id)`` 取回模型实例。
+    """
+
+    __slots__ = ('id', 'username', 'email', 'role', 'created_at')
+
+    def __init__(self, id: int, username: str, email: str, role: str, created_at: Optional[datetime]):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'username', username)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'created_at', created_at)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CachedUser is read-only; load the User model to modify it')
+
+    @classmethod
+    def from_model(cls, user) -> 'CachedUser':
+        return cls(user.id, user.username, user.email, user.role, user.created_at)
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'role': self.role,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def get_user(user_id: int, ttl: int = DEFAULT_TTL_SECONDS) -> Optional[CachedUser]:
+    """返回缓存中的用户快照；未命中或已过期时回源数据库。"""
+    now = time.monotonic()
+    if ttl > 0:
+        with _lock:
+            entry = _cache.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    from ..models import User
+    user = User.query.get(user_id)
+    if user is None:
+        invalidate(user_id)
+        return None
+    snapshot = CachedUser.from_model(user)
+    if ttl > 0:
+        with _lock:
+            if len(_cache) >= MAX_ENTRIES:
+                _evict(now)
+            _cache[user_id] = (now + ttl, snapshot)
+    return snapshot
+
+
+def invalidate(user_id: Optional[int] = None):
+    """使指定用户（或全部用户）的快照失效。"""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+def _evict(now: float):
+    expired = [uid for uid, (expires_at, _) in _cache.items() if expires_at <= now]
+    for uid in expired:
+        _cache.pop(uid, None)
+    if len(_cache) >= MAX_ENTRIES:
+        # dict 保持插入顺序：淘汰最早写入的一半
+        for uid in list(_cache)[:MAX_ENTRIES // 2]:
+            _cache.pop(uid, None)
+
+
+def _on_user_changed(mapper, connection, target):
+    invalidate(getattr(target, 'id', None))
+
+
+def register_invalidation(user_model):
+    """在 ``User`` 行被更新或删除时清除对应快照。"""
+    from sqlalchemy import event
+    if not event.contains(user_model, 'after_update', _on_user_changed):
+        event.listen(user_model, 'after_update', _on_user_changed)
+        event.listen(user_model, 'after_delete', _on_user_changed)
+
+
+# fork 后的子进程不继承父进程的快照，避免 worker 间状态不一致
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=invalidate)
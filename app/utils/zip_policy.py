@@ -0,0 +1,117 @@
+"""导出 ZIP 的逐条目压缩策略。
+
+PDF、Office Open XML（docx/xlsx/pptx，本身就是 ZIP）、压缩包与图片已经是压缩格式，
+再次 deflate 几乎不减小体积，却会在 web worker 中长时间占用 CPU（并持有 GIL）。
+策略按以下顺序决定每个条目的压缩方式：
+
+1. 模式为 ``store``/``deflate`` 时一律存储/压缩；
+2. 文件头魔数（%PDF、PK、7z、Rar、gzip、JPEG、PNG、WebP）表明已压缩 -> 存储；
+3. 扩展名或 Content-Type 属于已压缩格式 -> 存储；属于文本/旧版 Office 等可压缩格式 -> 压缩；
+4. 其余未知类型：开启探测时用 zlib 快速压缩首块样本，压缩比优于阈值才压缩。
+"""
+
+import os
+import zipfile
+import zlib
+
+MODES = ('auto', 'deflate', 'store')
+DEFAULT_LEVEL = 6
+# 探测样本大小与阈值：样本压缩后 / 原始 < 0.9 才认为值得压缩
+PROBE_BYTES = 64 * 1024
+PROBE_MIN_RATIO = 0.9
+
+COMPRESSED_EXTENSIONS = frozenset({
+    '.pdf', '.docx', '.xlsx', '.pptx', '.docm', '.xlsm', '.odt', '.ods', '.odp', '.epub',
+    '.zip', '.rar', '.7z', '.gz', '.tgz', '.bz2', '.xz', '.zst',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic',
+    '.mp3', '.mp4', '.m4a', '.mov', '.webm',
+})
+COMPRESSIBLE_EXTENSIONS = frozenset({
+    '.txt', '.csv', '.tsv', '.md', '.html', '.htm', '.xml', '.json', '.svg', '.rtf', '.log',
+    # 旧版 Office 为 OLE 复合文档，通常可压缩
+    '.doc', '.xls', '.ppt',
+})
+_COMPRESSED_CONTENT_TYPES = (
+    'application/pdf', 'application/zip', 'application/x-7z-compressed', 'application/vnd.rar',
+    'application/x-rar-compressed', 'application/gzip', 'application/x-gzip',
+    'application/vnd.openxmlformats-officedocument.', 'image/', 'video/', 'audio/',
+)
+_COMPRESSED_MAGIC = (
+    b'%PDF', b'PK\x03\x04', b'7z\xbc\xaf\x27\x1c', b'Rar!', b'\x1f\x8b', b'\xff\xd8\xff', b'\x89PNG',
+)
+
+
+def _is_compressed_magic(head: bytes) -> bool:
+    if not head:
+        return False
+    if head.startswith(_COMPRESSED_MAGIC):
+        return True
+    return head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+
+
+def _content_type_compressed(content_type):
+    if not content_type:
+        return None
+    content_type = content_type.split(';', 1)[0].strip().lower()
+    if content_type.startswith(_COMPRESSED_CONTENT_TYPES):
+        return True
+    if content_type.startswith('text/') or content_type in ('application/json', 'application/xml', 'application/msword'):
+        return False
+    return None
+
+
+def probe_ratio(sample: bytes) -> float:
+    """用最快级别压缩样本，返回 压缩后 / 原始 的比例。"""
+    if not sample:
+        return 1.0
+    return len(zlib.compress(sample[:PROBE_BYTES], 1)) / min(len(sample), PROBE_BYTES)
+
+
+class CompressionPolicy:
+    """根据文件名、Content-Type 与首块数据为每个 ZIP 条目选择压缩方式与级别。"""
+
+    def __init__(self, mode: str = 'auto', level: int = DEFAULT_LEVEL, probe: bool = True,
+                 min_ratio: float = PROBE_MIN_RATIO):
+        self.mode = mode if mode in MODES else 'auto'
+        self.level = max(0, min(9, int(level)))
+        self.probe = probe
+        self.min_ratio = min_ratio
+
+    @classmethod
+    def from_config(cls, config) -> 'CompressionPolicy':
+        return cls(
+            mode=str(config.get('EXPORT_COMPRESSION', 'auto')).lower(),
+            level=config.get('EXPORT_COMPRESSION_LEVEL', DEFAULT_LEVEL),
+            probe=bool(config.get('EXPORT_COMPRESSION_PROBE', True)),
+        )
+
+    def should_deflate(self, name: str, content_type: str = None, head: bytes = None) -> bool:
+        if self.mode == 'store':
+            return False
+        if self.mode == 'deflate':
+            return True
+        if _is_compressed_magic(head):
+            return False
+        ext = os.path.splitext(name)[1].lower()
+        if ext in COMPRESSED_EXTENSIONS:
+            return False
+        if ext in COMPRESSIBLE_EXTENSIONS:
+            return True
+        by_type = _content_type_compressed(content_type)
+        if by_type is not None:
+            return not by_type
+        if self.probe and head:
+            return probe_ratio(head) < self.min_ratio
+        # 未知类型且未探测：按压缩处理，与原行为一致
+        return True
+
+    def zipinfo(self, name: str, date_time, content_type: str = None, head: bytes = None) -> zipfile.ZipInfo:
+        """返回已设置压缩方式/级别的 ZipInfo。"""
+        zinfo = zipfile.ZipInfo(name, date_time=date_time)
+        if self.should_deflate(name, content_type, head):
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            # ZipFile.open(zinfo, 'w') 读取 _compresslevel（3.13 起公开为 compress_level）
+            zinfo._compresslevel = self.level
+        else:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        return zinfo
@@ -6,6 +6,14 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data.sqlite')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite：公共页面/API 的 GET 请求走只读引擎（mode=ro + query_only），写入走写引擎
+    SQLITE_READONLY_ROUTING = os.environ.get('SQLITE_READONLY_ROUTING', 'true').lower() in \
+        ['true', 'on', '1']
+    # 写锁竞争时的等待时间（毫秒），避免后台导入时读者报 database is locked
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    # 只读连接的 mmap 大小（字节）与 page cache（KB）
+    SQLITE_READ_MMAP_SIZE = int(os.environ.get('SQLITE_READ_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_READ_CACHE_KB = int(os.environ.get('SQLITE_READ_CACHE_KB', '16384'))
     # 静态资源缓存时间（默认 7 天，可通过环境变量覆盖）
     SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get('SEND_FILE_MAX_AGE_DEFAULT', '604800'))
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -17,12 +25,76 @@ class Config:
     GMP_SEEKER_MAIL_SUBJECT_PREFIX = '[GxP Guider]'
     GMP_SEEKER_MAIL_SENDER = 'GxP Guider Admin <admin@gmpseeker.com>'
     GMP_SEEKER_ADMIN = os.environ.get('GMP_SEEKER_ADMIN')
+    # 登录用户快照缓存 TTL（秒），0 表示每次请求都查询数据库
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+    # 日志：级别、文件格式（json/text）与采样（logger=比例，逗号分隔，仅作用于 WARNING 以下）
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', 'app.admin.upload=0.1')
     # R2配置
     R2_BUCKET_NAME = os.environ.get('R2_BUCKET_NAME')
     R2_ACCESS_KEY_ID = os.environ.get('R2_ACCESS_KEY_ID')
     R2_SECRET_ACCESS_KEY = os.environ.get('R2_SECRET_ACCESS_KEY')
     R2_ENDPOINT_URL = os.environ.get('R2_ENDPOINT_URL')
     CDN_URL = os.environ.get('CDN_URL')
+    # R2 客户端（每进程按配置缓存复用）：连接池大小、连接/读取超时（秒）、最多尝试次数（含首次）与重试模式（legacy/standard/adaptive）
+    R2_MAX_POOL_CONNECTIONS = int(os.environ.get('R2_MAX_POOL_CONNECTIONS', '16'))
+    R2_CONNECT_TIMEOUT = float(os.environ.get('R2_CONNECT_TIMEOUT', '5'))
+    R2_READ_TIMEOUT = float(os.environ.get('R2_READ_TIMEOUT', '60'))
+    R2_MAX_ATTEMPTS = int(os.environ.get('R2_MAX_ATTEMPTS', '5'))
+    R2_RETRY_MODE = os.environ.get('R2_RETRY_MODE', 'standard')
+    # 服务器中转上传（上传页/编辑表单）：单个文件大小上限，以及上传到 R2 的分片大小（至少 5MB）与分片并发数；
+    # 直传（finalize_upload）沿用同一大小上限，超过一个分片的文件由浏览器按同样的分片大小与并发数分片直传
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(200 * 1024 * 1024)))
+    UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+    UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', '4'))
+    # 上传后生成 PDF 预览时按 Range 只读取所需部分（false 则整体下载），以及每次 Range 请求的块大小
+    PREVIEW_RANGE_READS = os.environ.get('PREVIEW_RANGE_READS', 'true').lower() in ['true', 'on', '1']
+    PREVIEW_RANGE_BLOCK_SIZE = int(os.environ.get('PREVIEW_RANGE_BLOCK_SIZE', str(256 * 1024)))
+    # PDF 预览生成队列：process（默认，独立低优先级进程）/ thread；同时运行的队列进程数、
+    # 每个任务的最多尝试次数、首次重试的等待秒数（之后翻倍）与执行超时（秒）
+    PREVIEW_RUNNER = os.environ.get('PREVIEW_RUNNER', 'process')
+    PREVIEW_WORKERS = int(os.environ.get('PREVIEW_WORKERS', '1'))
+    PREVIEW_MAX_ATTEMPTS = int(os.environ.get('PREVIEW_MAX_ATTEMPTS', '3'))
+    PREVIEW_RETRY_BASE_SECONDS = float(os.environ.get('PREVIEW_RETRY_BASE_SECONDS', '30'))
+    PREVIEW_JOB_TIMEOUT = int(os.environ.get('PREVIEW_JOB_TIMEOUT', '600'))
+    # 预览 PDF 包含的页数（修改后可用 scripts/regenerate_previews.py 重建已有预览）
+    PREVIEW_PAGES = int(os.environ.get('PREVIEW_PAGES', '10'))
+    # 预览前几页渲染为 WebP 页面图片（需 pypdfium2 与 Pillow，见 utils/page_images.py）：页数（0 关闭）、
+    # 逗号分隔的图片宽度（像素）与 WebP 质量
+    PREVIEW_IMAGE_PAGES = int(os.environ.get('PREVIEW_IMAGE_PAGES', '3'))
+    PREVIEW_IMAGE_WIDTHS = os.environ.get('PREVIEW_IMAGE_WIDTHS', '360,1080')
+    PREVIEW_IMAGE_QUALITY = int(os.environ.get('PREVIEW_IMAGE_QUALITY', '75'))
+    # 文档导出（R2 -> ZIP）：并发预取的对象数，以及单个对象留在内存中的上限（超出落盘）
+    EXPORT_PREFETCH_CONCURRENCY = int(os.environ.get('EXPORT_PREFETCH_CONCURRENCY', '4'))
+    EXPORT_SPOOL_MAX_BYTES = int(os.environ.get('EXPORT_SPOOL_MAX_BYTES', str(8 * 1024 * 1024)))
+    # 导出压缩策略：auto（已压缩格式直接存储，其余压缩）/ deflate（全部压缩，旧行为）/ store（全部存储）
+    EXPORT_COMPRESSION = os.environ.get('EXPORT_COMPRESSION', 'auto')
+    EXPORT_COMPRESSION_LEVEL = int(os.environ.get('EXPORT_COMPRESSION_LEVEL', '6'))
+    # 未知类型时用首块样本探测压缩比
+    EXPORT_COMPRESSION_PROBE = os.environ.get('EXPORT_COMPRESSION_PROBE', 'true').lower() in \
+        ['true', 'on', '1']
+    # 导出任务登记（export_tasks 表）：已结束任务保留时长、执行进程心跳超时、进度写库的最小间隔（秒）
+    EXPORT_TTL_SECONDS = int(os.environ.get('EXPORT_TTL_SECONDS', str(60 * 60)))
+    EXPORT_HEARTBEAT_TIMEOUT = int(os.environ.get('EXPORT_HEARTBEAT_TIMEOUT', '30'))
+    EXPORT_PROGRESS_FLUSH_SECONDS = float(os.environ.get('EXPORT_PROGRESS_FLUSH_SECONDS', '1.0'))
+    # 导出包去向：r2（默认，分片上传到 EXPORT_R2_PREFIX 并以预签名 URL 下载）/ local（服务器临时目录）
+    EXPORT_TARGET = os.environ.get('EXPORT_TARGET', 'r2')
+    EXPORT_R2_PREFIX = os.environ.get('EXPORT_R2_PREFIX', 'exports/')
+    EXPORT_PART_SIZE = int(os.environ.get('EXPORT_PART_SIZE', str(16 * 1024 * 1024)))
+    EXPORT_UPLOAD_CONCURRENCY = int(os.environ.get('EXPORT_UPLOAD_CONCURRENCY', '4'))
+    EXPORT_URL_EXPIRES = int(os.environ.get('EXPORT_URL_EXPIRES', '3600'))
+    # R2 上导出包的最长保留时间（scripts/cleanup_exports.py 与存储桶生命周期规则使用）
+    EXPORT_R2_RETENTION_HOURS = int(os.environ.get('EXPORT_R2_RETENTION_HOURS', '24'))
+    # 导出进度推送（SSE）：推送间隔、无变化时的心跳间隔与单个连接的最长时长（秒，到期后浏览器自动重连）
+    EXPORT_SSE_INTERVAL = float(os.environ.get('EXPORT_SSE_INTERVAL', '1.0'))
+    EXPORT_SSE_HEARTBEAT = float(os.environ.get('EXPORT_SSE_HEARTBEAT', '15'))
+    EXPORT_SSE_MAX_SECONDS = float(os.environ.get('EXPORT_SSE_MAX_SECONDS', '300'))
+    # 导出在独立进程中执行（thread 为旧的 worker 内线程模式）；同时执行的任务上限与子进程的 CPU/IO 优先级
+    EXPORT_RUNNER = os.environ.get('EXPORT_RUNNER', 'process')
+    EXPORT_MAX_JOBS = int(os.environ.get('EXPORT_MAX_JOBS', '1'))
+    EXPORT_JOB_NICE = int(os.environ.get('EXPORT_JOB_NICE', '10'))
+    EXPORT_JOB_IONICE = os.environ.get('EXPORT_JOB_IONICE', 'best-effort:7')
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 生产配置（由 start.sh 通过 ``-c gunicorn.conf.py`` 加载）
+
+默认配置：
+- ``preload_app``：在 master 中创建应用并预热只读缓存（模板编译、组织介绍页等），
+  fork 后由各 worker 以写时复制方式共享；
+- ``gthread`` worker，进程数按 CPU 数推算，每进程多线程，避免单个慢请求
+  （详情页 HEAD 远程文件、finalize_upload 校验 R2 对象）阻塞整站；
+- ``post_fork`` 中丢弃从 master 继承的数据库连接池，由 worker 重新建立连接；
+- ``when_ready`` 中启动预览队列进程处理上次停机时遗留的任务（此时 master 已完成建表/补列）。
+
+所有参数均可通过环境变量覆盖（与旧版 start.sh 保持一致）：
+PORT、WORKERS、WORKER_CLASS、THREADS、PRELOAD、MAX_REQUESTS、MAX_REQUESTS_JITTER、
+TIMEOUT、GRACEFUL_TIMEOUT、KEEP_ALIVE、LOG_LEVEL。
+"""
+
+import gc
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _default_workers():
+    # SQLite 单写者：进程数不宜过多，并发主要靠线程；2~4 个进程足以隔离慢请求
+    return max(2, min(multiprocessing.cpu_count(), 4))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = _env_int('WORKERS', _default_workers())
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+threads = _env_int('THREADS', 4)
+preload_app = os.environ.get('PRELOAD', 'true').lower() in ('true', 'on', '1')
+max_requests = _env_int('MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('MAX_REQUESTS_JITTER', 100)
+timeout = _env_int('TIMEOUT', 30)
+graceful_timeout = _env_int('GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('KEEP_ALIVE', 5)
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+accesslog = '-'
+errorlog = '-'
+
+
+def _flask_app(server):
+    """返回已加载的 Flask 应用（preload 时即 master 中创建的实例）。"""
+    try:
+        return server.app.wsgi()
+    except Exception:
+        server.log.exception('无法获取 Flask 应用实例')
+        return None
+
+
+def _start_preview_worker(server, app):
+    """启动预览队列进程处理遗留任务（队列清空后自动退出；之后由上传请求按需唤醒）。"""
+    try:
+        from app.utils.jobs import spawn_worker
+        spawn_worker(app, 'previews')
+    except Exception:
+        server.log.exception('启动预览队列进程失败')
+
+
+def when_ready(server):
+    """master 就绪、fork worker 之前：预热只读缓存并冻结 GC 追踪的对象，再启动预览队列进程。
+
+    队列进程同样会创建应用；放在 master 加载应用之后启动，不与 master 的建表/补列并发。
+    """
+    app = _flask_app(server) if preload_app else None
+    if app is not None:
+        from app import warm_caches
+        warm_caches(app)
+        # 预热后的对象移入永久代，避免 worker 中的 GC 触碰它们导致写时复制失效
+        gc.freeze()
+        server.log.info('应用已预加载，缓存预热完成（gc.freeze 对象数: %s）', gc.get_freeze_count())
+    _start_preview_worker(server, app)
+
+
+def post_fork(server, worker):
+    """worker fork 后：丢弃继承自 master 的连接，避免多个进程共用同一 SQLite 连接。"""
+    if not preload_app:
+        return
+    app = _flask_app(server)
+    if app is None:
+        return
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False：不关闭父进程仍持有的连接，只让本进程重新建立连接
+            engine.dispose(close=False)
+    server.log.info('worker %s 已重置数据库连接池', worker.pid)
@@ -3,68 +3,285 @@
 """
 GxP Guider日志配置
 用于配置应用的日志记录
+
+请求线程只把日志记录放入内存队列（QueueHandler），由每个进程内的后台线程
+（QueueListener）统一格式化并写入文件，避免请求阻塞在磁盘 IO 上。
+
+- 文件格式默认为 JSON（每行一条），可通过 LOG_FORMAT=text 切换为原文本格式；
+- 多个 gunicorn worker 写同一个日志文件时，通过文件锁串行化写入与轮转，
+  并在其他进程完成轮转后重新打开文件；
+- LOG_SAMPLE_RATES 可对噪声较大的日志器按比例采样（仅作用于 WARNING 以下级别）。
 """
 
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 下退化为单进程轮转
+    fcntl = None
+
+LOG_DIR = 'logs'
+MAX_BYTES = 10240000  # 10MB
+BACKUP_COUNT = 10
+# 默认对上传调试日志（完整表单/文件信息）按 10% 采样
+DEFAULT_SAMPLE_RATES = 'app.admin.upload=0.1'
+
+# 文件路径 -> _LogPipeline（每个进程每个文件一条流水线）
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON。"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pathname': record.pathname,
+            'lineno': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按日志器名称前缀对 WARNING 以下的记录采样。
+
+    rates 形如 ``{'app.admin.upload': 0.1}``，表示该日志器（及其子日志器）
+    每 10 条只保留 1 条。采用计数而非随机数，结果可复现。
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {name: max(0.0, min(1.0, rate)) for name, rate in (rates or {}).items()}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name):
+        best = None
+        for prefix, rate in self.rates.items():
+            if name == prefix or name.startswith(prefix + '.'):
+                if best is None or len(prefix) > len(best[0]):
+                    best = (prefix, rate)
+        return best
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        match = self._rate_for(record.name)
+        if match is None:
+            return True
+        prefix, rate = match
+        if rate <= 0:
+            return False
+        if rate >= 1:
+            return True
+        every = max(1, int(round(1 / rate)))
+        with self._lock:
+            count = self._counters.get(prefix, 0)
+            self._counters[prefix] = count + 1
+        return count % every == 0
+
+
+def parse_sample_rates(spec):
+    """解析 ``'logger=0.1,other=0.5'`` 形式的采样配置。"""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, sep, value = item.partition('=')
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
+
+
+class ProcessSafeRotatingFileHandler(RotatingFileHandler):
+    """多进程共享同一文件的 RotatingFileHandler。
+
+    写入与轮转前获取 ``<日志文件>.lock`` 的排他文件锁；若发现文件已被其他进程
+    轮转（inode 变化），先重新打开再写入。只在监听线程中调用，锁等待不影响请求线程。
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        self._lock_file = None
+        self._lock_pid = None
+
+    def _acquire_file_lock(self):
+        # flock 作用于打开的文件描述，fork 继承的描述与父进程共享，因此每个进程需各自打开
+        if self._lock_pid != os.getpid():
+            if self._lock_file is not None:
+                self._lock_file.close()
+            self._lock_file = open(self.baseFilename + '.lock', 'a')
+            self._lock_pid = os.getpid()
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+
+    def _reopen_if_rotated(self):
+        try:
+            disk_ino = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            disk_ino = None
+        if self.stream is not None:
+            try:
+                if disk_ino == os.fstat(self.stream.fileno()).st_ino:
+                    return
+            except OSError:
+                pass
+            self.stream.close()
+            self.stream = None
+        self.stream = self._open()
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        self._acquire_file_lock()
+        try:
+            self._reopen_if_rotated()
+            super().emit(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class _PreformattedQueueHandler(QueueHandler):
+    """入队前只合并消息参数与异常文本，保留结构化字段供监听线程格式化。"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LogPipeline:
+    """一个日志文件对应的 队列 -> 监听线程 -> 文件 流水线。"""
+
+    def __init__(self, path, formatter):
+        self.file_handler = ProcessSafeRotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+        self.file_handler.setFormatter(formatter)
+        self.queue_handler = _PreformattedQueueHandler(queue.SimpleQueue())
+        self.listener = None
+        self.start()
+
+    def start(self):
+        self.listener = QueueListener(self.queue_handler.queue, self.file_handler, respect_handler_level=True)
+        self.listener.start()
+
+    def restart_after_fork(self):
+        # 监听线程不会随 fork 复制：子进程换用新队列并重新启动线程
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+    def stop(self):
+        if self.listener is not None:
+            try:
+                self.listener.stop()
+            except Exception:
+                pass
+            self.listener = None
+
+
+def _make_formatter(fmt, text_format):
+    if (fmt or 'json').lower() == 'text':
+        return logging.Formatter(text_format)
+    return JsonFormatter()
+
+
+def _get_pipeline(path, formatter):
+    with _pipelines_lock:
+        pipeline = _pipelines.get(path)
+        if pipeline is None:
+            if not os.path.exists(LOG_DIR):
+                os.makedirs(LOG_DIR, exist_ok=True)
+            pipeline = _LogPipeline(path, formatter)
+            _pipelines[path] = pipeline
+        else:
+            pipeline.file_handler.setFormatter(formatter)
+        return pipeline
+
+
+def _attach(logger, pipeline, level, sample_rates):
+    handler = pipeline.queue_handler
+    handler.setLevel(level)
+    handler.filters = [SamplingFilter(sample_rates)] if sample_rates else []
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+def _restart_pipelines_after_fork():
+    for pipeline in list(_pipelines.values()):
+        pipeline.restart_after_fork()
+
+
+def _stop_pipelines():
+    """进程退出前停止监听线程，确保队列中的日志写完。"""
+    for pipeline in list(_pipelines.values()):
+        pipeline.stop()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_pipelines_after_fork)
+atexit.register(_stop_pipelines)
+
 
 def setup_logging(app):
     """设置应用日志"""
-    # 确保日志目录存在
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    
-    # 配置文件处理器
-    file_handler = RotatingFileHandler(
-        'logs/gmp_seeker.log', 
-        maxBytes=10240000,  # 10MB
-        backupCount=10
-    )
-    
-    # 设置日志格式
-    formatter = logging.Formatter(
+    level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    formatter = _make_formatter(
+        app.config.get('LOG_FORMAT', 'json'),
         '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
     )
-    file_handler.setFormatter(formatter)
-    
-    # 设置日志级别
-    file_handler.setLevel(logging.INFO)
-    
-    # 添加处理器到应用
-    app.logger.addHandler(file_handler)
-    
-    # 设置应用日志级别
-    app.logger.setLevel(logging.INFO)
-    
+    sample_rates = parse_sample_rates(app.config.get('LOG_SAMPLE_RATES', DEFAULT_SAMPLE_RATES))
+
+    pipeline = _get_pipeline(os.path.join(LOG_DIR, 'gmp_seeker.log'), formatter)
+    # app.logger 名为 'app'，各模块的 logging.getLogger(__name__) 会向上传递到这里
+    _attach(app.logger, pipeline, level, sample_rates)
+
     # 记录应用启动日志
     app.logger.info('GxP Guider启动')
 
 def setup_crawler_logging():
     """设置爬虫日志"""
-    # 确保日志目录存在
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    
-    # 配置文件处理器
-    file_handler = RotatingFileHandler(
-        'logs/crawler.log', 
-        maxBytes=10240000,  # 10MB
-        backupCount=10
-    )
-    
-    # 设置日志格式
-    formatter = logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s'
-    )
-    file_handler.setFormatter(formatter)
-    
-    # 设置日志级别
-    file_handler.setLevel(logging.INFO)
-    
+    level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    formatter = _make_formatter(os.environ.get('LOG_FORMAT', 'json'), '%(asctime)s %(levelname)s: %(message)s')
+    sample_rates = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+
     # 创建爬虫日志记录器
     crawler_logger = logging.getLogger('crawler')
-    crawler_logger.setLevel(logging.INFO)
-    crawler_logger.addHandler(file_handler)
-    
+    pipeline = _get_pipeline(os.path.join(LOG_DIR, 'crawler.log'), formatter)
+    _attach(crawler_logger, pipeline, level, sample_rates)
+
     return crawler_logger
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+导出压缩策略基准脚本
+对同一批文件分别以不同策略写 ZIP（写入计数 sink，不落盘），比较 CPU 时间与归档大小：
+
+- deflate-all：旧行为，所有条目 ZIP_DEFLATED（级别 6）；
+- auto：已压缩格式（PDF/Office Open XML/压缩包/图片）直接存储，其余压缩；
+- auto+probe：同上，未知类型按首块样本的压缩比决定；
+- auto-l1：auto+probe，压缩级别 1；
+- store-all：全部存储。
+
+默认生成一组接近线上构成的样本（以 PDF 为主，含 docx/xlsx、旧版 Office、CSV/TXT、图片与未知类型），
+也可用 --source 指定本地目录（如从 R2 同步下来的 documents/）：
+
+    python scripts/bench_export_compression.py
+    python scripts/bench_export_compression.py --source ./app/static/uploads/documents
+"""
+
+import sys
+import os
+import argparse
+import io
+import random
+import time
+import zipfile
+import zlib
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.zip_policy import PROBE_BYTES, CompressionPolicy
+
+CHUNK_SIZE = 1024 * 1024
+
+_WORDS = (
+    'validation cleaning process quality risk management sterile manufacturing guideline data integrity '
+    'computerized system qualification equipment facility contamination control strategy batch record '
+    '验证 清洁 工艺 质量 风险 管理 无菌 生产 指南 数据 完整性 计算机化 系统 确认 设备 设施 污染 控制 策略 批记录'
+).split()
+
+
+def _text(rng, size):
+    out = []
+    n = 0
+    while n < size:
+        w = rng.choice(_WORDS)
+        out.append(w)
+        n += len(w.encode('utf-8')) + 1
+    return ' '.join(out).encode('utf-8')[:size]
+
+
+def _pdf(rng, size):
+    # PDF 内容流通常已 FlateDecode 压缩：以压缩后的文本模拟
+    body = bytearray(b'%PDF-1.7\n')
+    while len(body) < size:
+        stream = zlib.compress(_text(rng, 256 * 1024), 6)
+        body += b'1 0 obj\n<< /Filter /FlateDecode /Length %d >>\nstream\n' % len(stream)
+        body += stream + b'\nendstream\nendobj\n'
+    return bytes(body[:size])
+
+
+def _ooxml(rng, size):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', b'<?xml version="1.0"?><Types/>')
+        zf.writestr('word/document.xml', b'<w:document><w:body>' + _text(rng, size * 4) + b'</w:body></w:document>')
+    return buf.getvalue()
+
+
+def _ole(rng, size):
+    # 旧版 Office：文本 + 大量零填充扇区
+    data = bytearray(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')
+    while len(data) < size:
+        data += _text(rng, 4096) + b'\x00' * 4096
+    return bytes(data[:size])
+
+
+def _image(rng, size):
+    return b'\xff\xd8\xff\xe0' + rng.randbytes(size - 4)
+
+
+def generate_corpus(seed=42, scale=1.0):
+    """返回 [(name, bytes)]，总量约 80MB × scale。"""
+    rng = random.Random(seed)
+    mb = 1024 * 1024
+
+    def n(count):
+        return max(1, int(count * scale))
+
+    files = []
+    for i in range(n(30)):
+        files.append((f'documents/ISPE/guide-{i:03d}.pdf', _pdf(rng, rng.randint(1 * mb, 3 * mb))))
+    for i in range(n(8)):
+        files.append((f'documents/PDA/report-{i:03d}.docx', _ooxml(rng, rng.randint(200_000, 600_000))))
+    for i in range(n(4)):
+        files.append((f'documents/WHO/annex-{i:03d}.doc', _ole(rng, rng.randint(300_000, 900_000))))
+    for i in range(n(4)):
+        files.append((f'documents/FDA/list-{i:03d}.csv', _text(rng, rng.randint(200_000, 800_000))))
+    for i in range(n(6)):
+        files.append((f'documents/APIC/scan-{i:03d}.jpg', _image(rng, rng.randint(300_000, 1 * mb))))
+    for i in range(n(3)):
+        files.append((f'documents/misc/notes-{i:03d}.dat', _text(rng, 400_000)))
+        files.append((f'documents/misc/blob-{i:03d}.dat', rng.randbytes(400_000)))
+    return files
+
+
+def load_directory(root):
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        for fn in sorted(filenames):
+            path = os.path.join(dirpath, fn)
+            with open(path, 'rb') as f:
+                files.append((os.path.relpath(path, root).replace(os.sep, '/'), f.read()))
+    return files
+
+
+class _CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def run(files, policy):
+    sink = _CountingSink()
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    deflated = 0
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for name, data in files:
+            zinfo = policy.zipinfo(name, (2024, 1, 1, 0, 0, 0), None, data[:PROBE_BYTES])
+            deflated += zinfo.compress_type == zipfile.ZIP_DEFLATED
+            with zf.open(zinfo, 'w') as dest:
+                for start in range(0, len(data), CHUNK_SIZE):
+                    dest.write(data[start:start + CHUNK_SIZE])
+    return time.process_time() - cpu0, time.perf_counter() - wall0, sink.size, deflated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出 ZIP 压缩策略基准')
+    parser.add_argument('--source', help='使用本地目录中的文件代替生成样本')
+    parser.add_argument('--scale', type=float, default=1.0, help='生成样本的数量倍数')
+    args = parser.parse_args()
+
+    files = load_directory(args.source) if args.source else generate_corpus(scale=args.scale)
+    total = sum(len(d) for _, d in files)
+    print(f'样本: {len(files)} 个文件, {total / 1024 / 1024:.1f} MB')
+
+    strategies = [
+        ('deflate-all', CompressionPolicy(mode='deflate', level=6)),
+        ('auto', CompressionPolicy(mode='auto', level=6, probe=False)),
+        ('auto+probe', CompressionPolicy(mode='auto', level=6, probe=True)),
+        ('auto-l1', CompressionPolicy(mode='auto', level=1, probe=True)),
+        ('store-all', CompressionPolicy(mode='store')),
+    ]
+    baseline = None
+    print(f"{'策略':<12}{'CPU(s)':>9}{'墙钟(s)':>9}{'归档(MB)':>10}{'相对大小':>9}{'压缩条目':>9}")
+    for label, policy in strategies:
+        cpu, wall, size, deflated = run(files, policy)
+        if baseline is None:
+            baseline = size
+        print(f'{label:<12}{cpu:>9.2f}{wall:>9.2f}{size / 1024 / 1024:>10.1f}{size / baseline:>9.1%}{deflated:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTTP 压测脚本（仅依赖标准库）
+用于对比不同 gunicorn 配置下公共页面的吞吐与延迟，例如：
+
+    # 旧默认：单进程 sync
+    WORKERS=1 WORKER_CLASS=sync THREADS=1 PRELOAD=false ./start.sh
+    # 新默认：preload + gthread
+    ./start.sh
+
+    python scripts/bench_serving.py --url http://127.0.0.1:5000 \
+        --paths / /documents --concurrency 8 --duration 20 \
+        --slow-path /documents/1 --slow-concurrency 2
+
+``--slow-path`` 会在压测期间持续请求一个慢页面（如需要 HEAD 远程文件的详情页、
+或正在执行的导出），用于观察慢请求对其他请求 p95 的影响。
+"""
+
+import sys
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class _Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def add(self, latency, ok):
+        with self.lock:
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+
+def _worker(base_url, paths, deadline, recorder, timeout):
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=timeout) as resp:
+                resp.read()
+                ok = resp.status < 500
+        except urllib.error.HTTPError as e:
+            ok = e.code < 500
+        except Exception:
+            ok = False
+        recorder.add(time.perf_counter() - start, ok)
+
+
+def _run(base_url, paths, concurrency, duration, timeout, slow_path=None, slow_concurrency=0):
+    deadline = time.monotonic() + duration
+    main_rec = _Recorder()
+    slow_rec = _Recorder()
+    threads = []
+    for _ in range(slow_concurrency if slow_path else 0):
+        threads.append(threading.Thread(target=_worker, args=(base_url, [slow_path], deadline, slow_rec, timeout), daemon=True))
+    for _ in range(concurrency):
+        threads.append(threading.Thread(target=_worker, args=(base_url, paths, deadline, main_rec, timeout), daemon=True))
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    return main_rec, slow_rec, elapsed
+
+
+def _report(label, rec, elapsed):
+    lat_ms = [l * 1000 for l in rec.latencies]
+    total = len(lat_ms)
+    print(f"{label}:")
+    print(f"  请求数: {total}  错误: {rec.errors}  吞吐: {total / elapsed:.1f} req/s")
+    if lat_ms:
+        print(
+            f"  延迟(ms): p50 {statistics.median(lat_ms):.1f}  p95 {_percentile(lat_ms, 95):.1f}  "
+            f"p99 {_percentile(lat_ms, 99):.1f}  max {max(lat_ms):.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='公共页面 HTTP 压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='服务根地址')
+    parser.add_argument('--paths', nargs='+', default=['/', '/documents'], help='轮询请求的路径')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=20.0, help='持续时间（秒）')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单请求超时（秒）')
+    parser.add_argument('--slow-path', help='压测期间持续请求的慢路径')
+    parser.add_argument('--slow-concurrency', type=int, default=1, help='慢路径并发数')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    main_rec, slow_rec, elapsed = _run(
+        base_url, args.paths, args.concurrency, args.duration, args.timeout,
+        slow_path=args.slow_path, slow_concurrency=args.slow_concurrency
+    )
+    print(f"目标: {base_url}  并发: {args.concurrency}  时长: {elapsed:.1f}s")
+    _report('公共页面 ' + ' '.join(args.paths), main_rec, elapsed)
+    if args.slow_path:
+        _report(f'慢请求 {args.slow_path}', slow_rec, elapsed)
+    sys.exit(1 if main_rec.errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+冷启动基准脚本
+在独立子进程中以 ``python -X importtime`` 执行 ``create_app``，统计：
+- create_app 墙钟耗时（含导入）与 importtime 中最慢的模块；
+- 启动后常驻内存（ru_maxrss）；
+- 对比“延迟导入的重型模块被提前加载”时的内存，估算每个 worker 节省的内存。
+
+超出预算时以非零状态退出，可用于 CI/发布前检查：
+
+    python scripts/bench_startup.py --budget-ms 1000 --runs 5
+"""
+
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 已改为首次使用时再导入的模块；任何一个出现在冷启动路径上都视为回归
+DEFERRED_MODULES = [
+    'openpyxl',
+    'boto3',
+    'botocore',
+    'pypdf',
+    'markdown',
+    'bleach',
+    'requests',
+]
+# 说明：zipfile 仅在导出时使用，但 Flask-Admin 经由 pkg_resources 会间接导入，
+# 因此不计入回归检查（with_admin=False 时不会加载）。
+
+_CHILD_CODE = r"""
+import json, os, resource, sys, time, warnings
+warnings.filterwarnings('ignore')
+sys.path.insert(0, {root!r})
+eager = {eager!r}
+t0 = time.perf_counter()
+for name in eager:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+from app import create_app
+create_app(os.getenv('FLASK_ENV') or 'default', with_admin={with_admin!r})
+elapsed_ms = (time.perf_counter() - t0) * 1000
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print('BENCH ' + json.dumps({{'elapsed_ms': elapsed_ms, 'rss_kb': rss_kb, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def _run_child(with_admin=True, eager=()):
+    code = _CHILD_CODE.format(root=ROOT, eager=list(eager), with_admin=with_admin)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=ROOT
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f'子进程启动失败:\n{proc.stderr[-2000:]}')
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith('BENCH '):
+            result = json.loads(line[len('BENCH '):])
+    if result is None:
+        raise RuntimeError('未获取到基准输出')
+    result['importtime'] = _parse_importtime(proc.stderr)
+    return result
+
+
+def _parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 {模块: 累计微秒}。"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        try:
+            _, cum_us, name = [p.strip() for p in line.replace('import time:', '').split('|')]
+            cumulative[name] = int(cum_us)
+        except ValueError:
+            continue
+    return cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description='create_app 冷启动基准')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数（取中位数）')
+    parser.add_argument('--budget-ms', type=float, default=1000.0, help='create_app 耗时预算（毫秒，中位数）')
+    parser.add_argument('--no-admin', action='store_true', help='按脚本方式启动（with_admin=False）')
+    parser.add_argument('--top', type=int, default=15, help='显示最慢的前 N 个顶层导入')
+    args = parser.parse_args()
+
+    with_admin = not args.no_admin
+    runs = [_run_child(with_admin=with_admin) for _ in range(max(1, args.runs))]
+    elapsed = [r['elapsed_ms'] for r in runs]
+    median_ms = statistics.median(elapsed)
+    rss_kb = statistics.median(r['rss_kb'] for r in runs)
+
+    print(f"create_app(with_admin={with_admin}) x{len(runs)}")
+    print(f"  耗时中位数: {median_ms:.1f} ms (min {min(elapsed):.1f}, max {max(elapsed):.1f})")
+    print(f"  常驻内存:   {rss_kb / 1024:.1f} MB")
+
+    importtime = runs[-1]['importtime']
+    print(f"  最慢的导入（累计，ms）:")
+    top_level = {k: v for k, v in importtime.items() if '.' not in k}
+    for name, cum_us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"    {cum_us / 1000:8.1f}  {name}")
+
+    loaded = set(runs[-1]['modules'])
+    regressions = [m for m in DEFERRED_MODULES if m in loaded]
+
+    # 对比：提前加载延迟模块时的内存，即每个 worker 节省的常驻内存
+    eager = _run_child(with_admin=with_admin, eager=DEFERRED_MODULES)
+    saved_mb = (eager['rss_kb'] - rss_kb) / 1024
+    print(f"  提前加载延迟模块时: {eager['elapsed_ms']:.1f} ms, {eager['rss_kb'] / 1024:.1f} MB")
+    print(f"  每个 worker 节省约: {saved_mb:.1f} MB 常驻内存, {eager['elapsed_ms'] - median_ms:.1f} ms 启动时间")
+
+    failed = False
+    if regressions:
+        print(f"[FAIL] 以下模块不应在启动时导入: {', '.join(regressions)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"[FAIL] 启动耗时 {median_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"[OK] 启动耗时在预算 {args.budget_ms:.0f} ms 内")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档文件去重报告
+统计按内容存储（blobs 表）节省的空间，并找出尚未按内容存储的重复文件：
+
+- 已去重：blob 数、实际占用、被引用的文档字段数与按引用计算的逻辑大小，差值即去重节省的空间；
+- 存量重复：documents 中引用的文件按大小分组，大小相同的再比较内容（单次上传的 R2 ETag 即 MD5；
+  分片上传的 ETag 与本地文件需 --verify 下载计算 SHA-256），列出重复组与可回收的空间；
+- --adopt：把内容相同的存量文件登记为同一个 blob，文档改为引用它（预览也统一为其中一份），
+  其余对象不再被引用，可随后清理；隐含 --verify；
+- --recount：按文档当前的文件 URL 重建 blob 关联与引用计数。
+
+    python scripts/blob_report.py
+    python scripts/blob_report.py --verify
+    python scripts/blob_report.py --adopt
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+from collections import defaultdict
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import Blob, Document
+from app.utils.blobs import apply_blob, find_blob, recount_refs, register_blob
+from app.utils.export_scope import normalize_etag
+from app.utils.preview_queue import VARIANT_FIELDS
+from app.utils.r2 import _get_config, _s3_client, extract_key_from_url
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _human(size):
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f}{unit}' if unit != 'B' else f'{int(size)}B'
+        size /= 1024
+
+
+def blob_summary():
+    blobs = Blob.query.all()
+    stored = sum(b.size for b in blobs)
+    logical = sum(b.size * b.ref_count for b in blobs)
+    refs = sum(b.ref_count for b in blobs)
+    saved = sum(b.size * (b.ref_count - 1) for b in blobs if b.ref_count > 1)
+    unused = [b for b in blobs if b.ref_count <= 0]
+    print(f'已按内容存储: {len(blobs)} 个文件，占用 {_human(stored)}；被 {refs} 个文档字段引用，'
+          f'逻辑大小 {_human(logical)}，去重节省 {_human(saved)}')
+    if unused:
+        print(f'  未被引用: {len(unused)} 个，{_human(sum(b.size for b in unused))}')
+
+
+class _Source:
+    """文档引用的一个文件（R2 对象或本地 static 文件）。"""
+
+    def __init__(self, url, key=None, path=None, size=0, etag=''):
+        self.url = url
+        self.key = key
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.sha256 = None
+
+    def digest(self, client, bucket):
+        if self.sha256:
+            return self.sha256
+        sha = hashlib.sha256()
+        if self.path:
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    sha.update(chunk)
+        else:
+            body = client.get_object(Bucket=bucket, Key=self.key)['Body']
+            try:
+                for chunk in iter(lambda: body.read(CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            finally:
+                body.close()
+        self.sha256 = sha.hexdigest()
+        return self.sha256
+
+
+def _collect_sources(app, client, bucket):
+    """documents 中引用的所有文件 -> _Source；R2 对象的大小与 ETag 取自一次 documents/ 列表。"""
+    urls = set()
+    for row in db.session.query(Document.original_file_url, Document.translation_file_url):
+        urls.update(u for u in row if u)
+    listing = {}
+    if client is not None:
+        paginator = client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix='documents/'):
+            for obj in page.get('Contents', []):
+                listing[obj['Key']] = (int(obj.get('Size', 0)), normalize_etag(obj.get('ETag')))
+    sources, missing = [], 0
+    for url in sorted(urls):
+        if url.startswith('/static/'):
+            path = os.path.join(app.root_path, url.lstrip('/'))
+            if os.path.isfile(path):
+                sources.append(_Source(url, path=path, size=os.path.getsize(path)))
+                continue
+        else:
+            key = extract_key_from_url(url)
+            if key and key in listing:
+                size, etag = listing[key]
+                sources.append(_Source(url, key=key, size=size, etag=etag))
+                continue
+        missing += 1
+    return sources, missing
+
+
+def find_duplicates(sources, client, bucket, verify=False):
+    """返回内容相同的文件组 [[_Source, ...]]（每组至少 2 个 URL）。"""
+    by_size = defaultdict(list)
+    for source in sources:
+        if source.size > 0:
+            by_size[source.size].append(source)
+    groups = []
+    for candidates in by_size.values():
+        if len(candidates) < 2:
+            continue
+        by_content = defaultdict(list)
+        for source in candidates:
+            # 单次上传的 ETag 是 MD5，可直接比较；分片上传（含 '-'）与本地文件需要计算摘要
+            if not verify and source.etag and '-' not in source.etag:
+                by_content['md5:' + source.etag].append(source)
+            elif verify or source.path:
+                by_content['sha256:' + source.digest(client, bucket)].append(source)
+            else:
+                by_content['unverified:' + source.url].append(source)
+        groups.extend(group for group in by_content.values() if len(group) > 1)
+    return groups
+
+
+def adopt(group, client, bucket):
+    """把一组内容相同的文件登记为同一个 blob 并让文档改为引用它，返回改动的文档字段数。"""
+    sha256 = group[0].digest(client, bucket)
+    blob = find_blob(sha256)
+    if blob is None:
+        first = group[0]
+        key = first.key or first.url[len('/static/uploads/'):]
+        blob = register_blob(sha256, first.size, key, first.url)
+    urls = {source.url for source in group}
+    changed = 0
+    for variant, (file_field, preview_field) in VARIANT_FIELDS.items():
+        column = getattr(Document, file_field)
+        for doc in Document.query.filter(column.in_(urls)):
+            preview = getattr(doc, preview_field)
+            if preview and not blob.preview_url:
+                blob.preview_url = preview
+            apply_blob(doc, variant, blob)
+            changed += 1
+    db.session.commit()
+    return changed
+
+
+def blob_report(app, verify=False, adopt_groups=False, recount=False):
+    with app.app_context():
+        if recount:
+            print(f'已重建引用计数：修正 {recount_refs()} 个 blob')
+        blob_summary()
+        try:
+            client = _s3_client()
+            bucket, *_ = _get_config()
+        except RuntimeError as e:
+            print(f'R2 不可用，只检查本地文件: {e}')
+            client, bucket = None, None
+        sources, missing = _collect_sources(app, client, bucket)
+        groups = find_duplicates(sources, client, bucket, verify=verify or adopt_groups)
+        reclaimable = sum(group[0].size * (len(group) - 1) for group in groups)
+        print(f'存量文件: {len(sources)} 个（另有 {missing} 个 URL 找不到对应文件）；'
+              f'重复 {len(groups)} 组，可回收 {_human(reclaimable)}')
+        for group in sorted(groups, key=lambda g: g[0].size * (len(g) - 1), reverse=True):
+            print(f'  {_human(group[0].size)} × {len(group)}')
+            for source in group:
+                print(f'    {source.url}')
+        if adopt_groups and groups:
+            changed = sum(adopt(group, client, bucket) for group in groups)
+            # 文件 URL 未变的文档不触发关联事件，统一重建一次
+            recount_refs()
+            print(f'已合并 {len(groups)} 组，更新 {changed} 个文档字段；重复的对象与预览不再被引用')
+        return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文档文件去重报告')
+    parser.add_argument('--verify', action='store_true', help='下载并计算 SHA-256 确认重复（否则单次上传的对象按 ETag 比较）')
+    parser.add_argument('--adopt', action='store_true', help='把内容相同的存量文件合并为同一个 blob')
+    parser.add_argument('--recount', action='store_true', help='重建 blob 关联与引用计数')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    blob_report(app, verify=args.verify, adopt_groups=args.adopt, recount=args.recount)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+相关文档计算脚本
+基于标题与中英文概述的 TF-IDF 余弦相似度，为每篇文档预计算前 k 个相关文档，
+写入 document_neighbors 表供详情页读取。建议在导入或爬取完成后执行：
+
+    python scripts/build_related.py            # 增量：只重算文本变化及受影响的文档
+    python scripts/build_related.py --full     # 全量重算
+
+依赖 numpy 与 scipy：pip install "gmp-seeker[related]"
+"""
+
+import sys
+import os
+import argparse
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.related import DEFAULT_BATCH_SIZE, DEFAULT_MIN_SCORE, DEFAULT_TOP_K, recompute_neighbors
+
+
+def build_related(app, full=False, top_k=DEFAULT_TOP_K, batch_size=DEFAULT_BATCH_SIZE, min_score=DEFAULT_MIN_SCORE):
+    """在应用上下文中重算相关文档，返回统计信息。"""
+    with app.app_context():
+        started = time.perf_counter()
+        stats = recompute_neighbors(full=full, top_k=top_k, batch_size=batch_size, min_score=min_score, log=print)
+        elapsed = time.perf_counter() - started
+        print(
+            f"相关文档计算完成: 文档 {stats['documents']} 篇，重算 {stats['recomputed']} 篇，"
+            f"写入 {stats['rows']} 行，清理 {stats['removed']} 篇、孤立行 {stats['orphaned']} 行，耗时 {elapsed:.2f}s"
+        )
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预计算相关文档（TF-IDF 余弦相似度）')
+    parser.add_argument('--full', action='store_true', help='全量重算（默认增量）')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='每篇文档保留的相关文档数')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批计算的文档数')
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE, help='最低相似度')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    try:
+        build_related(app, full=args.full, top_k=args.top_k, batch_size=args.batch_size, min_score=args.min_score)
+    except RuntimeError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+R2 导出包清理脚本
+导出任务过期时应用会删除对应的 R2 导出包；本脚本作为兜底，可由 cron 定期执行：
+
+- 删除 EXPORT_R2_PREFIX（默认 exports/）下超过保留时间的对象；
+- 放弃（abort）超过保留时间仍未完成的分片上传（进程崩溃等原因遗留）；
+- --install-lifecycle：在存储桶上写入同等效果的生命周期规则（保留其他规则），之后由 R2 自动清理。
+
+    python scripts/cleanup_exports.py                      # 按 EXPORT_R2_RETENTION_HOURS（默认 24）清理
+    python scripts/cleanup_exports.py --max-age-hours 6 --dry-run
+    python scripts/cleanup_exports.py --install-lifecycle
+"""
+
+import sys
+import os
+import argparse
+import math
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.r2 import _get_config, _s3_client, delete_objects
+from app.utils.r2_multipart import abort_stale_uploads
+
+LIFECYCLE_RULE_ID = 'expire-admin-exports'
+
+
+def _delete_old_objects(client, bucket, prefix, cutoff, dry_run):
+    """删除 prefix 下早于 cutoff 的对象，返回 (删除数, 删除失败数)。"""
+    keys = []
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['LastModified'] >= cutoff:
+                continue
+            print(f"{'[dry-run] ' if dry_run else ''}删除 {obj['Key']}（{obj['LastModified']:%Y-%m-%d %H:%M}，{obj.get('Size', 0)} 字节）")
+            keys.append(obj['Key'])
+    if dry_run or not keys:
+        return len(keys), 0
+    failed = delete_objects(keys)
+    for key, code in failed:
+        print(f'删除失败 {key}: {code}')
+    return len(keys) - len(failed), len(failed)
+
+
+def _abort_stale_uploads(client, bucket, prefix, cutoff, dry_run):
+    stale = abort_stale_uploads(client, bucket, prefix, cutoff, dry_run)
+    for key, initiated in stale:
+        print(f"{'[dry-run] ' if dry_run else ''}放弃未完成的分片上传 {key}（{initiated:%Y-%m-%d %H:%M}）")
+    return len(stale)
+
+
+def install_lifecycle(client, bucket, prefix, max_age_hours):
+    """写入（或替换）导出目录的生命周期规则；生命周期以天为单位，向上取整。"""
+    from botocore.exceptions import ClientError
+
+    days = max(1, math.ceil(max_age_hours / 24))
+    try:
+        rules = client.get_bucket_lifecycle_configuration(Bucket=bucket).get('Rules', [])
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'NoSuchLifecycleConfiguration':
+            raise
+        rules = []
+    rules = [r for r in rules if r.get('ID') != LIFECYCLE_RULE_ID]
+    rules.append({
+        'ID': LIFECYCLE_RULE_ID,
+        'Filter': {'Prefix': prefix},
+        'Status': 'Enabled',
+        'Expiration': {'Days': days},
+        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 1},
+    })
+    client.put_bucket_lifecycle_configuration(Bucket=bucket, LifecycleConfiguration={'Rules': rules})
+    print(f'已写入生命周期规则 {LIFECYCLE_RULE_ID}：{prefix} 下的对象 {days} 天后过期，未完成的分片上传 1 天后放弃')
+
+
+def cleanup_exports(app, max_age_hours=None, dry_run=False, lifecycle=False):
+    """清理 R2 上过期的导出包与未完成的分片上传，返回 (删除对象数, 放弃上传数, 删除失败数)。"""
+    with app.app_context():
+        prefix = app.config.get('EXPORT_R2_PREFIX', 'exports/')
+        if max_age_hours is None:
+            max_age_hours = app.config.get('EXPORT_R2_RETENTION_HOURS', 24)
+        client = _s3_client()
+        bucket, *_ = _get_config()
+        if lifecycle:
+            install_lifecycle(client, bucket, prefix, max_age_hours)
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        deleted, failed = _delete_old_objects(client, bucket, prefix, cutoff, dry_run)
+        aborted = _abort_stale_uploads(client, bucket, prefix, cutoff, dry_run)
+        print(f'清理完成：删除 {deleted} 个导出包，放弃 {aborted} 个未完成的分片上传，删除失败 {failed} 个')
+        return deleted, aborted, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='清理 R2 上过期的导出包')
+    parser.add_argument('--max-age-hours', type=float, help='保留时间（小时），默认取 EXPORT_R2_RETENTION_HOURS')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将被清理的对象')
+    parser.add_argument('--install-lifecycle', action='store_true', help='同时写入存储桶生命周期规则')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    _, _, failed = cleanup_exports(app, max_age_hours=args.max_age_hours, dry_run=args.dry_run,
+                                   lifecycle=args.install_lifecycle)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+R2 孤儿对象清理脚本
+替换文件时应用只尽力删除旧对象；直传后未完成登记、删除失败、被替换的旧预览等对象会留在存储桶中，
+拖慢导出时的全量列表。本脚本可由 cron 定期执行：
+
+- 一次分页列出 documents/（含 documents/preview/、documents/sha256/）与 thumbnails/；
+- 与 documents 表中所有文件/预览/页面图片/封面 URL 比较，未被引用且超过宽限期（默认 24 小时，
+  避免误删刚直传、尚未登记的对象）的对象视为孤儿；
+- 以 delete_objects 每批最多 1000 个 key 删除；不再被任何文档引用的 blob 记录随对象一并删除；
+- 放弃 documents/ 下超过宽限期仍未完成的分片上传（浏览器分片直传中断后未续传）；
+- --dry-run 只按前缀汇总并列出将被删除的对象。
+
+URL 按当前 CDN_URL/R2_ENDPOINT_URL 反推 key，同时把 URL 路径（及去掉首段存储桶名后的路径）
+都视为被引用，更换过 CDN 域名的旧 URL 也不会被误判为孤儿。
+
+    python scripts/gc_r2_orphans.py --dry-run
+    python scripts/gc_r2_orphans.py --grace-hours 72
+"""
+
+import sys
+import os
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote, urlparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, select
+
+from app import create_app, db
+from app.models import Blob, Document
+from app.utils.blobs import recount_refs
+from app.utils.page_images import page_image_urls
+from app.utils.r2 import _get_config, _s3_client, delete_objects, extract_key_from_url
+from app.utils.r2_multipart import abort_stale_uploads
+
+PREFIXES = ('documents/', 'thumbnails/')
+URL_FIELDS = ('original_file_url', 'translation_file_url', 'original_preview_url',
+              'translation_preview_url', 'cover_url')
+PAGE_IMAGE_FIELDS = ('original_page_images', 'translation_page_images')
+
+
+def _human(size):
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f}{unit}' if unit != 'B' else f'{int(size)}B'
+        size /= 1024
+
+
+def _candidate_keys(url):
+    """URL 可能对应的对象 key（宁多勿少：多出的 key 只会让对象被保留）。"""
+    keys = set()
+    key = extract_key_from_url(url)
+    if key:
+        keys.add(key)
+    if url.startswith(('http://', 'https://')):
+        path = unquote(urlparse(url).path).lstrip('/')
+        if path:
+            keys.add(path)
+            if '/' in path:
+                keys.add(path.split('/', 1)[1])
+    return keys
+
+
+def referenced_keys():
+    """documents 中所有 URL（含页面图片）对应的 key，以及仍被引用的 blob 的预览与页面图片 key。"""
+    docs = Document.__table__
+    blobs = Blob.__table__
+    urls = set()
+    for row in db.session.execute(select(*(docs.c[f] for f in URL_FIELDS + PAGE_IMAGE_FIELDS))):
+        urls.update(u.strip() for u in row[:len(URL_FIELDS)] if u and u.strip())
+        for pages in row[len(URL_FIELDS):]:
+            urls.update(page_image_urls(pages))
+    for preview_url, pages in db.session.execute(
+        select(blobs.c.preview_url, blobs.c.page_images).where(blobs.c.ref_count > 0, blobs.c.preview_url.is_not(None))
+    ):
+        urls.add(preview_url)
+        urls.update(page_image_urls(pages))
+    keys = set()
+    for url in urls:
+        keys.update(_candidate_keys(url))
+    return keys
+
+
+def list_objects(client, bucket):
+    """一次分页列出 PREFIXES 下的全部对象 -> [(key, size, last_modified)]。"""
+    objects = []
+    paginator = client.get_paginator('list_objects_v2')
+    for prefix in PREFIXES:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                objects.append((obj['Key'], int(obj.get('Size', 0)), obj['LastModified']))
+    return objects
+
+
+def _prefix_of(key):
+    for prefix in ('documents/preview/', 'documents/sha256/'):
+        if key.startswith(prefix):
+            return prefix
+    return key.split('/', 1)[0] + '/'
+
+
+def find_orphans(objects, keys, cutoff):
+    """返回 (孤儿对象列表, 宽限期内未被引用而保留的对象数)。"""
+    orphans, recent = [], 0
+    for key, size, modified in objects:
+        if key in keys:
+            continue
+        if modified >= cutoff:
+            recent += 1
+            continue
+        orphans.append((key, size, modified))
+    return orphans, recent
+
+
+def _drop_unreferenced_blobs(orphan_keys):
+    """删除对象即将被清理的 blob 记录（仅限无文档引用的），返回删除的记录数。"""
+    blobs = Blob.__table__
+    ids = [bid for bid, key in db.session.execute(select(blobs.c.id, blobs.c.key)) if key in orphan_keys]
+    if not ids:
+        return 0
+    with db.engine.begin() as conn:
+        return conn.execute(delete(blobs).where(blobs.c.id.in_(ids), blobs.c.ref_count <= 0)).rowcount
+
+
+def _still_referenced(orphan_keys):
+    """删除前复查：列表之后新登记的文档 URL 或 blob（如重新上传了相同内容）对应的 key。"""
+    db.session.remove()
+    keys = referenced_keys()
+    keys.update(key for (key,) in db.session.execute(select(Blob.__table__.c.key)))
+    return orphan_keys & keys
+
+
+def gc_orphans(app, grace_hours=24, dry_run=False, verbose=False):
+    """清理 R2 上未被任何文档引用的对象，返回 (孤儿数, 删除失败数)。"""
+    with app.app_context():
+        client = _s3_client()
+        bucket, *_ = _get_config()
+        if not dry_run:
+            # 先按文档 URL 校正引用计数，无人引用的 blob 才会随对象一并删除
+            recount_refs()
+        keys = referenced_keys()
+        objects = list_objects(client, bucket)
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+        orphans, recent = find_orphans(objects, keys, cutoff)
+
+        by_prefix = defaultdict(lambda: [0, 0])
+        for key, size, _ in orphans:
+            by_prefix[_prefix_of(key)][0] += 1
+            by_prefix[_prefix_of(key)][1] += size
+        print(f'已列出 {len(objects)} 个对象，文档引用 {len(keys)} 个 key；'
+              f'孤儿 {len(orphans)} 个（{_human(sum(o[1] for o in orphans))}），宽限期内保留 {recent} 个')
+        for prefix, (count, size) in sorted(by_prefix.items()):
+            print(f'  {prefix:<20} {count} 个，{_human(size)}')
+        if dry_run or verbose:
+            for key, size, modified in orphans:
+                print(f"{'[dry-run] ' if dry_run else ''}删除 {key}（{modified:%Y-%m-%d %H:%M}，{size} 字节）")
+        aborted = abort_stale_uploads(client, bucket, 'documents/', cutoff, dry_run)
+        for key, initiated in aborted:
+            print(f"{'[dry-run] ' if dry_run else ''}放弃未完成的分片上传 {key}（{initiated:%Y-%m-%d %H:%M}）")
+        if aborted:
+            print(f"{'将' if dry_run else '已'}放弃 {len(aborted)} 个未完成的分片上传")
+        if dry_run or not orphans:
+            return len(orphans), 0
+
+        orphan_keys = {key for key, _, _ in orphans}
+        dropped = _drop_unreferenced_blobs(orphan_keys)
+        orphan_keys -= _still_referenced(orphan_keys)
+        failed = delete_objects(sorted(orphan_keys))
+        for key, code in failed:
+            print(f'删除失败 {key}: {code}')
+        print(f'清理完成：删除 {len(orphan_keys) - len(failed)} 个对象、{dropped} 条 blob 记录，失败 {len(failed)} 个')
+        return len(orphans), len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='清理 R2 上未被文档引用的对象')
+    parser.add_argument('--grace-hours', type=float, default=24, help='只清理早于该时长的对象（默认 24 小时）')
+    parser.add_argument('--dry-run', action='store_true', help='只汇总并列出将被删除的对象')
+    parser.add_argument('--verbose', action='store_true', help='删除时逐个列出对象')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    _, failed = gc_orphans(app, grace_hours=args.grace_hours, dry_run=args.dry_run, verbose=args.verbose)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
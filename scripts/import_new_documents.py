@@ -174,7 +174,7 @@ def import_new_apic_documents(app):
 def import_all_new_documents():
     """导入所有新增文档"""
     # 创建应用实例
-    app = create_app()
+    app = create_app(with_admin=False)
     
     total_imported = 0
     total_skipped = 0
@@ -206,6 +206,14 @@ def import_all_new_documents():
     
     print(f"所有新增文档导入完成: 总共新增 {total_imported} 条记录，跳过 {total_skipped} 条已存在记录")
 
+    # 有新增文档时增量更新相关文档（未安装 numpy/scipy 时跳过）
+    if total_imported:
+        try:
+            from scripts.build_related import build_related
+            build_related(app)
+        except RuntimeError as e:
+            print(f"跳过相关文档计算: {e}")
+
 
 if __name__ == '__main__':
     import_all_new_documents()
@@ -817,7 +817,7 @@ def init_db_comprehensive(source='auto', org_filter=None, upsert=False, dry_run=
     """完整初始化数据库"""
     # 创建应用实例（遵循与 run.py 一致的配置选择）
     # 优先使用环境变量 FLASK_ENV 指定的配置，否则回落到默认配置
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     default_local_root = os.path.normpath(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'static', 'uploads', 'documents'))
     local_root = local_root or default_local_root
     r2_base = r2_base or "https://gmp-guidelines.wen817.com"
@@ -19,7 +19,7 @@ from app.models import User, Document, Organization, Category
 
 def create_user(username, email, password, is_admin=False):
     """创建用户"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         # 检查用户是否已存在
         existing_user = User.query.filter_by(email=email).first()
@@ -36,7 +36,7 @@ def create_user(username, email, password, is_admin=False):
 
 def delete_user(email):
     """删除用户"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         user = User.query.filter_by(email=email).first()
         if not user:
@@ -49,7 +49,7 @@ def delete_user(email):
 
 def list_users():
     """列出所有用户"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         users = User.query.all()
         if not users:
@@ -64,7 +64,7 @@ def list_users():
 
 def set_admin(email):
     """设置用户为管理员"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         user = User.query.filter_by(email=email).first()
         if not user:
@@ -77,7 +77,7 @@ def set_admin(email):
 
 def remove_admin(email):
     """取消用户管理员权限"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         user = User.query.filter_by(email=email).first()
         if not user:
@@ -90,7 +90,7 @@ def remove_admin(email):
 
 def list_documents():
     """列出所有文档"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         documents = Document.query.all()
         if not documents:
@@ -108,7 +108,7 @@ def list_documents():
 
 def delete_document(doc_id):
     """删除文档"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         doc = Document.query.get(doc_id)
         if not doc:
@@ -121,7 +121,7 @@ def delete_document(doc_id):
 
 def set_document_status(doc_id, status):
     """设置文档状态"""
-    app = create_app(os.getenv('FLASK_ENV') or 'default')
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
     with app.app_context():
         doc = Document.query.get(doc_id)
         if not doc:
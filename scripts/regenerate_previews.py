@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量重建 PDF 预览
+修改预览页数（PREVIEW_PAGES）、页面图片设置，或修复一批损坏的预览时，不必重新上传文件：
+
+- 遍历所有原版/中文版为 PDF 的文档，相同文件（同一 URL，如按内容存储的 blob）只生成一次；
+- 以 --fetch-concurrency 个线程从 R2 下载（本地 static/uploads 的文件直接读取），
+  同时在途（已下载、未完成）的文件不超过 --fetch-concurrency + --processes 个，临时空间有上限；
+- pypdf 截取预览与页面图片渲染是 CPU 密集的，在 --processes 个进程（ProcessPoolExecutor）中执行；
+- 生成后上传到预览原来的位置（R2 或本地），写回所有引用该文件的文档与 blob，旧预览与页面图片
+  在不再被引用时删除；
+- 状态文件（--state）记录每个文件完成时的内容 SHA-256 与生成设置（R2 上的文件另记大小与 ETag）：
+  中断后重跑即从断点继续，之后再运行时内容与设置都未变的文件直接跳过（--force 全部重建）；
+  未按内容存储的 R2 文件先 HEAD，大小与 ETag 未变时不下载；
+- 结束时报告处理的文件数、更新的文档数与吞吐量（文档/分钟）。
+
+    python scripts/regenerate_previews.py
+    python scripts/regenerate_previews.py --processes 4 --fetch-concurrency 8
+    python scripts/regenerate_previews.py --force --limit 20
+"""
+
+import sys
+import os
+import argparse
+import hashlib
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app import create_app
+from app.models import Blob, Document, Organization
+from app.utils.blobs import blob_page_images, blob_preview, record_preview
+from app.utils.export_scope import normalize_etag
+from app.utils.page_images import _load_renderer, dump_pages, image_settings, store_pages
+from app.utils.pdf_preview import _new_preview_name, _store_preview, build_preview_files
+from app.utils.preview_queue import (
+    PAGE_IMAGE_FIELDS, VARIANT_FIELDS, _delete_page_images_safely, _delete_preview_safely, _engine,
+    _settle_document_status, needs_preview, write_preview,
+)
+from app.utils.r2 import download_to_path, extract_key_from_url, head_object
+
+DEFAULT_STATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'preview_state.json')
+CHUNK_SIZE = 1024 * 1024
+# 状态文件的最短写入间隔（秒）
+CHECKPOINT_SECONDS = 10
+
+
+class _Item:
+    """一个需要生成预览的文件及引用它的文档字段。"""
+
+    def __init__(self, url, organization_name):
+        self.url = url
+        self.organization_name = organization_name
+        self.refs = []  # [(document_id, variant, 旧预览 URL, 旧页面图片)]
+        self.sha256 = None
+        self.size = None
+        self.etag = None
+        self.unchanged = False
+        self.workdir = None
+        self.source = None
+        self.fetched_bytes = 0
+
+    @property
+    def local(self):
+        return self.url.startswith('/static/')
+
+
+def _settings_signature(pages, image_pages, widths, quality):
+    images = f"{image_pages}x{','.join(map(str, widths))}q{quality}" if image_pages > 0 else 'none'
+    return f'pages={pages};images={images}'
+
+
+def collect_items(app):
+    """所有 PDF 文件 -> _Item（按文件 URL 合并），已按内容存储的文件带上 SHA-256。"""
+    docs = Document.__table__
+    orgs = Organization.__table__
+    columns = [docs.c.id, orgs.c.name]
+    for variant in VARIANT_FIELDS:
+        file_field, preview_field = VARIANT_FIELDS[variant]
+        columns += [docs.c[file_field], docs.c[preview_field], docs.c[PAGE_IMAGE_FIELDS[variant]]]
+    items = {}
+    with _engine().connect() as conn:
+        rows = conn.execute(select(*columns).select_from(docs.outerjoin(orgs, docs.c.org_id == orgs.c.id))
+                            .order_by(docs.c.id)).all()
+        hashes = dict(conn.execute(select(Blob.__table__.c.url, Blob.__table__.c.sha256)).all())
+    for row in rows:
+        document_id, org_name = row[0], (row[1] or 'unknown').lower()
+        for index, variant in enumerate(VARIANT_FIELDS):
+            url, preview_url, page_images = row[2 + index * 3: 5 + index * 3]
+            if not needs_preview(url):
+                continue
+            item = items.get(url)
+            if item is None:
+                item = items[url] = _Item(url, org_name)
+                item.sha256 = hashes.get(url)
+            item.refs.append((document_id, variant, preview_url, page_images))
+    return list(items.values())
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    """先写临时文件再原子替换，中断时不会留下半个状态文件。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _state_entry(state, url):
+    """状态文件中的记录 {'sha256', 'settings', 'size', 'etag'}（兼容旧格式 'sha256:设置'）。"""
+    done = state.get(url)
+    if isinstance(done, str):
+        sha256, _, settings = done.partition(':')
+        return {'sha256': sha256, 'settings': settings}
+    return done if isinstance(done, dict) else {}
+
+
+def _record(item, signature):
+    entry = {'sha256': item.sha256, 'settings': signature}
+    if item.etag:
+        entry.update(size=item.size, etag=item.etag)
+    return entry
+
+
+def _is_current(item, state, signature):
+    """内容与设置都与上次完成时相同，且所有文档都已有预览。
+
+    已知 SHA-256（按内容存储或已下载）时按 SHA-256 比较；否则按 HEAD 得到的大小与 ETag 比较。
+    """
+    done = _state_entry(state, item.url)
+    if done.get('settings') != signature or not all(preview_url for _, _, preview_url, _ in item.refs):
+        return False
+    if item.sha256 is not None:
+        return done.get('sha256') == item.sha256
+    return item.etag is not None and done.get('etag') == item.etag and done.get('size') == item.size
+
+
+def _sha256_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def fetch(app, item, root, is_current=None):
+    """下载（或定位本地）源文件并计算 SHA-256，返回 item。
+
+    R2 上的文件先 HEAD 取大小与 ETag；``is_current(item)`` 为真时不下载，只标记 ``item.unchanged``。
+    """
+    item.workdir = tempfile.mkdtemp(dir=root)
+    if item.local:
+        item.source = os.path.join(app.root_path, item.url.split('?', 1)[0].lstrip('/'))
+        if not os.path.isfile(item.source):
+            raise FileNotFoundError(item.source)
+    else:
+        item.source = os.path.join(item.workdir, 'source.pdf')
+        with app.app_context():
+            key = extract_key_from_url(item.url)
+            if not key:
+                raise ValueError(f'无法识别的文件地址: {item.url}')
+            head = head_object(key)
+            item.size, item.etag = int(head.get('ContentLength') or 0), normalize_etag(head.get('ETag')) or None
+            if is_current is not None and is_current(item):
+                item.unchanged = True
+                return item
+            download_to_path(key, item.source)
+        item.fetched_bytes = os.path.getsize(item.source)
+    item.sha256 = _sha256_file(item.source)
+    return item
+
+
+def store(app, item, preview_path, rendered):
+    """上传预览与页面图片并写回所有引用该文件的文档，返回更新的文档字段数。"""
+    with app.app_context():
+        use_r2 = not item.local
+        date_shard, preview_filename = _new_preview_name()
+        preview_url = _store_preview(preview_path, item.organization_name, date_shard, preview_filename, use_r2)
+        pages = dump_pages(store_pages(rendered, os.path.join(item.workdir, 'pages'), item.organization_name, use_r2))
+        old_previews, old_pages = set(), set()
+        written = 0
+        with _engine().begin() as conn:
+            old_previews.add(blob_preview(conn, item.url))
+            old_pages.add(blob_page_images(conn, item.url))
+            for document_id, variant, old_preview, old_page_images in item.refs:
+                if write_preview(conn, document_id, variant, item.url, preview_url, pages, old_page_images):
+                    _settle_document_status(conn, document_id, 'ready')
+                    written += 1
+                    old_previews.add(old_preview)
+                    old_pages.add(old_page_images)
+            if written:
+                record_preview(conn, item.url, preview_url, pages, replace=True)
+        if not written:
+            # 期间所有文档都已更换文件：新生成的预览与页面图片无人引用
+            _delete_preview_safely(preview_url)
+            if pages:
+                _delete_page_images_safely(pages)
+            return 0
+        for url in old_previews - {None, preview_url}:
+            _delete_preview_safely(url)
+        for value in old_pages - {None, pages}:
+            _delete_page_images_safely(value)
+        return written
+
+
+def _human(size):
+    size = float(size or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.1f}{unit}' if unit != 'B' else f'{int(size)}B'
+        size /= 1024
+
+
+def regenerate(app, processes=None, fetch_concurrency=4, state_path=DEFAULT_STATE, force=False, limit=None):
+    """重建所有 PDF 的预览，返回统计信息。"""
+    processes = max(1, processes or os.cpu_count() or 1)
+    fetch_concurrency = max(1, fetch_concurrency)
+    with app.app_context():
+        cfg = app.config
+        pages = int(cfg.get('PREVIEW_PAGES', 10))
+        image_pages, widths, quality = image_settings(cfg)
+        if image_pages > 0:
+            if _load_renderer() is None:
+                print('未安装 pypdfium2/Pillow，只重建预览 PDF')
+                image_pages = 0
+        signature = _settings_signature(pages, image_pages, widths, quality)
+        items = collect_items(app)
+    state = load_state(state_path)
+    todo = [item for item in items if force or not _is_current(item, state, signature)]
+    is_current = None if force else (lambda item: _is_current(item, state, signature))
+    stats = {'files': len(items), 'skipped': len(items) - len(todo), 'done': 0, 'unchanged': 0,
+             'failed': 0, 'documents': 0, 'bytes': 0}
+    if limit:
+        todo = todo[:limit]
+    print(f'PDF 文件 {len(items)} 个（{sum(len(i.refs) for i in items)} 个文档字段），'
+          f'待处理 {len(todo)} 个，已是最新 {stats["skipped"]} 个；设置 {signature}')
+    if not todo:
+        return stats
+
+    started = time.perf_counter()
+    last_checkpoint = time.monotonic()
+    pending = deque(todo)
+    fetching, building, storing = {}, {}, {}
+    # 已下载、尚未完成的文件数上限：进程池保持忙碌，同时限制临时空间
+    max_inflight = fetch_concurrency + processes
+    root = tempfile.mkdtemp(prefix='preview-regen-')
+    # 进程池用 spawn 启动：父进程中有下载线程与数据库连接，fork 可能复制到持有中的锁
+    ctx = multiprocessing.get_context('spawn')
+
+    def finished(item, ok):
+        nonlocal last_checkpoint
+        if item.workdir:
+            shutil.rmtree(item.workdir, ignore_errors=True)
+        if not ok:
+            stats['failed'] += 1
+        done = stats['done'] + stats['unchanged'] + stats['failed']
+        if done % 10 == 0 or done == len(todo):
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            print(f'  [{done}/{len(todo)}] 更新 {stats["documents"]} 个文档字段，'
+                  f'{stats["documents"] / elapsed * 60:.1f} 文档/分钟，失败 {stats["failed"]}')
+        if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+            save_state(state_path, state)
+            last_checkpoint = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix='preview-io') as io_pool, \
+                ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as cpu_pool:
+            while pending or fetching or building or storing:
+                while pending and len(fetching) < fetch_concurrency \
+                        and len(fetching) + len(building) + len(storing) < max_inflight:
+                    item = pending.popleft()
+                    fetching[io_pool.submit(fetch, app, item, root, is_current)] = item
+                done, _ = wait(list(fetching) + list(building) + list(storing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        item = fetching.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            print(f'下载失败 {item.url}: {e}')
+                            finished(item, False)
+                            continue
+                        stats['bytes'] += item.fetched_bytes
+                        if item.unchanged or (not force and _is_current(item, state, signature)):
+                            # HEAD 或下载后才知道内容的文件：与上次完成时相同（补记大小与 ETag，下次无需下载）
+                            if not item.unchanged:
+                                state[item.url] = _record(item, signature)
+                            stats['unchanged'] += 1
+                            finished(item, True)
+                            continue
+                        building[cpu_pool.submit(
+                            build_preview_files, item.source, item.workdir, pages, image_pages, widths, quality
+                        )] = item
+                    elif future in building:
+                        item = building.pop(future)
+                        try:
+                            preview_path, rendered = future.result()
+                        except Exception as e:
+                            print(f'生成失败 {item.url}: {e}')
+                            finished(item, False)
+                            continue
+                        storing[io_pool.submit(store, app, item, preview_path, rendered)] = item
+                    else:
+                        item = storing.pop(future)
+                        try:
+                            stats['documents'] += future.result()
+                        except Exception as e:
+                            print(f'上传或写回失败 {item.url}: {e}')
+                            finished(item, False)
+                            continue
+                        state[item.url] = _record(item, signature)
+                        stats['done'] += 1
+                        finished(item, True)
+    finally:
+        save_state(state_path, state)
+        shutil.rmtree(root, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed'] = elapsed
+    stats['per_minute'] = stats['documents'] / elapsed * 60 if elapsed else 0.0
+    print(f'完成：重建 {stats["done"]} 个文件、更新 {stats["documents"]} 个文档字段，内容未变 {stats["unchanged"]} 个，'
+          f'失败 {stats["failed"]} 个；下载 {_human(stats["bytes"])}，耗时 {elapsed:.1f}s，'
+          f'{stats["per_minute"]:.1f} 文档/分钟')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量重建 PDF 预览与页面图片')
+    parser.add_argument('--processes', type=int, default=None, help='生成预览的进程数（默认 CPU 核数）')
+    parser.add_argument('--fetch-concurrency', type=int, default=4, help='同时下载的文件数（默认 4）')
+    parser.add_argument('--state', default=DEFAULT_STATE, help='断点/已完成记录文件（默认 data/preview_state.json）')
+    parser.add_argument('--force', action='store_true', help='忽略已完成记录，全部重建')
+    parser.add_argument('--limit', type=int, default=None, help='最多处理的文件数')
+    args = parser.parse_args()
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    stats = regenerate(app, processes=args.processes, fetch_concurrency=args.fetch_concurrency,
+                       state_path=args.state, force=args.force, limit=args.limit)
+    sys.exit(1 if stats['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
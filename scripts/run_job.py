@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+后台任务进程入口
+由后台管理页面通过 app.utils.jobs.spawn_job 启动，一般不需要手动执行：
+
+    python scripts/run_job.py export-documents <task_id>
+    python scripts/run_job.py previews              # 处理预览生成队列，队列清空后退出
+
+进程以较低的 CPU/IO 优先级运行（EXPORT_JOB_NICE、EXPORT_JOB_IONICE），
+进度、暂停与取消通过数据库中的任务记录与 web 进程交换。
+"""
+
+import sys
+import os
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils.jobs import JOBS, WORKERS, run_job
+
+
+def main():
+    parser = argparse.ArgumentParser(description='执行后台任务')
+    parser.add_argument('kind', choices=sorted(JOBS) + sorted(WORKERS), help='任务类型')
+    parser.add_argument('task_id', nargs='?', help='任务 ID（队列进程不需要）')
+    parser.add_argument('--slot-fd', type=int, help='继承自父进程的队列槽位锁（文件描述符），由 kick 传入')
+    args = parser.parse_args()
+    if args.kind in JOBS and not args.task_id:
+        parser.error(f'{args.kind} 需要任务 ID')
+
+    app = create_app(os.getenv('FLASK_ENV') or 'default', with_admin=False)
+    run_job(app, args.kind, args.task_id, args.slot_fd)
+
+
+if __name__ == '__main__':
+    main()
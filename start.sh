@@ -55,17 +55,6 @@ else
   echo "[startup] 检测到非 SQLite 数据库或已显式配置，跳过自动初始化"
 fi
 
-# 启动应用
-exec gunicorn run:app \
-  --bind 0.0.0.0:${PORT:-5000} \
-  --workers ${WORKERS:-1} \
-  --worker-class ${WORKER_CLASS:-sync} \
-  --threads ${THREADS:-1} \
-  --max-requests ${MAX_REQUESTS:-1000} \
-  --max-requests-jitter ${MAX_REQUESTS_JITTER:-100} \
-  --timeout ${TIMEOUT:-30} \
-  --graceful-timeout ${GRACEFUL_TIMEOUT:-30} \
-  --keep-alive ${KEEP_ALIVE:-5} \
-  --log-level ${LOG_LEVEL:-info} \
-  --access-logfile '-' \
-  --error-logfile '-'
+# 启动应用：参数见 gunicorn.conf.py（preload + gthread，进程/线程数可用 WORKERS/THREADS 覆盖）；
+# 上次停机时遗留的预览任务由 gunicorn 就绪后（when_ready）启动的队列进程处理
+exec gunicorn -c gunicorn.conf.py run:app